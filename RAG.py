@@ -1,103 +1,476 @@
-from typing import List
-from pydantic import BaseModel
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import Qdrant
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-from qdrant_client import QdrantClient
-from utils import get_api_key
-from langsmith import traceable
-
-import os
-
-os.environ["LANGSMITH_API_KEY"] = get_api_key("LANGSMITH_API_KEY")
-os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
-os.environ["LANGSMITH_PROJECT"] = "movie-recommender"
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
-
-class MovieRecommendation(BaseModel):
-    title: str
-    reason: str
-
-class RecommendationList(BaseModel):
-    recommendations: List[MovieRecommendation]
-
-OPENAI_API_KEY = get_api_key("OPENAI_API_KEY")
-QDRANT_API_KEY = get_api_key("QDRANT_API_KEY")
-URL = "https://4f78837f-a98f-4bca-b598-903c86199ef2.eu-west-2-0.aws.cloud.qdrant.io"
-
-@traceable(name="get_movie_recommendations")
-def get_movie_recommendations(themes: str, genres: str, actors: str) -> List[MovieRecommendation]:
-    """
-    Generate movie recommendations based on user preferences.
-    """
-    embedding: OpenAIEmbeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        api_key=OPENAI_API_KEY,
-    )
-
-    client: QdrantClient = QdrantClient(
-        url=URL,
-        api_key=QDRANT_API_KEY
-    )
-
-    vectorstore: Qdrant = Qdrant(
-        client=client,
-        collection_name="movies_cluster",
-        embeddings=embedding,
-    )
-
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 3},
-    )
-
-    inputs: List[str] = [themes, genres, actors]
-    all_retrieved_docs = []
-
-    for input_text in inputs:
-        docs = retriever.get_relevant_documents(input_text)
-        all_retrieved_docs.extend(docs)
-
-    unique_docs = list({doc.page_content: doc for doc in all_retrieved_docs}.values())
-    retrieved_docs: str = "\n**\n".join(doc.page_content for doc in unique_docs)
-
-    parser = PydanticOutputParser(pydantic_object=RecommendationList)
-    format_instructions = parser.get_format_instructions()
-
-    prompt = ChatPromptTemplate.from_template(
-        """You are a helpful AI movie assistant. I am seeking for movie recommendations.
-
-        Here are my preferences:
-        - Topics: {topics}
-        - Genres: {genres}
-        - Favorite Actors: {actors}
-
-        Here are some movie descriptions retrieved based on these preferences:
-
-        {retrieved_docs}
-
-        Recommend exactly 9 movies that I am likely to enjoy. For each recommended movie, provide a concise 
-        explanation why is recommended - include one sentence referring to it's overview and one sentence explaning why is it relevant for me.
-        Return the result as a structured JSON with a 'recommendations' list, where each item has 'title' and 'reason'.
-        The output JSON should be valid and parsable.
-        """
-    ).partial(format_instructions=format_instructions)
-
-    llm = ChatOpenAI(
-        model="gpt-4o",
-        temperature=0.7,
-        api_key=OPENAI_API_KEY,
-    )
-
-    chain = prompt | llm | parser
-
-    response = chain.invoke({
-        "topics": themes,
-        "genres": genres,
-        "actors": actors,
-        "retrieved_docs": retrieved_docs,
-    })
-
-    return response.recommendations
+import functools
+import inspect
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+from pydantic import BaseModel, ValidationError
+from langchain.schema import Document
+from langchain.prompts import ChatPromptTemplate
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    IsEmptyCondition,
+    MatchAny,
+    MatchValue,
+    PayloadField,
+    QuantizationSearchParams,
+    Range,
+    SearchParams,
+    SearchRequest,
+)
+from utils import extract_genres, get_api_key
+import tmdb_client
+from resources import (
+    COLLECTION_NAME,
+    LEXICAL_RETRIEVAL,
+    LOCAL_INDEX_NPROBE,
+    QDRANT_OVERSAMPLING,
+    VECTOR_BACKEND,
+    get_embeddings,
+    get_qdrant_client,
+    get_lexical_index,
+    get_local_index,
+    get_chat_model,
+    get_output_parser,
+)
+from local_index import LocalVectorIndex
+from embedding_cache import CachedEmbeddings
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from metrics import request_span, stage, timed_stage
+
+# LangSmith tracing, enabled on the first traced call rather than at import time
+LANGSMITH_TRACING = True
+LANGSMITH_ENDPOINT = "https://api.smith.langchain.com"
+LANGSMITH_PROJECT = "movie-recommender"
+
+# Movies rated below this on TMDb are filtered out server-side; unrated movies (no rating or no votes) are kept
+RETRIEVAL_MIN_RATING = 5.0
+# Lexical hits fetched per result before the rating and genre constraints are applied
+LEXICAL_OVERFETCH = 5
+# Local index hits fetched per result before the rating and genre constraints are applied
+LOCAL_OVERFETCH = 5
+# Payload fields returned by Qdrant searches
+PAYLOAD_FIELDS = ["page_content", "metadata.tmdb_id", "metadata.title", "metadata.rating"]
+
+@functools.lru_cache(maxsize=1)
+def get_traceable() -> Callable:
+    """Enable LangSmith tracing and return its `traceable` decorator, importing langsmith on first use."""
+    os.environ["LANGSMITH_API_KEY"] = get_api_key("LANGSMITH_API_KEY")
+    os.environ["LANGCHAIN_ENDPOINT"] = LANGSMITH_ENDPOINT
+    os.environ["LANGSMITH_PROJECT"] = LANGSMITH_PROJECT
+    os.environ["LANGCHAIN_TRACING_V2"] = "true"
+    from langsmith import traceable
+    return traceable
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator tracing every call of a function in LangSmith.
+    Tracing is set up on the first call rather than at import time, and skipped if LANGSMITH_TRACING
+    is off by then. Generator functions stay generators.
+    """
+    def decorator(fn: Callable) -> Callable:
+        traced_fn: Optional[Callable] = None
+
+        def resolve() -> Callable:
+            nonlocal traced_fn
+            if traced_fn is None:
+                traced_fn = get_traceable()(name=name)(fn) if LANGSMITH_TRACING else fn
+            return traced_fn
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Iterator[Any]:
+                yield from resolve()(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return resolve()(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+class MovieRecommendation(BaseModel):
+    title: str
+    reason: str
+
+class RecommendationList(BaseModel):
+    recommendations: List[MovieRecommendation]
+
+def search_qdrant(
+    client: QdrantClient,
+    query_vectors: List[List[float]],
+    k: int = 3,
+    collection_name: str = COLLECTION_NAME,
+    query_filters: Optional[List[Optional[Filter]]] = None
+) -> List[List[Document]]:
+    """
+    Run a single batched similarity search in Qdrant, with an optional payload filter per query.
+    On quantized collections candidates are oversampled and rescored with the original vectors.
+    Queries whose filter matches nothing are repeated without it in a second batch.
+    Returns the top-k documents of every query vector as one list per query, in query order.
+    """
+    query_filters = query_filters or [None] * len(query_vectors)
+    params = SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING))
+    search_requests = [
+        SearchRequest(vector=vector, filter=query_filter, limit=k, params=params, with_payload=PAYLOAD_FIELDS)
+        for vector, query_filter in zip(query_vectors, query_filters)
+    ]
+    with request_span("qdrant", "search_batch"):
+        batch_results = client.search_batch(collection_name=collection_name, requests=search_requests)
+
+    retry = [i for i, points in enumerate(batch_results) if not points and query_filters[i] is not None]
+    if retry:
+        retry_requests = [
+            SearchRequest(vector=query_vectors[i], limit=k, params=params, with_payload=PAYLOAD_FIELDS)
+            for i in retry
+        ]
+        with request_span("qdrant", "search_batch"):
+            retry_results = client.search_batch(collection_name=collection_name, requests=retry_requests)
+        for i, points in zip(retry, retry_results):
+            batch_results[i] = points
+
+    return [
+        [
+            Document(
+                page_content=(point.payload or {}).get("page_content", ""),
+                metadata=(point.payload or {}).get("metadata") or {},
+            )
+            for point in points
+        ]
+        for points in batch_results
+    ]
+
+def search_local_index(
+    index: LocalVectorIndex,
+    query_vectors: List[List[float]],
+    k: int = 3,
+    nprobe: Optional[int] = LOCAL_INDEX_NPROBE,
+    query_genres: Optional[List[Sequence[str]]] = None,
+    min_rating: Optional[float] = RETRIEVAL_MIN_RATING
+) -> List[List[Document]]:
+    """
+    Search the local memory-mapped index.
+    With `query_genres`, hits are over-fetched and post-filtered with the same genre and rating
+    constraints as build_movie_filter; like search_qdrant, a query whose constraints match nothing
+    falls back to the unfiltered ranking.
+    Returns the top-k documents of every query vector as one list per query, in query order.
+    """
+    limit = k * LOCAL_OVERFETCH if query_genres is not None else k
+    with request_span("local_index", "search"):
+        all_hits = index.search(query_vectors, k=limit, nprobe=nprobe)
+
+    results = []
+    for i, hits in enumerate(all_hits):
+        documents = []
+        for row, _ in hits:
+            payload = index.payload(row)
+            documents.append(Document(
+                page_content=payload.get("page_content", ""),
+                metadata=payload.get("metadata") or {},
+            ))
+        if query_genres is not None:
+            matching = [doc for doc in documents if matches_movie_filter(doc.metadata, query_genres[i], min_rating)]
+            documents = matching or documents
+        results.append(documents[:k])
+    return results
+
+def search_lexical(
+    index: LexicalIndex,
+    query: str,
+    k: int = 3,
+    genres: Sequence[str] = (),
+    min_rating: Optional[float] = RETRIEVAL_MIN_RATING
+) -> List[Document]:
+    """
+    Search the BM25 index over title, cast and genres. No embedding is needed.
+    Hits must pass the same genre and rating constraints as dense search (see build_movie_filter).
+    Returns the top-k matching documents, or an empty list if no query term is indexed.
+    """
+    with request_span("lexical_index", "search"):
+        hits = index.search(query, k=k * LEXICAL_OVERFETCH)
+
+    documents = []
+    for row, _ in hits:
+        payload = index.payload(row)
+        metadata = payload.get("metadata") or {}
+        if not matches_movie_filter(metadata, genres, min_rating):
+            continue
+        documents.append(Document(page_content=payload.get("page_content", ""), metadata=metadata))
+        if len(documents) == k:
+            break
+    return documents
+
+def matches_movie_filter(metadata: Dict[str, Any], genres: Sequence[str], min_rating: Optional[float] = RETRIEVAL_MIN_RATING) -> bool:
+    """Client-side equivalent of build_movie_filter for payloads that do not come from Qdrant."""
+    if genres and not set(genres) & set(metadata.get("genres") or []):
+        return False
+    rating = metadata.get("rating")
+    return min_rating is None or rating is None or metadata.get("votes") == 0 or rating >= min_rating
+
+def build_movie_filter(genres: List[str], min_rating: Optional[float] = RETRIEVAL_MIN_RATING) -> Optional[Filter]:
+    """
+    Build a Qdrant payload filter for movies in any of the given (lowercased TMDb) genres
+    and rated at least `min_rating` (unrated movies pass). Returns None if there is nothing to filter on.
+    """
+    conditions = []
+    if genres:
+        conditions.append(FieldCondition(key="metadata.genres", match=MatchAny(any=genres)))
+    if min_rating is not None:
+        conditions.append(Filter(should=[
+            FieldCondition(key="metadata.rating", range=Range(gte=min_rating)),
+            IsEmptyCondition(is_empty=PayloadField(key="metadata.rating")),
+            FieldCondition(key="metadata.votes", match=MatchValue(value=0)),
+        ]))
+    return Filter(must=conditions) if conditions else None
+
+def search_documents(
+    embedding: CachedEmbeddings,
+    queries: List[str],
+    k: int = 3,
+    backend: str = VECTOR_BACKEND,
+    query_genres: Optional[List[Sequence[str]]] = None,
+    min_rating: Optional[float] = RETRIEVAL_MIN_RATING
+) -> List[List[Document]]:
+    """
+    Embed all queries in one batch and search the configured vector store backend ("qdrant" or "local").
+    With `query_genres`, every query is constrained to its genres (if any) and to `min_rating`:
+    server-side by Qdrant, by post-filtering over-fetched hits on the local backend.
+    Returns the top-k documents of every query as one list per query, in query order.
+    """
+    if not queries:
+        return []
+
+    query_vectors = embedding.embed_queries(queries)
+
+    if backend == "local":
+        return search_local_index(
+            get_local_index(), query_vectors, k=k, query_genres=query_genres, min_rating=min_rating
+        )
+    query_filters = None
+    if query_genres is not None:
+        query_filters = [build_movie_filter(list(genres), min_rating) for genres in query_genres]
+    return search_qdrant(get_qdrant_client(), query_vectors, k=k, query_filters=query_filters)
+
+def document_key(doc: Document) -> Any:
+    """Identify a retrieved movie by its TMDb id, falling back to its text for documents without one."""
+    tmdb_id = doc.metadata.get("tmdb_id")
+    return tmdb_id if tmdb_id is not None else doc.page_content
+
+def remember_tmdb_ids(documents: List[Document]) -> None:
+    """
+    Seed the TMDb search cache with the ids and ratings carried by retrieved documents,
+    so rating, trailer and description lookups of these titles skip /search/movie.
+    """
+    for doc in documents:
+        metadata = doc.metadata
+        if metadata.get("tmdb_id") is not None and metadata.get("title") and metadata.get("rating") is not None:
+            tmdb_client.seed_search_cache(metadata["title"], {
+                "id": metadata["tmdb_id"],
+                "title": metadata["title"],
+                "vote_average": metadata["rating"],
+            })
+
+def retrieve_documents(
+    themes: str,
+    genres: str,
+    actors: str,
+    k: int = 3,
+    lexical_retrieval: str = LEXICAL_RETRIEVAL
+) -> List[Document]:
+    """
+    Retrieve the top-k documents for each preference slot.
+    Themes always use dense search. Genres and actors are looked up in the BM25 index when it is
+    available: "fusion" also runs dense search for them and merges both rankings with reciprocal
+    rank fusion, "lexical" skips the embedding for slots whose whole input is an indexed value
+    (e.g. a full cast name) and fuses the others.
+    Both searches are constrained by rating, and the theme and genre slots also by the genres named
+    in the genre preference (server-side by Qdrant, on the payloads for the local index and lexical search).
+    """
+    inputs: List[str] = [themes, genres, actors]
+    requested_genres = extract_genres(genres)
+    slot_genres = [requested_genres, requested_genres, []]
+    lexical_slots = (1, 2)
+
+    lexical_results: Dict[int, List[Document]] = {}
+    lexical_only: Set[int] = set()
+    lexical_index = get_lexical_index() if lexical_retrieval != "off" else None
+    if lexical_index is not None:
+        for slot in lexical_slots:
+            documents = search_lexical(lexical_index, inputs[slot], k=k, genres=slot_genres[slot])
+            if documents:
+                lexical_results[slot] = documents
+                if lexical_retrieval == "lexical" and lexical_index.phrase_match(inputs[slot]):
+                    lexical_only.add(slot)
+
+    dense_slots = [slot for slot in range(len(inputs)) if slot not in lexical_only]
+    dense_results = dict(zip(dense_slots, search_documents(
+        get_embeddings(),
+        [inputs[slot] for slot in dense_slots],
+        k=k,
+        query_genres=[slot_genres[slot] for slot in dense_slots],
+    )))
+
+    all_retrieved_docs: List[Document] = []
+    for slot in range(len(inputs)):
+        if slot in lexical_results and slot in dense_results:
+            candidates = {document_key(doc): doc for doc in dense_results[slot] + lexical_results[slot]}
+            fused = reciprocal_rank_fusion([
+                [document_key(doc) for doc in dense_results[slot]],
+                [document_key(doc) for doc in lexical_results[slot]],
+            ])
+            all_retrieved_docs.extend(candidates[key] for key in fused[:k])
+        else:
+            all_retrieved_docs.extend(lexical_results.get(slot) or dense_results.get(slot, []))
+    return all_retrieved_docs
+
+@timed_stage("retrieve")
+def retrieve_context(themes: str, genres: str, actors: str) -> str:
+    """
+    Retrieve movie descriptions relevant to the user preferences and join them into one context string.
+    """
+    all_retrieved_docs = retrieve_documents(themes, genres, actors, k=3)
+
+    unique_docs = list({document_key(doc): doc for doc in all_retrieved_docs}.values())
+    remember_tmdb_ids(unique_docs)
+    retrieved_docs: str = "\n**\n".join(doc.page_content for doc in unique_docs)
+    return retrieved_docs
+
+def build_recommendation_prompt() -> ChatPromptTemplate:
+    """
+    Build the prompt asking the model for 9 movie recommendations as structured JSON.
+    """
+    parser = get_output_parser(RecommendationList)
+    format_instructions = parser.get_format_instructions()
+
+    prompt = ChatPromptTemplate.from_template(
+        """You are a helpful AI movie assistant. I am seeking for movie recommendations.
+
+        Here are my preferences:
+        - Topics: {topics}
+        - Genres: {genres}
+        - Favorite Actors: {actors}
+
+        Here are some movie descriptions retrieved based on these preferences:
+
+        {retrieved_docs}
+
+        Recommend exactly 9 movies that I am likely to enjoy. For each recommended movie, provide a concise 
+        explanation why is recommended - include one sentence referring to it's overview and one sentence explaning why is it relevant for me.
+        Return the result as a structured JSON with a 'recommendations' list, where each item has 'title' and 'reason'.
+        The output JSON should be valid and parsable.
+        """
+    ).partial(format_instructions=format_instructions)
+
+    return prompt
+
+@timed_stage("generate")
+def generate_recommendations(themes: str, genres: str, actors: str, retrieved_docs: str) -> List[MovieRecommendation]:
+    """
+    Ask the model for movie recommendations based on user preferences and already retrieved context.
+    """
+    prompt = build_recommendation_prompt()
+    parser = get_output_parser(RecommendationList)
+    llm = get_chat_model(model="gpt-4o", temperature=0.7)
+
+    chain = prompt | llm | parser
+
+    response = chain.invoke({
+        "topics": themes,
+        "genres": genres,
+        "actors": actors,
+        "retrieved_docs": retrieved_docs,
+    })
+
+    return response.recommendations
+
+@traced("get_movie_recommendations")
+def get_movie_recommendations(themes: str, genres: str, actors: str) -> List[MovieRecommendation]:
+    """
+    Generate movie recommendations based on user preferences.
+    """
+    retrieved_docs = retrieve_context(themes, genres, actors)
+    return generate_recommendations(themes, genres, actors, retrieved_docs)
+
+def iter_json_array_objects(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally parse streamed JSON text and yield every object that is an element of an array
+    as soon as its closing brace arrives. Text outside of JSON (e.g. markdown code fences) is ignored.
+    """
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    current: List[str] = []
+    capture_depth = 0
+
+    for chunk in chunks:
+        for char in chunk:
+            if capture_depth:
+                current.append(char)
+
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+                continue
+
+            if char == '"':
+                in_string = True
+            elif char in "{[":
+                if char == "{" and not capture_depth and stack and stack[-1] == "[":
+                    capture_depth = len(stack) + 1
+                    current = [char]
+                stack.append(char)
+            elif char in "}]" and stack:
+                stack.pop()
+                if capture_depth and len(stack) == capture_depth - 1:
+                    try:
+                        yield json.loads("".join(current))
+                    except json.JSONDecodeError:
+                        pass
+                    capture_depth = 0
+                    current = []
+
+@traced("stream_movie_recommendations")
+def stream_movie_recommendations(themes: str, genres: str, actors: str) -> Iterator[MovieRecommendation]:
+    """
+    Generate movie recommendations based on user preferences, yielding each recommendation
+    as soon as its JSON object has been fully generated by the model.
+    """
+    retrieved_docs = retrieve_context(themes, genres, actors)
+
+    prompt = build_recommendation_prompt()
+    llm = get_chat_model(model="gpt-4o", temperature=0.7)
+
+    chain = prompt | llm
+    streamed_text: List[str] = []
+
+    def text_chunks() -> Iterator[str]:
+        with stage("generate"):
+            for chunk in chain.stream({
+                "topics": themes,
+                "genres": genres,
+                "actors": actors,
+                "retrieved_docs": retrieved_docs,
+            }):
+                streamed_text.append(chunk.content)
+                yield chunk.content
+
+    emitted = 0
+    for item in iter_json_array_objects(text_chunks()):
+        try:
+            recommendation = MovieRecommendation.model_validate(item)
+        except ValidationError:
+            continue
+        emitted += 1
+        yield recommendation
+
+    # Fall back to parsing the complete output if incremental parsing found nothing usable
+    if emitted == 0:
+        parser = get_output_parser(RecommendationList)
+        response = parser.parse("".join(streamed_text))
+        yield from response.recommendations
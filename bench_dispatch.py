@@ -0,0 +1,64 @@
+"""
+Benchmark the "direct" and "llm" dispatch modes of the rating, trailer and streaming lookups.
+
+Both modes hit the live TMDb API (and OpenAI for "llm"), so the API keys from
+.streamlit/secrets.toml are required. The TMDb response cache and the title resolution
+cache are disabled and cleared before every call so both modes pay the same TMDb cost.
+
+Usage:
+    python bench_dispatch.py --repeats 3 --country Germany
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List
+import tmdb_client
+from movie_ratings import run_movie_rating_search
+from movie_trailer_search import run_movie_trailer_search
+from movie_stream_search import run_streaming_search
+
+MOVIES = [
+    {"title": "Dune: Part Two", "reason": "Epic science fiction."},
+    {"title": "Past Lives", "reason": "Quiet romantic drama."},
+    {"title": "Oppenheimer", "reason": "Historical biopic."},
+    {"title": "Little Women", "reason": "Coming-of-age story."},
+    {"title": "Barbie", "reason": "Satirical comedy."},
+    {"title": "La La Land", "reason": "Musical romance."},
+    {"title": "Blade Runner 2049", "reason": "Neo-noir science fiction."},
+    {"title": "Midsommar", "reason": "Folk horror."},
+    {"title": "Dune", "reason": "Epic science fiction."},
+]
+
+def time_call(fn: Callable[[], object], repeats: int) -> List[float]:
+    """Time `fn` with cold TMDb caches, returning the latency of every repeat in seconds."""
+    timings = []
+    for _ in range(repeats):
+        tmdb_client._search_cache.clear()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark direct vs. LLM dispatch of TMDb lookups.")
+    parser.add_argument("--repeats", type=int, default=3, help="Calls per lookup and mode")
+    parser.add_argument("--country", type=str, default="Germany", help="Country for the streaming lookup")
+    args = parser.parse_args()
+
+    tmdb_client.RESPONSE_CACHE_ENABLED = False
+    title = MOVIES[0]["title"]
+
+    lookups: Dict[str, Callable[[str], object]] = {
+        "ratings (9 movies)": lambda mode: run_movie_rating_search(MOVIES, mode=mode),
+        "trailer": lambda mode: run_movie_trailer_search(title, mode=mode),
+        "streaming": lambda mode: run_streaming_search(title, args.country, mode=mode),
+    }
+
+    print(f"{'lookup':<20} {'mode':<7} {'median s':>9} {'mean s':>8}")
+    for name, lookup in lookups.items():
+        for mode in ("llm", "direct"):
+            timings = time_call(lambda: lookup(mode), args.repeats)
+            print(f"{name:<20} {mode:<7} {statistics.median(timings):>9.3f} {statistics.mean(timings):>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark recall@k against latency and memory for reduced-dimension and quantized embeddings.
+
+Movies from the parquet are embedded once at the full size of the embedding model
+(cached in the embedding cache). Matryoshka truncation is then applied locally by cutting
+the vectors and re-normalizing them, which is what the OpenAI `dimensions` parameter does.
+For every dimension and storage mode, top-k search over the corpus is compared with exact
+search over the full-size float32 vectors:
+
+- float32: exact cosine search
+- int8: per-vector scalar quantization (as in the local index and Qdrant scalar quantization)
+- binary: sign bits compared by Hamming distance
+- int8+rescore / binary+rescore: quantized search over `oversampling * k` candidates,
+  rescored with the float32 vectors (as Qdrant does with rescore=True)
+
+Queries are held-out movies, so the neighbours of a movie are searched among the others.
+Latencies are for a NumPy brute-force emulation (int8 and binary codes are not scanned with
+SIMD as in Qdrant), so use them to compare dimensions; memory per vector is representative.
+`--synthetic` uses random vectors whose variance decays over the dimensions instead of
+OpenAI embeddings; it only checks the code paths and does not say anything about real recall.
+
+Usage:
+    python bench_embeddings.py data/movies.parquet --corpus 20000 --queries 200 --k 10
+    python bench_embeddings.py --synthetic
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from local_index import _normalize, _quantize_int8, _top_k
+
+MODES = ["float32", "int8", "int8+rescore", "binary", "binary+rescore"]
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+
+def load_openai_vectors(movie_db_path: str, count: int) -> np.ndarray:
+    """Embed the first `count` movies of a parquet at the full model size."""
+    from create_database import read_movie_batches, build_page_contents
+    from resources import build_embeddings
+    from utils import get_api_key
+
+    texts: List[str] = []
+    for batch in read_movie_batches(movie_db_path):
+        texts.extend(build_page_contents(batch))
+        if len(texts) >= count:
+            break
+    embedding = build_embeddings(get_api_key("OPENAI_API_KEY"))
+    return np.asarray(embedding.embed_documents(texts[:count]), dtype=np.float32)
+
+def synthetic_vectors(count: int, dimensions: int = 3072, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors whose variance decays over the dimensions."""
+    rng = np.random.default_rng(seed)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dimensions) / 32.0)
+    centers = rng.standard_normal((clusters, dimensions)) * decay
+    assignment = rng.integers(0, clusters, size=count)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((count, dimensions)) * decay
+    return vectors.astype(np.float32)
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """Matryoshka truncation: keep the first dimensions and re-normalize."""
+    return _normalize(np.ascontiguousarray(vectors[:, :dimensions]))
+
+def build_searcher(corpus: np.ndarray, mode: str, k: int, oversampling: float) -> Tuple[Callable[[np.ndarray], np.ndarray], int]:
+    """Return a single-query top-k search function for a storage mode and its bytes per vector."""
+    candidates = max(k, int(round(k * oversampling)))
+
+    if mode == "float32":
+        return (lambda query: _top_k(corpus @ query, k)), corpus.shape[1] * 4
+
+    if mode.startswith("int8"):
+        codes, scales = _quantize_int8(corpus)
+        codes_t = codes.T.astype(np.float32)
+
+        def quantized_scores(query: np.ndarray) -> np.ndarray:
+            return (query @ codes_t) * scales
+
+        bytes_per_vector = corpus.shape[1] + 4
+    else:
+        codes = np.packbits(corpus > 0, axis=1)
+
+        def quantized_scores(query: np.ndarray) -> np.ndarray:
+            query_code = np.packbits(query > 0)
+            return -POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1)
+
+        bytes_per_vector = codes.shape[1]
+
+    if not mode.endswith("+rescore"):
+        return (lambda query: _top_k(quantized_scores(query), k)), bytes_per_vector
+
+    def search_rescored(query: np.ndarray) -> np.ndarray:
+        rows = _top_k(quantized_scores(query), candidates)
+        return rows[_top_k(corpus[rows] @ query, k)]
+
+    return search_rescored, bytes_per_vector
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: List[set], mode: str, k: int, oversampling: float) -> Dict[str, float]:
+    """Measure recall@k and per-query latency of one storage mode."""
+    search, bytes_per_vector = build_searcher(corpus, mode, k, oversampling)
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected.intersection(int(row) for row in rows)) / k)
+    return {
+        "recall": statistics.mean(recalls),
+        "p50_ms": statistics.median(latencies),
+        "bytes": bytes_per_vector,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark embedding dimensions and quantization.")
+    parser.add_argument("movie_db_path", nargs="?", help="Movie parquet to embed")
+    parser.add_argument("--synthetic", action="store_true", help="Use synthetic vectors instead of OpenAI embeddings")
+    parser.add_argument("--corpus", type=int, default=20000, help="Number of indexed movies")
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out query movies")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 512, 1024, 3072], help="Dimensions to test")
+    parser.add_argument("--oversampling", type=float, default=2.0, help="Candidate multiplier for rescoring")
+    args = parser.parse_args()
+
+    total = args.corpus + args.queries
+    if args.synthetic:
+        vectors = synthetic_vectors(total)
+    elif args.movie_db_path:
+        vectors = load_openai_vectors(args.movie_db_path, total)
+    else:
+        parser.error("pass a movie parquet or --synthetic")
+
+    full = _normalize(vectors)
+    corpus_full, queries_full = full[:args.corpus], full[args.corpus:]
+    truth = [set(int(row) for row in _top_k(corpus_full @ query, args.k)) for query in queries_full]
+
+    print(f"{'dims':>5} {'mode':<15} {f'recall@{args.k}':>10} {'p50 ms':>8} {'bytes/vec':>10} {'corpus MB':>10}")
+    for dimensions in args.dimensions:
+        corpus, queries = truncate(corpus_full, dimensions), truncate(queries_full, dimensions)
+        for mode in MODES:
+            result = evaluate(corpus, queries, truth, mode, args.k, args.oversampling)
+            corpus_mb = result["bytes"] * args.corpus / 1e6
+            print(f"{dimensions:>5} {mode:<15} {result['recall']:>10.3f} {result['p50_ms']:>8.2f} {result['bytes']:>10} {corpus_mb:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark the import time of the app with `python -X importtime`.
+
+Every scenario is imported in a fresh interpreter per repeat, and modules already loaded by the
+interpreter's own startup are left out. "landing" imports app.py, which is all the landing page
+needs; "pipeline" additionally imports the modules the background warm-up loads before the first
+recommendation. The landing scenario fails (exit status 1) if it pulls in LangChain, LangSmith,
+OpenAI or Qdrant, which must only be imported on first use.
+
+No API keys or network access are needed.
+
+Usage:
+    python bench_imports.py --repeats 5 --top 15
+    python bench_imports.py pipeline --module create_database
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+SCENARIOS = {
+    "landing": "import app",
+    "pipeline": "import app\nfor module in app.PIPELINE_MODULES:\n    __import__(module)",
+}
+# Packages the landing page must render without
+LANDING_FORBIDDEN = ("langchain", "langchain_core", "langchain_community", "langsmith", "openai", "qdrant_client")
+
+# One parsed `-X importtime` line: module name, self time and cumulative time in microseconds, nesting depth
+ImportRecord = Tuple[str, int, int, int]
+
+def run_importtime(code: str) -> List[ImportRecord]:
+    """Run `code` in a fresh interpreter with -X importtime and parse its report."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr[-2000:]}")
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return records
+
+def summarize(records: List[ImportRecord], startup: Set[str]) -> Tuple[float, Dict[str, float]]:
+    """
+    Return the total import time in ms of everything not loaded at interpreter startup,
+    and the self time in ms per top-level package.
+    """
+    total = sum(cumulative for name, _, cumulative, depth in records if depth == 0 and name not in startup)
+    packages: Dict[str, float] = defaultdict(float)
+    for name, self_us, _, _ in records:
+        if name not in startup:
+            packages[name.split(".")[0]] += self_us / 1000
+    return total / 1000, packages
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the app.")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to import: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--module", action="append", default=[], help="Extra module to benchmark on its own (repeatable)")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per scenario")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest packages to list per scenario")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    scenarios = {name: SCENARIOS[name] for name in args.scenarios or SCENARIOS}
+    scenarios.update({module: f"import {module}" for module in args.module})
+    startup = {name for name, _, _, _ in run_importtime("pass")}
+
+    failed = False
+    for name, code in scenarios.items():
+        totals = []
+        packages: Dict[str, List[float]] = defaultdict(list)
+        for _ in range(args.repeats):
+            total, package_times = summarize(run_importtime(code), startup)
+            totals.append(total)
+            for package, duration in package_times.items():
+                packages[package].append(duration)
+
+        print(f"\n{name}: median {statistics.median(totals):.0f} ms, min {min(totals):.0f} ms over {args.repeats} runs")
+        heaviest = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+        for package, durations in heaviest[:args.top]:
+            print(f"  {package:<32} {statistics.median(durations):8.1f} ms")
+
+        if name == "landing":
+            forbidden = sorted(package for package in LANDING_FORBIDDEN if package in packages)
+            if forbidden:
+                failed = True
+                print(f"  FAIL: the landing page imports {', '.join(forbidden)}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
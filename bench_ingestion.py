@@ -0,0 +1,139 @@
+"""
+Benchmark document building for ingestion on a synthetic movie parquet.
+
+Compares the previous approach (pd.read_parquet + iterrows) with the streaming
+record-batch pipeline used by create_database.py. Embedding and upload are left out,
+so the numbers isolate reading and page_content construction. The metadata, point ids
+and content hashes the streaming pipeline also builds (and the legacy one never did)
+are timed separately and reported on their own line. Each mode runs in its own
+subprocess so peak RSS is measured independently; imports are done before the timer.
+
+Usage:
+    python bench_ingestion.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Horror", "Romance", "Science Fiction", "Thriller", "War"]
+WORDS = "a young woman discovers a secret that changes her family forever while a detective hunts the truth".split()
+
+def generate_parquet(path: str, rows: int, chunk_rows: int = 100000, seed: int = 0) -> None:
+    """Write a synthetic movie parquet with the columns create_database.py expects."""
+    rng = random.Random(seed)
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("title", pa.string()),
+        ("overview", pa.string()),
+        ("genres", pa.list_(pa.string())),
+        ("cast", pa.list_(pa.string())),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - start)
+            ids = list(range(start, start + count))
+            writer.write_table(pa.table({
+                "id": ids,
+                "title": [f"Movie {i}" for i in ids],
+                "overview": [" ".join(rng.choices(WORDS, k=40)) for _ in ids],
+                "genres": [rng.sample(GENRES, rng.randint(0, 3)) for _ in ids],
+                "cast": [[f"Actor {rng.randint(0, 50000)}" for _ in range(rng.randint(0, 5))] for _ in ids],
+            }, schema=schema))
+
+def run_legacy(path: str) -> int:
+    """Load the whole parquet into pandas and build texts row by row with iterrows."""
+    import pandas as pd  # imported by main before the timer
+
+    movie_database = pd.read_parquet(path)
+    texts = []
+    for _, row in movie_database.iterrows():
+        # Same text as row_to_document; array columns are checked with len() because
+        # parquet list columns come back as numpy arrays
+        text_chunks = [
+            f"Movie title: {row['title']}",
+            f"Overview: {row['overview']}",
+            f"Genres: {', '.join(row['genres'])}" if len(row['genres']) else "",
+            f"Cast: {', '.join(row['cast'])}" if len(row['cast']) else "",
+        ]
+        texts.append("\n".join(chunk for chunk in text_chunks if chunk))
+    return len(texts)
+
+def run_streaming(path: str) -> Tuple[int, float]:
+    """
+    Stream record batches and build texts, then metadata, point ids and content hashes per batch.
+    Returns the row count and the seconds spent on metadata, point ids and hashes.
+    """
+    # Imported by main before the timer
+    from create_database import read_movie_batches, build_page_contents, movie_metadata, movie_point_ids, content_hash
+
+    count = 0
+    metadata_seconds = 0.0
+    for batch in read_movie_batches(path):
+        texts = build_page_contents(batch)
+        start = time.perf_counter()
+        movie_point_ids(batch)
+        for text, metadata in zip(texts, movie_metadata(batch)):
+            content_hash(text, metadata=metadata)
+        metadata_seconds += time.perf_counter() - start
+        count += len(texts)
+    return count, metadata_seconds
+
+def measure(mode: str, path: str) -> Dict[str, float]:
+    """Run one mode in a subprocess and return its timing and peak memory."""
+    output = subprocess.check_output([sys.executable, __file__, "--run", mode, "--path", path])
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ingestion document building.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Number of synthetic movies")
+    parser.add_argument("--path", type=str, default=None, help="Reuse or write the synthetic parquet here")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only run the streaming pipeline")
+    parser.add_argument("--run", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # create_database loads LangChain and Qdrant and reads the secrets, which is not ingestion work
+        if args.run == "legacy":
+            import pandas  # noqa: F401
+        else:
+            import create_database  # noqa: F401
+        metadata_seconds = 0.0
+        start = time.perf_counter()
+        if args.run == "legacy":
+            rows = run_legacy(args.path)
+        else:
+            rows, metadata_seconds = run_streaming(args.path)
+        seconds = time.perf_counter() - start - metadata_seconds
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps({
+            "rows": rows, "seconds": seconds, "metadata_seconds": metadata_seconds, "peak_rss_mb": peak_rss_mb,
+        }))
+        return
+
+    path = args.path or os.path.join(tempfile.gettempdir(), f"movies_synthetic_{args.rows}.parquet")
+    if not os.path.exists(path):
+        print(f"Generating {args.rows} synthetic movies into {path} ...")
+        generate_parquet(path, args.rows)
+
+    modes = ["streaming"] if args.skip_legacy else ["legacy", "streaming"]
+    print(f"{'mode':<10} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'peak RSS MB':>12}")
+    for mode in modes:
+        result = measure(mode, path)
+        rate = result["rows"] / result["seconds"] if result["seconds"] else 0.0
+        print(f"{mode:<10} {result['rows']:>9} {result['seconds']:>9.2f} {rate:>10.0f} {result['peak_rss_mb']:>12.1f}")
+        if result["metadata_seconds"]:
+            # Only the streaming pipeline builds metadata, point ids and content hashes
+            rate = result["rows"] / result["metadata_seconds"]
+            print(f"{'+ metadata':<10} {result['rows']:>9} {result['metadata_seconds']:>9.2f} {rate:>10.0f} {'':>12}")
+
+if __name__ == "__main__":
+    main()
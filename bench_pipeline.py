@@ -0,0 +1,335 @@
+"""
+Offline per-stage benchmark of the recommendation pipeline.
+
+OpenAI and TMDb are replaced by local stand-in servers (fake_services.py) that answer from a
+cassette of recorded responses, and Qdrant runs in-process in memory, seeded with the movies
+stored in the cassette. Every repeat runs the stages of one user session:
+
+    validation, retrieval, recommendation, rating_rerank, descriptions, trailer, providers, chat_turn
+
+with cold caches (--warm keeps them), and the p50/p95 latency of every stage is reported.
+recommendation_turn is the time from the last answer to the described top movies: the sum of
+retrieval to descriptions, or with --pipeline async the wall time of the dependency graph of
+pipeline.py, which overlaps them (its parts are then not timed separately).
+A fixed latency can be injected into every OpenAI and TMDb response. With --baseline the results
+are compared with a stored baseline, and the run fails (exit code 1) if a stage got slower than
+the tolerance allows.
+
+Record a cassette once against the live APIs (needs the keys in .streamlit/secrets.toml):
+    python bench_pipeline.py --record --cassette data/bench_cassette.json --movies 200
+Replay it offline with 300 ms per OpenAI call and 50 ms per TMDb call, and store a baseline:
+    python bench_pipeline.py --cassette data/bench_cassette.json --openai-latency-ms 300 --tmdb-latency-ms 50 \\
+        --baseline data/bench_baseline.json --update-baseline
+Check against the baseline (same options, without --update-baseline):
+    python bench_pipeline.py --cassette data/bench_cassette.json --openai-latency-ms 300 --tmdb-latency-ms 50 \\
+        --baseline data/bench_baseline.json --tolerance 0.2
+Without a cassette, synthetic movies and responses are used; that checks the code paths and the
+client-side overhead, not real response sizes.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+import numpy as np
+from fake_services import Cassette, FakeOpenAIServer, FakeTMDbServer, synthetic_movies
+
+STAGES = [
+    "validation", "retrieval", "recommendation", "rating_rerank",
+    "descriptions", "trailer", "providers", "chat_turn",
+]
+TURN_STAGES = ["retrieval", "recommendation", "rating_rerank", "descriptions"]
+FIXTURE_COLUMNS = ["id", "title", "overview", "genres", "cast", "release_date", "vote_average"]
+API_KEY_NAMES = ["OPENAI_API_KEY", "TMDB_API_KEY", "QDRANT_API_KEY", "LANGSMITH_API_KEY"]
+DEFAULT_QUESTION = "Who directed this movie and what do critics say about it?"
+
+def load_parquet_movies(movie_db_path: str, count: int) -> List[Dict[str, Any]]:
+    """Read the first `count` movies of the parquet as JSON-serializable records."""
+    from create_database import read_movie_batches
+
+    movies: List[Dict[str, Any]] = []
+    for batch in read_movie_batches(movie_db_path, columns=FIXTURE_COLUMNS):
+        for row in batch.to_pylist():
+            if row.get("release_date") is not None:
+                row["release_date"] = str(row["release_date"])
+            movies.append(row)
+            if len(movies) >= count:
+                return movies
+    return movies
+
+def default_inputs(movies: List[Dict[str, Any]]) -> Dict[str, str]:
+    """User preferences for the benchmark session, taken from the fixture movies."""
+    genres = [genre for movie in movies for genre in movie.get("genres") or []]
+    cast = [name for movie in movies for name in movie.get("cast") or []]
+    return {
+        "themes": "coming of age",
+        "genres": genres[0].lower() if genres else "drama",
+        "actors": cast[0] if cast else "Tom Hanks",
+        "country": "Germany",
+        "question": DEFAULT_QUESTION,
+    }
+
+def ensure_tokenizer(encoding_name: str = "cl100k_base") -> bool:
+    """
+    Make sure tiktoken can provide the encoding OpenAIEmbeddings tokenizes inputs with.
+    tiktoken downloads it on first use, which fails without network access; then a byte-level
+    encoding is registered under its name instead. The stand-in accepts any token ids, but recorded
+    embedding responses no longer match, so they are synthesized (and counted as misses).
+    Returns False if the stand-in encoding is used.
+    """
+    import tiktoken
+    from tiktoken import registry
+
+    try:
+        tiktoken.get_encoding(encoding_name)
+        return True
+    except Exception:
+        pass
+
+    registry.ENCODINGS[encoding_name] = tiktoken.Encoding(
+        name=encoding_name,
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={"<|endoftext|>": 256},
+    )
+    return False
+
+def configure_pipeline(openai_base_url: str, tmdb_base_url: str) -> None:
+    """
+    Point the pipeline at the stand-ins and in-memory Qdrant.
+    Must run before any shared client is created.
+    """
+    import resources
+    import tmdb_client
+    import RAG
+
+    resources.OPENAI_BASE_URL = openai_base_url
+    resources.QDRANT_PATH = ":memory:"
+    tmdb_client.TMDB_BASE_URL = tmdb_base_url
+    tmdb_client.RESPONSE_CACHE_ENABLED = False
+
+    # Nothing may leave the machine: no LangSmith tracing of the pipeline or its chains
+    RAG.LANGSMITH_TRACING = False
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    os.environ["LANGSMITH_TRACING"] = "false"
+
+def seed_vector_store(movies: List[Dict[str, Any]], dimensions: int) -> None:
+    """Create the collection in in-memory Qdrant and upsert the fixture movies."""
+    import pyarrow as pa
+    from create_database import batch_to_documents, ensure_collection, movie_point_ids, upsert_documents
+    from resources import COLLECTION_NAME, get_embeddings, get_qdrant_client
+
+    client = get_qdrant_client()
+    ensure_collection(client, COLLECTION_NAME, dimensions, quantization="none")
+    batch = pa.RecordBatch.from_pylist(movies)
+    upsert_documents(client, COLLECTION_NAME, get_embeddings(), movie_point_ids(batch), batch_to_documents(batch))
+
+def reset_caches() -> None:
+    """Drop every cache the pipeline fills, so the next session pays for all requests again."""
+    import movie_context
+    import provider_store
+    import tmdb_client
+    import validation
+    from recommendation_cache import get_recommendation_cache
+    from resources import get_embeddings
+
+    tmdb_client._search_cache.clear()
+    provider_store._store = provider_store.ProviderStore()
+    movie_context._context_cache.clear()
+    validation.get_llm_cache().clear()
+    recommendation_cache = get_recommendation_cache()
+    if recommendation_cache is not None:
+        recommendation_cache.clear()
+
+    embeddings = get_embeddings()
+    embeddings._memory.clear()
+    if embeddings._disk is not None:
+        embeddings._disk.clear()
+
+def run_session(inputs: Dict[str, str], pipeline: str = "sequential") -> Dict[str, float]:
+    """
+    Run the stages of one user session and return the latency of every stage in milliseconds.
+    With `pipeline="async"` the recommendation turn runs as the dependency graph of pipeline.py.
+    """
+    from RAG import generate_recommendations, retrieve_context
+    from chat_history import ConversationHistory, RECOMMENDATION_MARKER
+    from global_chat_conversation import get_movie_chat_response
+    from movie_context import build_chat_context
+    from movie_descriptions import get_descriptions
+    from movie_ratings import run_movie_rating_search
+    from movie_stream_search import run_streaming_search
+    from movie_trailer_search import run_movie_trailer_search
+    from pipeline import recommendation_turn
+    from resources import get_tmdb_api_key, run_async
+    from validation import validate_input
+
+    timings: Dict[str, float] = {}
+
+    def timed(stage: str, fn: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = fn()
+        timings[stage] = (time.perf_counter() - start) * 1000
+        return result
+
+    themes, genres, actors = inputs["themes"], inputs["genres"], inputs["actors"]
+    timed("validation", lambda: [validate_input(value) for value in (themes, genres, actors)])
+    if pipeline == "async":
+        turn = timed("recommendation_turn", lambda: run_async(recommendation_turn(themes, genres, actors, mode="direct")))
+        top_movies, descriptions = turn["top_movies"], turn["descriptions"]
+    else:
+        retrieved_docs = timed("retrieval", lambda: retrieve_context(themes, genres, actors))
+        recommendations = timed("recommendation", lambda: generate_recommendations(themes, genres, actors, retrieved_docs))
+        top_movies = timed("rating_rerank", lambda: run_movie_rating_search(recommendations, mode="direct"))
+        descriptions = timed("descriptions", lambda: get_descriptions(top_movies, get_tmdb_api_key(), max_entries=3, concurrent=True))
+        timings["recommendation_turn"] = sum(timings[stage] for stage in TURN_STAGES)
+
+    title = top_movies[0]["title"]
+    timed("trailer", lambda: run_movie_trailer_search(title, mode="direct"))
+    timed("providers", lambda: run_streaming_search(title, inputs["country"], mode="direct"))
+
+    history = [{"role": "assistant", "content": f"{RECOMMENDATION_MARKER}\n\n**{title}**\n\n{top_movies[0]['reason']}"}]
+    context = build_chat_context(descriptions)
+    timed("chat_turn", lambda: get_movie_chat_response(history, context, inputs["question"], history_manager=ConversationHistory()))
+
+    timings["session"] = sum(value for stage, value in timings.items() if stage not in TURN_STAGES)
+    return timings
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Reduce per-session timings to p50, p95 and mean per stage."""
+    summary = {}
+    for stage in [stage for stage in STAGES + ["recommendation_turn", "session"] if stage in samples[0]]:
+        values = [sample[stage] for sample in samples]
+        summary[stage] = {
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "mean_ms": float(np.mean(values)),
+        }
+    return summary
+
+def find_regressions(
+    summary: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+    min_delta_ms: float
+) -> List[str]:
+    """List the stages whose p50 or p95 exceeds the baseline by more than the tolerance."""
+    regressions = []
+    for stage, stats in summary.items():
+        expected = baseline.get(stage)
+        if expected is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            limit = expected[metric] * (1 + tolerance) + min_delta_ms
+            if stats[metric] > limit:
+                regressions.append(f"{stage} {metric[:3]}: {stats[metric]:.1f} ms > {limit:.1f} ms (baseline {expected[metric]:.1f} ms)")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages offline against recorded responses.")
+    parser.add_argument("--cassette", type=str, default=None, help="Cassette file with the recorded responses and fixture")
+    parser.add_argument("--record", action="store_true", help="Record missing responses from the live APIs into the cassette")
+    parser.add_argument("--movie-db-path", type=str, default=os.path.join("data", "movies.parquet"), help="Parquet the fixture movies are read from when recording")
+    parser.add_argument("--movies", type=int, default=200, help="Number of fixture movies when the cassette has none")
+    parser.add_argument("--dimensions", type=int, default=None, help="Vector size of the in-memory collection (default: full model size)")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed sessions")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed sessions run first")
+    parser.add_argument("--pipeline", choices=["sequential", "async"], default="sequential", help="How the recommendation turn runs")
+    parser.add_argument("--warm", action="store_true", help="Keep caches between sessions instead of starting every session cold")
+    parser.add_argument("--openai-latency-ms", type=float, default=0.0, help="Latency injected into every OpenAI response")
+    parser.add_argument("--tmdb-latency-ms", type=float, default=0.0, help="Latency injected into every TMDb response")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline file to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to --baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Allowed absolute slowdown against the baseline")
+    args = parser.parse_args()
+
+    if args.record and not args.cassette:
+        parser.error("--record needs --cassette")
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline needs --baseline")
+
+    mode = "record" if args.record else "replay"
+    if mode == "replay":
+        # The modules still need API keys; the stand-ins ignore them
+        for name in API_KEY_NAMES:
+            os.environ.setdefault(name, "offline")
+
+    cassette = Cassette(args.cassette)
+    movies = cassette.fixture.get("movies")
+    if not movies:
+        movies = load_parquet_movies(args.movie_db_path, args.movies) if args.record else synthetic_movies(args.movies)
+        cassette.fixture["movies"] = movies
+    inputs = cassette.fixture.setdefault("inputs", default_inputs(movies))
+
+    openai_server = FakeOpenAIServer(cassette, mode, args.openai_latency_ms, titles=[movie["title"] for movie in movies]).start()
+    tmdb_server = FakeTMDbServer(cassette, mode, args.tmdb_latency_ms, movies=movies).start()
+
+    from resources import EMBEDDING_MODEL_DIMENSIONS
+    configure_pipeline(f"{openai_server.url}/v1", f"{tmdb_server.url}/3")
+    if mode == "replay" and not ensure_tokenizer():
+        print("warning: tiktoken's cl100k_base is not available offline; using a byte-level stand-in")
+
+    # Caches and indexes are resolved relative to the working directory; keep them out of the repository
+    repository_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.chdir(work_dir)
+    try:
+        seed_vector_store(movies, args.dimensions or EMBEDDING_MODEL_DIMENSIONS)
+
+        samples = []
+        for i in range(args.warmup + args.repeats):
+            if not args.warm:
+                reset_caches()
+            timings = run_session(inputs, args.pipeline)
+            if i >= args.warmup:
+                samples.append(timings)
+    finally:
+        os.chdir(repository_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        openai_server.stop()
+        tmdb_server.stop()
+        if args.record:
+            cassette.save()
+
+    summary = summarize(samples)
+    print(f"{'stage':<20} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for stage, stats in summary.items():
+        print(f"{stage:<20} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['mean_ms']:>9.1f}")
+    for server in (openai_server, tmdb_server):
+        print(f"{server.service}: " + ", ".join(f"{name} {count}" for name, count in server.stats.items()))
+    from scheduler import get_scheduler
+    for host, events in get_scheduler().stats().items():
+        print(f"scheduler {host}: " + ", ".join(f"{event} {count}" for event, count in sorted(events.items())))
+    if args.cassette and mode == "replay" and (openai_server.stats["synthesized"] or tmdb_server.stats["synthesized"]):
+        print("warning: some requests were not in the cassette and were answered with synthetic responses")
+
+    config = {
+        "cassette": os.path.basename(args.cassette) if args.cassette else None,
+        "openai_latency_ms": args.openai_latency_ms,
+        "tmdb_latency_ms": args.tmdb_latency_ms,
+        "warm": args.warm,
+        "pipeline": args.pipeline,
+    }
+    if not args.baseline:
+        return
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "stages": summary}, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print(f"warning: baseline was recorded with {baseline.get('config')}, this run used {config}")
+    regressions = find_regressions(summary, baseline["stages"], args.tolerance, args.min_delta_ms)
+    if regressions:
+        print("regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("no regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
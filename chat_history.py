@@ -0,0 +1,185 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+import tiktoken
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+from resources import get_chat_model
+from global_chat_conversation import build_chat_messages
+
+# Total prompt tokens allowed per chat request (system prompt, movie context, summary, history and question)
+HISTORY_TOKEN_BUDGET = 4000
+# Most recent messages kept verbatim; older ones are folded into the rolling summary
+RECENT_MESSAGES = 8
+# Messages that must have left the window before they are summarized, in one background request
+SUMMARY_BATCH_MESSAGES = 6
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_MODEL = "gpt-4o-mini"
+# Approximate per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+# The latest message with this marker names the movie currently shown, so it is never dropped
+RECOMMENDATION_MARKER = "🎬 Here's a movie you might enjoy:"
+
+# Characters per token used when the tokenizer files cannot be loaded
+FALLBACK_CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str) -> Optional[tiktoken.Encoding]:
+    """Return the tokenizer of a model, or None if it cannot be loaded (e.g. offline)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        return None
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count the tokens of a text with the tokenizer of the given model."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text))
+
+def count_message_tokens(messages: List[BaseMessage], model: str = "gpt-4o") -> int:
+    """Count the prompt tokens of a list of chat messages."""
+    return sum(count_tokens(message.content, model) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4o", keep_end: bool = True) -> str:
+    """Keep the last (or with `keep_end=False` the first) `max_tokens` tokens of a text."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        max_chars = max_tokens * FALLBACK_CHARS_PER_TOKEN
+        return text[-max_chars:] if keep_end else text[:max_chars]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
+
+def format_transcript(messages: List[Dict[str, str]]) -> str:
+    """Render history messages as plain "role: content" lines."""
+    return "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+
+def summarize_messages(summary: str, messages: List[Dict[str, str]], model: str = SUMMARY_MODEL) -> str:
+    """
+    Fold new messages into a rolling conversation summary.
+    Falls back to appending the raw transcript if the model call fails.
+    """
+    instructions = (
+        "You maintain a short running summary of a conversation between a user and a movie assistant. "
+        "Update the summary with the new messages. Keep movie titles, user preferences and open questions; "
+        f"drop small talk. Answer with the updated summary only, in at most {SUMMARY_MAX_TOKENS // 2} words."
+    )
+    content = f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{format_transcript(messages)}"
+
+    try:
+        response = get_chat_model(model=model, temperature=0)([SystemMessage(content=instructions), HumanMessage(content=content)])
+        updated = response.content.strip()
+    except Exception as e:
+        updated = ""
+
+    if not updated:
+        updated = f"{summary}\n{format_transcript(messages)}".strip()
+    return truncate_tokens(updated, SUMMARY_MAX_TOKENS)
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+
+class ConversationHistory:
+    """
+    Token-budgeted view of a chat history.
+    Keeps a sliding window of recent messages verbatim, folds older messages in batches into a
+    rolling summary, and drops further old messages until the prompt fits the token budget.
+    Summaries are written on a background worker: until one is ready, the previous summary is used
+    and the messages it will cover stay in the prompt verbatim, so no turn waits for the summarizer.
+    Records how many prompt tokens each turn saved compared to sending the full history.
+    """
+
+    def __init__(
+        self,
+        budget: int = HISTORY_TOKEN_BUDGET,
+        recent_messages: int = RECENT_MESSAGES,
+        model: str = "gpt-4o",
+        summary_batch: int = SUMMARY_BATCH_MESSAGES
+    ):
+        self.budget = budget
+        self.recent_messages = recent_messages
+        self.model = model
+        self.summary_batch = summary_batch
+        self.summary = ""
+        self.summarized_count = 0
+        self.turn_stats: List[Dict[str, int]] = []
+        # Background summary and the history length it covers once adopted
+        self._pending_summary: Optional["Future[str]"] = None
+        self._pending_count = 0
+
+    def _message_tokens(self, message: Dict[str, str]) -> int:
+        return count_tokens(message["content"], self.model) + MESSAGE_OVERHEAD_TOKENS
+
+    def _pinned_index(self, history: List[Dict[str, str]]) -> Optional[int]:
+        """Index of the latest recommendation message, which is kept even outside the window."""
+        for index in range(len(history) - 1, -1, -1):
+            if history[index]["role"] == "assistant" and RECOMMENDATION_MARKER in history[index]["content"]:
+                return index
+        return None
+
+    def _adopt_summary(self) -> None:
+        """Switch to the background summary if it has finished."""
+        if self._pending_summary is not None and self._pending_summary.done():
+            self.summary = self._pending_summary.result()
+            self.summarized_count = self._pending_count
+            self._pending_summary = None
+
+    def _schedule_summary(self, history: List[Dict[str, str]]) -> None:
+        """Start summarizing the messages that left the window once there are at least `summary_batch` of them."""
+        window_start = len(history) - self.recent_messages
+        if self._pending_summary is None and window_start - self.summarized_count >= self.summary_batch:
+            self._pending_count = window_start
+            self._pending_summary = _summary_executor.submit(
+                summarize_messages, self.summary, history[self.summarized_count:window_start]
+            )
+
+    def wait_for_summary(self, timeout: Optional[float] = None) -> None:
+        """Wait for a background summary to finish and adopt it."""
+        if self._pending_summary is not None:
+            self._pending_summary.result(timeout)
+            self._adopt_summary()
+
+    def build_messages(self, history: List[Dict[str, str]], movie_description: str, question: str) -> List[BaseMessage]:
+        """Build the chat prompt messages for a question within the token budget."""
+        full_tokens = count_message_tokens(build_chat_messages(history, movie_description, question), self.model)
+
+        # Messages not yet folded into the summary are kept verbatim, within the budget
+        self._adopt_summary()
+        window_start = self.summarized_count
+        self._schedule_summary(history)
+
+        pinned = self._pinned_index(history)
+        fixed_tokens = count_message_tokens(build_chat_messages([], movie_description, question, self.summary), self.model)
+        if pinned is not None:
+            fixed_tokens += self._message_tokens(history[pinned])
+
+        # Drop the oldest window messages until the prompt fits the budget
+        kept = [index for index in range(window_start, len(history)) if index != pinned]
+        window_tokens = sum(self._message_tokens(history[index]) for index in kept)
+        while kept and fixed_tokens + window_tokens > self.budget:
+            window_tokens -= self._message_tokens(history[kept.pop(0)])
+
+        if pinned is not None:
+            kept = sorted(kept + [pinned])
+        window = [history[index] for index in kept]
+
+        messages = build_chat_messages(window, movie_description, question, self.summary)
+        sent_tokens = count_message_tokens(messages, self.model)
+        self.turn_stats.append({
+            "full_tokens": full_tokens,
+            "sent_tokens": sent_tokens,
+            "saved_tokens": max(full_tokens - sent_tokens, 0),
+        })
+        return messages
+
+    def last_turn_stats(self) -> Optional[Dict[str, int]]:
+        """Token statistics of the most recent turn."""
+        return self.turn_stats[-1] if self.turn_stats else None
+
+    def total_saved_tokens(self) -> int:
+        """Prompt tokens saved over all turns so far."""
+        return sum(stats["saved_tokens"] for stats in self.turn_stats)
@@ -1,71 +1,599 @@
-from typing import Callable
-import pandas as pd
-from langchain.schema import Document
-from langchain.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores.qdrant import Qdrant
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-
-from utils import get_api_key
-import argparse
-
-OPENAI_API_KEY = get_api_key("OPENAI_API_KEY")
-QDRANT_URL = "https://4f78837f-a98f-4bca-b598-903c86199ef2.eu-west-2-0.aws.cloud.qdrant.io"
-QDRANT_API_KEY = get_api_key("QDRANT_API_KEY")
-COLLECTION_NAME = "movies_cluster"
-
-def row_to_document(row: pd.Series) -> Document:
-    """
-    Convert a movie DataFrame row into a LangChain Document.
-    """
-    text_chunks = [
-        f"Movie title: {row['title']}",
-        f"Overview: {row['overview']}",
-        f"Genres: {', '.join(row['genres'])}" if row['genres'] else "",
-        f"Cast: {', '.join(row['cast'])}" if row['cast'] else "",
-    ]
-    full_text = "\n".join(chunk for chunk in text_chunks if chunk)
-    return Document(page_content=full_text)
-
-def create_qdrant_movie_db(
-    movie_db_path: str,
-    openai_api_key: str = OPENAI_API_KEY,
-    qdrant_url: str = QDRANT_URL,
-    qdrant_api_key: str = QDRANT_API_KEY,
-    collection_name: str = COLLECTION_NAME,
-    row_to_doc_fn: Callable[[pd.Series], Document] = row_to_document
-) -> Qdrant:
-    """
-    Create a Qdrant vector store from a movie database parquet file using OpenAI embeddings.
-    """
-    movie_database = pd.read_parquet(movie_db_path)
-    documents = [row_to_doc_fn(row) for _, row in movie_database.iterrows()]
-
-    embedding = OpenAIEmbeddings(model="text-embedding-3-large", api_key=openai_api_key)
-    embedding_dimensions = len(embedding.embed_query("test"))
-
-    qdrant_client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
-
-    qdrant_client.recreate_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=embedding_dimensions, distance=Distance.COSINE)
-    )
-
-    vectorstore = Qdrant.from_documents(
-        documents=documents,
-        embedding=embedding,
-        url=qdrant_url,
-        api_key=qdrant_api_key,
-        collection_name=collection_name
-    )
-
-    return vectorstore
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Create Qdrant movie database from a parquet file.")
-    parser.add_argument("movie_db_path", type=str, help="Path to the movie parquet file")
-    args = parser.parse_args()
-
-    print(f"Creating Qdrant movie database from {args.movie_db_path} ...")
-    vectorstore = create_qdrant_movie_db(args.movie_db_path)
-    print("Qdrant movie database created successfully.")
\ No newline at end of file
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+import hashlib
+import json
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain_community.vectorstores.qdrant import Qdrant
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    PayloadSchemaType,
+    PointIdsList,
+    PointStruct,
+    QuantizationConfig,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
+
+from utils import get_api_key, movie_payload
+from resources import (
+    QDRANT_URL,
+    COLLECTION_NAME,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSIONS,
+    QDRANT_QUANTIZATION,
+    LOCAL_INDEX_DIR,
+    LEXICAL_INDEX_DIR,
+    build_embeddings,
+)
+from local_index import LocalIndexWriter
+from lexical_index import LexicalIndexWriter
+from embedding_cache import CachedEmbeddings
+from disk_cache import CACHE_DIR
+import argparse
+
+OPENAI_API_KEY = get_api_key("OPENAI_API_KEY")
+QDRANT_API_KEY = get_api_key("QDRANT_API_KEY")
+
+POINT_ID_NAMESPACE = uuid.UUID("6f1c3b52-8d0e-4c4e-9a57-2f0a4b7e9d31")
+READ_BATCH_SIZE = 1024
+UPSERT_BATCH_SIZE = 64
+DELETE_BATCH_SIZE = 1000
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "ingestion_checkpoint.json")
+
+# Structured payload fields stored under "metadata" and the Qdrant index type of each
+PAYLOAD_INDEXES = {
+    "metadata.tmdb_id": PayloadSchemaType.INTEGER,
+    "metadata.title": PayloadSchemaType.KEYWORD,
+    "metadata.year": PayloadSchemaType.INTEGER,
+    "metadata.genres": PayloadSchemaType.KEYWORD,
+    "metadata.cast": PayloadSchemaType.KEYWORD,
+    "metadata.rating": PayloadSchemaType.FLOAT,
+    "metadata.votes": PayloadSchemaType.INTEGER,
+}
+
+def row_to_document(row: pd.Series) -> Document:
+    """
+    Convert a movie DataFrame row into a LangChain Document.
+    """
+    text_chunks = [
+        f"Movie title: {row['title']}",
+        f"Overview: {row['overview']}",
+        f"Genres: {', '.join(row['genres'])}" if row['genres'] else "",
+        f"Cast: {', '.join(row['cast'])}" if row['cast'] else "",
+    ]
+    full_text = "\n".join(chunk for chunk in text_chunks if chunk)
+    return Document(page_content=full_text)
+
+def read_movie_batches(
+    movie_db_path: str,
+    batch_size: int = READ_BATCH_SIZE,
+    columns: Optional[List[str]] = None
+) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a movie parquet file as Arrow record batches of at most `batch_size` rows,
+    so memory use does not grow with the size of the catalog.
+    """
+    parquet_file = pq.ParquetFile(movie_db_path)
+    if columns is not None:
+        columns = [name for name in columns if name in parquet_file.schema_arrow.names]
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+def _labelled_list_column(batch: pa.RecordBatch, name: str, label: str) -> pa.Array:
+    """Render a list (or string) column as "<label>: a, b, c", with nulls for missing or empty values."""
+    column = batch.column(name)
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+        column = pc.binary_join(column, ", ")
+    column = column.cast(pa.string())
+    has_value = pc.fill_null(pc.greater(pc.utf8_length(column), 0), False)
+    labelled = pc.binary_join_element_wise(label, column, "")
+    return pc.if_else(has_value, labelled, pa.scalar(None, pa.string()))
+
+def build_page_contents(batch: pa.RecordBatch) -> List[str]:
+    """
+    Build the page_content of every movie in a record batch with vectorized Arrow string kernels.
+    Produces the same text as row_to_document.
+    """
+    chunks = [
+        pc.binary_join_element_wise("Movie title: ", pc.fill_null(batch.column("title").cast(pa.string()), "None"), ""),
+        pc.binary_join_element_wise("Overview: ", pc.fill_null(batch.column("overview").cast(pa.string()), "None"), ""),
+        _labelled_list_column(batch, "genres", "Genres: "),
+        _labelled_list_column(batch, "cast", "Cast: "),
+    ]
+    page_contents = pc.binary_join_element_wise(*chunks, "\n", null_handling="skip")
+    return page_contents.to_pylist()
+
+def movie_point_ids(batch: pa.RecordBatch) -> List[str]:
+    """
+    Return deterministic Qdrant point ids for the movies in a record batch.
+    Uses the TMDb id when the parquet has one, otherwise the title and release date.
+    """
+    names = batch.schema.names
+    titles = batch.column("title").to_pylist()
+    movie_ids = batch.column("id").to_pylist() if "id" in names else [None] * batch.num_rows
+    release_dates = batch.column("release_date").to_pylist() if "release_date" in names else [None] * batch.num_rows
+
+    point_ids = []
+    for movie_id, title, release_date in zip(movie_ids, titles, release_dates):
+        if movie_id is not None:
+            key = f"tmdb:{int(movie_id)}"
+        else:
+            key = f"title:{title}|{release_date or ''}"
+        point_ids.append(str(uuid.uuid5(POINT_ID_NAMESPACE, key)))
+    return point_ids
+
+def movie_metadata(batch: pa.RecordBatch) -> List[Dict[str, Any]]:
+    """
+    Return the structured payload of every movie in a record batch (see utils.movie_payload).
+    Fields whose column is missing from the parquet are None.
+    """
+    names = batch.schema.names
+
+    def column(name: str) -> List[Any]:
+        return batch.column(name).to_pylist() if name in names else [None] * batch.num_rows
+
+    return [
+        movie_payload(*values)
+        for values in zip(
+            column("id"), column("title"), column("release_date"), column("genres"),
+            column("cast"), column("vote_average"), column("vote_count"),
+        )
+    ]
+
+def batch_to_documents(
+    batch: pa.RecordBatch,
+    row_to_doc_fn: Optional[Callable[[pd.Series], Document]] = None
+) -> List[Document]:
+    """
+    Convert a record batch into Documents carrying the structured movie metadata, using the
+    vectorized builder unless a custom per-row conversion function is given.
+    """
+    if row_to_doc_fn is not None:
+        documents = [row_to_doc_fn(row) for _, row in batch.to_pandas().iterrows()]
+    else:
+        documents = [Document(page_content=text) for text in build_page_contents(batch)]
+
+    for doc, metadata in zip(documents, movie_metadata(batch)):
+        doc.metadata = {**metadata, **(doc.metadata or {})}
+    return documents
+
+def content_hash(page_content: str, model: str = EMBEDDING_MODEL, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Hash the text that gets embedded together with the model and the structured metadata,
+    so a change to any of them triggers an upsert.
+    """
+    payload = json.dumps(metadata or {}, sort_keys=True)
+    return hashlib.sha256(f"{model}\n{page_content}\n{payload}".encode("utf-8")).hexdigest()
+
+def upsert_documents(
+    qdrant_client: QdrantClient,
+    collection_name: str,
+    embedding: Embeddings,
+    point_ids: List[str],
+    documents: List[Document],
+    batch_size: int = UPSERT_BATCH_SIZE
+) -> None:
+    """Embed and upsert documents in bounded-size batches."""
+    for start in range(0, len(documents), batch_size):
+        batch_ids = point_ids[start:start + batch_size]
+        batch_docs = documents[start:start + batch_size]
+        vectors = embedding.embed_documents([doc.page_content for doc in batch_docs])
+        model = getattr(embedding, "model", EMBEDDING_MODEL)
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    "page_content": doc.page_content,
+                    "metadata": doc.metadata,
+                    "content_hash": content_hash(doc.page_content, model=model, metadata=doc.metadata),
+                },
+            )
+            for point_id, doc, vector in zip(batch_ids, batch_docs, vectors)
+        ]
+        qdrant_client.upsert(collection_name=collection_name, points=points, wait=True)
+
+def create_embedding(openai_api_key: str, dimensions: Optional[int] = EMBEDDING_DIMENSIONS) -> CachedEmbeddings:
+    """Create the cached OpenAI embeddings model used for ingestion, truncated to `dimensions` when given."""
+    return build_embeddings(openai_api_key, dimensions)
+
+def quantization_config(quantization: str = QDRANT_QUANTIZATION) -> Optional[QuantizationConfig]:
+    """Return the Qdrant quantization config for "none", "scalar" (int8) or "binary"."""
+    if quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if quantization != "none":
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    return None
+
+def create_qdrant_movie_db(
+    movie_db_path: str,
+    openai_api_key: str = OPENAI_API_KEY,
+    qdrant_url: str = QDRANT_URL,
+    qdrant_api_key: str = QDRANT_API_KEY,
+    collection_name: str = COLLECTION_NAME,
+    row_to_doc_fn: Optional[Callable[[pd.Series], Document]] = None,
+    dimensions: Optional[int] = EMBEDDING_DIMENSIONS,
+    quantization: str = QDRANT_QUANTIZATION
+) -> Qdrant:
+    """
+    Create a Qdrant vector store from a movie database parquet file using OpenAI embeddings.
+    The parquet is streamed in record batches, so only one batch of documents is held in memory.
+    Embeddings are truncated to `dimensions` when given and stored with the given quantization.
+    """
+    embedding = create_embedding(openai_api_key, dimensions)
+    embedding_dimensions = len(embedding.embed_query("test"))
+
+    qdrant_client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+
+    qdrant_client.recreate_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=embedding_dimensions, distance=Distance.COSINE),
+        quantization_config=quantization_config(quantization),
+    )
+    ensure_payload_indexes(qdrant_client, collection_name)
+
+    for batch in read_movie_batches(movie_db_path):
+        documents = batch_to_documents(batch, row_to_doc_fn)
+        upsert_documents(qdrant_client, collection_name, embedding, movie_point_ids(batch), documents)
+
+    vectorstore = Qdrant(
+        client=qdrant_client,
+        collection_name=collection_name,
+        embeddings=embedding,
+    )
+
+    return vectorstore
+
+def fetch_existing_hashes(qdrant_client: QdrantClient, collection_name: str) -> Dict[str, str]:
+    """Return a mapping of point id to content hash for every point already in the collection."""
+    existing = {}
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            existing[str(point.id)] = (point.payload or {}).get("content_hash")
+        if offset is None:
+            return existing
+
+def source_fingerprint(movie_db_path: str, collection_name: str) -> str:
+    """Identify a parquet file version and target collection, so checkpoints are only reused for the same run."""
+    stat = os.stat(movie_db_path)
+    return f"{os.path.abspath(movie_db_path)}|{stat.st_size}|{stat.st_mtime_ns}|{collection_name}"
+
+def load_checkpoint(checkpoint_path: str, fingerprint: str) -> int:
+    """Return the number of source rows already processed by an interrupted run over the same source."""
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("fingerprint") != fingerprint:
+        return 0
+    return checkpoint.get("rows_done", 0)
+
+def save_checkpoint(checkpoint_path: str, fingerprint: str, rows_done: int) -> None:
+    """Atomically persist the number of source rows processed so far."""
+    directory = os.path.dirname(checkpoint_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "rows_done": rows_done}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def ensure_payload_indexes(qdrant_client: QdrantClient, collection_name: str) -> None:
+    """Create the payload indexes used for filtered retrieval; existing indexes are left as they are."""
+    schema = qdrant_client.get_collection(collection_name).payload_schema or {}
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name not in schema:
+            qdrant_client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True,
+            )
+
+def ensure_collection(
+    qdrant_client: QdrantClient,
+    collection_name: str,
+    embedding_dimensions: int,
+    quantization: str = QDRANT_QUANTIZATION
+) -> None:
+    """
+    Create the collection and its payload indexes if they do not exist yet.
+    Raises ValueError if an existing collection stores vectors of a different size.
+    """
+    if not qdrant_client.collection_exists(collection_name):
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=embedding_dimensions, distance=Distance.COSINE),
+            quantization_config=quantization_config(quantization),
+        )
+    else:
+        existing_dimensions = qdrant_client.get_collection(collection_name).config.params.vectors.size
+        if existing_dimensions != embedding_dimensions:
+            raise ValueError(
+                f"Collection '{collection_name}' stores {existing_dimensions}-dimensional vectors, "
+                f"but embeddings have {embedding_dimensions} dimensions. Recreate it or use a shadow build."
+            )
+    ensure_payload_indexes(qdrant_client, collection_name)
+
+def sync_qdrant_movie_db(
+    movie_db_path: str,
+    openai_api_key: str = OPENAI_API_KEY,
+    qdrant_url: str = QDRANT_URL,
+    qdrant_api_key: str = QDRANT_API_KEY,
+    collection_name: str = COLLECTION_NAME,
+    row_to_doc_fn: Optional[Callable[[pd.Series], Document]] = None,
+    checkpoint_path: Optional[str] = CHECKPOINT_PATH,
+    dimensions: Optional[int] = EMBEDDING_DIMENSIONS,
+    quantization: str = QDRANT_QUANTIZATION
+) -> Dict[str, int]:
+    """
+    Incrementally synchronize a Qdrant collection with a movie parquet file.
+    Only new or changed movies (by content hash) are embedded and upserted, and movies that are
+    no longer in the parquet are deleted. The parquet is streamed in record batches and progress is
+    checkpointed after every batch, so an interrupted run resumes where it stopped.
+    Returns counts of upserted, deleted and unchanged movies.
+    """
+    embedding = create_embedding(openai_api_key, dimensions)
+    qdrant_client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+    ensure_collection(qdrant_client, collection_name, len(embedding.embed_query("test")), quantization)
+
+    existing = fetch_existing_hashes(qdrant_client, collection_name)
+
+    fingerprint = source_fingerprint(movie_db_path, collection_name)
+    rows_done = load_checkpoint(checkpoint_path, fingerprint) if checkpoint_path else 0
+
+    seen: Set[str] = set()
+    rows_read = 0
+    stats = {"upserted": 0, "deleted": 0, "unchanged": 0}
+
+    for batch in read_movie_batches(movie_db_path):
+        point_ids = movie_point_ids(batch)
+        seen.update(point_ids)
+        rows_read += batch.num_rows
+
+        # Batches completed by an interrupted run only contribute their ids
+        if rows_read <= rows_done:
+            continue
+
+        documents = batch_to_documents(batch, row_to_doc_fn)
+        pending_ids, pending_docs = [], []
+        for point_id, doc in zip(point_ids, documents):
+            if existing.get(point_id) == content_hash(doc.page_content, model=embedding.model, metadata=doc.metadata):
+                stats["unchanged"] += 1
+            else:
+                pending_ids.append(point_id)
+                pending_docs.append(doc)
+
+        upsert_documents(qdrant_client, collection_name, embedding, pending_ids, pending_docs)
+        stats["upserted"] += len(pending_ids)
+
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, fingerprint, rows_read)
+
+    removed = [point_id for point_id in existing if point_id not in seen]
+    for start in range(0, len(removed), DELETE_BATCH_SIZE):
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=removed[start:start + DELETE_BATCH_SIZE]),
+            wait=True,
+        )
+    stats["deleted"] = len(removed)
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return stats
+
+def shadow_collection_name(
+    movie_db_path: str,
+    alias_name: str,
+    dimensions: Optional[int],
+    quantization: str,
+    model: str = EMBEDDING_MODEL
+) -> str:
+    """
+    Name the shadow collection after the parquet file version and build settings, so an interrupted
+    shadow build resumes into the same collection (and from its checkpoint) when run again.
+    """
+    build = f"{source_fingerprint(movie_db_path, alias_name)}|{model}|{dimensions}|{quantization}"
+    return f"{alias_name}_{hashlib.sha1(build.encode('utf-8')).hexdigest()[:12]}"
+
+def build_shadow_collection_and_swap(
+    movie_db_path: str,
+    openai_api_key: str = OPENAI_API_KEY,
+    qdrant_url: str = QDRANT_URL,
+    qdrant_api_key: str = QDRANT_API_KEY,
+    alias_name: str = COLLECTION_NAME,
+    row_to_doc_fn: Optional[Callable[[pd.Series], Document]] = None,
+    delete_previous: bool = True,
+    dimensions: Optional[int] = EMBEDDING_DIMENSIONS,
+    quantization: str = QDRANT_QUANTIZATION
+) -> str:
+    """
+    Build the movie collection into a shadow collection, then atomically point `alias_name` at it.
+    Queries against the alias keep hitting the previous collection for the whole build. The shadow
+    name is derived from the source and settings (see shadow_collection_name), so a rerun after an
+    interruption resumes the same build. With `delete_previous`, the previous collection and shadow
+    collections left behind by abandoned builds (named `<alias>_*` and not behind any alias) are
+    deleted after the swap.
+    `alias_name` must not be the name of an existing concrete collection.
+    Returns the name of the new collection.
+    """
+    qdrant_client = QdrantClient(url=qdrant_url, api_key=qdrant_api_key)
+
+    collection_names = {c.name for c in qdrant_client.get_collections().collections}
+    if alias_name in collection_names:
+        raise ValueError(
+            f"'{alias_name}' is a collection, not an alias. Delete or rename it before using shadow builds."
+        )
+
+    previous = [a.collection_name for a in qdrant_client.get_aliases().aliases if a.alias_name == alias_name]
+    shadow_name = shadow_collection_name(movie_db_path, alias_name, dimensions, quantization)
+
+    sync_qdrant_movie_db(
+        movie_db_path,
+        openai_api_key=openai_api_key,
+        qdrant_url=qdrant_url,
+        qdrant_api_key=qdrant_api_key,
+        collection_name=shadow_name,
+        row_to_doc_fn=row_to_doc_fn,
+        dimensions=dimensions,
+        quantization=quantization,
+    )
+
+    operations = []
+    if previous:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias_name)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=shadow_name, alias_name=alias_name)))
+    qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+
+    if delete_previous:
+        aliased = {a.collection_name for a in qdrant_client.get_aliases().aliases}
+        stale = {name for name in collection_names if name.startswith(f"{alias_name}_") and name not in aliased}
+        for collection_name in (set(previous) | stale) - {shadow_name}:
+            qdrant_client.delete_collection(collection_name)
+
+    return shadow_name
+
+def build_local_movie_index(
+    movie_db_path: str,
+    openai_api_key: str = OPENAI_API_KEY,
+    index_dir: str = LOCAL_INDEX_DIR,
+    quantization: str = "float32",
+    ivf_lists: int = 0,
+    row_to_doc_fn: Optional[Callable[[pd.Series], Document]] = None,
+    dimensions: Optional[int] = EMBEDDING_DIMENSIONS
+) -> int:
+    """
+    Build the local memory-mapped vector index from a movie parquet file.
+    `quantization` is "float32" or "int8"; `ivf_lists` > 0 additionally trains IVF lists
+    for approximate search; embeddings are truncated to `dimensions` when given.
+    Returns the number of indexed movies.
+    """
+    embedding = create_embedding(openai_api_key, dimensions)
+    writer = LocalIndexWriter(index_dir, len(embedding.embed_query("test")), quantization=quantization)
+
+    for batch in read_movie_batches(movie_db_path):
+        documents = batch_to_documents(batch, row_to_doc_fn)
+        for start in range(0, len(documents), UPSERT_BATCH_SIZE):
+            batch_docs = documents[start:start + UPSERT_BATCH_SIZE]
+            vectors = embedding.embed_documents([doc.page_content for doc in batch_docs])
+            writer.add(vectors, [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in batch_docs])
+
+    writer.close(ivf_lists=ivf_lists)
+    return writer.count
+
+def build_lexical_movie_index(
+    movie_db_path: str,
+    index_dir: str = LEXICAL_INDEX_DIR,
+    row_to_doc_fn: Optional[Callable[[pd.Series], Document]] = None
+) -> int:
+    """
+    Build the local BM25 index over the title, cast and genres of every movie in a parquet file.
+    No embeddings are needed. Returns the number of indexed movies.
+    """
+    writer = LexicalIndexWriter(index_dir)
+
+    for batch in read_movie_batches(movie_db_path):
+        documents = batch_to_documents(batch, row_to_doc_fn)
+        columns = {name: batch.column(name).to_pylist() for name in ("title", "cast", "genres") if name in batch.schema.names}
+        for i, doc in enumerate(documents):
+            writer.add(
+                title=columns["title"][i] if "title" in columns else "",
+                cast=columns["cast"][i] if "cast" in columns else [],
+                genres=columns["genres"][i] if "genres" in columns else [],
+                payload={"page_content": doc.page_content, "metadata": doc.metadata},
+            )
+
+    writer.close()
+    return writer.count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create Qdrant movie database from a parquet file.")
+    parser.add_argument("movie_db_path", type=str, help="Path to the movie parquet file")
+    parser.add_argument(
+        "--mode",
+        choices=["recreate", "incremental", "shadow"],
+        default="recreate",
+        help="recreate: rebuild the collection from scratch; incremental: upsert/delete only changed movies; "
+             "shadow: build a new collection and swap it in through an alias"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["qdrant", "local", "lexical"],
+        default="qdrant",
+        help="Build the Qdrant collection, the local memory-mapped index or the local BM25 index "
+             "over title, cast and genres"
+    )
+    parser.add_argument("--index-dir", type=str, default=LOCAL_INDEX_DIR, help="Directory of the local index")
+    parser.add_argument("--quantization", choices=["float32", "int8"], default="float32", help="Local index vector storage")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="Train IVF lists for approximate local search (0 disables)")
+    parser.add_argument("--lexical-index-dir", type=str, default=LEXICAL_INDEX_DIR, help="Directory of the lexical index")
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=EMBEDDING_DIMENSIONS,
+        help="Truncate embeddings to this many dimensions (e.g. 256 or 512); defaults to the full model size"
+    )
+    parser.add_argument(
+        "--qdrant-quantization",
+        choices=["none", "scalar", "binary"],
+        default=QDRANT_QUANTIZATION,
+        help="Vector quantization of new Qdrant collections"
+    )
+    args = parser.parse_args()
+
+    if args.backend == "lexical":
+        print(f"Building lexical movie index in {args.lexical_index_dir} from {args.movie_db_path} ...")
+        count = build_lexical_movie_index(args.movie_db_path, index_dir=args.lexical_index_dir)
+        print(f"Lexical movie index built with {count} movies.")
+    elif args.backend == "local":
+        print(f"Building local movie index in {args.index_dir} from {args.movie_db_path} ...")
+        count = build_local_movie_index(
+            args.movie_db_path,
+            index_dir=args.index_dir,
+            quantization=args.quantization,
+            ivf_lists=args.ivf_lists,
+            dimensions=args.dimensions,
+        )
+        print(f"Local movie index built with {count} movies.")
+    elif args.mode == "incremental":
+        print(f"Synchronizing Qdrant movie database with {args.movie_db_path} ...")
+        stats = sync_qdrant_movie_db(args.movie_db_path, dimensions=args.dimensions, quantization=args.qdrant_quantization)
+        print(f"Qdrant movie database synchronized: {stats}")
+    elif args.mode == "shadow":
+        print(f"Building shadow Qdrant movie database from {args.movie_db_path} ...")
+        collection_name = build_shadow_collection_and_swap(
+            args.movie_db_path, dimensions=args.dimensions, quantization=args.qdrant_quantization
+        )
+        print(f"Alias '{COLLECTION_NAME}' now points to '{collection_name}'.")
+    else:
+        print(f"Creating Qdrant movie database from {args.movie_db_path} ...")
+        vectorstore = create_qdrant_movie_db(
+            args.movie_db_path, dimensions=args.dimensions, quantization=args.qdrant_quantization
+        )
+        print("Qdrant movie database created successfully.")
\ No newline at end of file
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+CACHE_DIR = ".cache"
+# Access times only matter for LRU eviction, so a hit refreshes them only when they are older than
+# this many seconds, and refreshes are written in batches (before writes, eviction and ordered reads,
+# or once ACCESS_FLUSH_SIZE are pending) instead of one commit per hit
+ACCESS_REFRESH_INTERVAL = 60.0
+ACCESS_FLUSH_SIZE = 256
+
+class DiskCache:
+    """
+    Persistent key/value store backed by a single SQLite file.
+    Entries can expire after a TTL, the store is bounded to `max_entries` with
+    least-recently-used eviction, and hit/miss/eviction counters are kept per instance.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # Key -> access time not yet written to the database
+        self._pending_access: Dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value stored under `key`, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, last_access FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, last_access = row
+            if expires_at is not None and expires_at <= now:
+                self._pending_access.pop(key, None)
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+
+            if now - self._pending_access.get(key, last_access) >= ACCESS_REFRESH_INTERVAL:
+                self._pending_access[key] = now
+                if len(self._pending_access) >= ACCESS_FLUSH_SIZE:
+                    self._flush_access()
+                    self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store `value` under `key`. A `ttl` in seconds makes the entry expire; None keeps it until evicted."""
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), expires_at, now),
+            )
+            self._pending_access.pop(key, None)
+            self._evict()
+            self._conn.commit()
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None) -> None:
+        """Store several entries in one transaction, running eviction once at the end."""
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                [(key, sqlite3.Binary(value), expires_at, now) for key, value in items.items()],
+            )
+            for key in items:
+                self._pending_access.pop(key, None)
+            self._evict()
+            self._conn.commit()
+
+    def items(self) -> List[Tuple[str, bytes]]:
+        """Return every entry that has not expired, most recently used first. Does not touch the counters or access times."""
+        with self._lock:
+            if self._pending_access:
+                self._flush_access()
+                self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT key, value FROM cache WHERE expires_at IS NULL OR expires_at > ? ORDER BY last_access DESC",
+                (time.time(),),
+            ).fetchall()
+        return [(key, bytes(value)) for key, value in rows]
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry if present."""
+        with self._lock:
+            self._pending_access.pop(key, None)
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._pending_access.clear()
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self.hits = self.misses = self.evictions = 0
+
+    def flush(self) -> None:
+        """Write pending access times to the database."""
+        with self._lock:
+            if self._pending_access:
+                self._flush_access()
+                self._conn.commit()
+
+    def _flush_access(self) -> None:
+        """Write pending access times without committing. Caller holds the lock."""
+        self._conn.executemany(
+            "UPDATE cache SET last_access = ? WHERE key = ?",
+            [(accessed, key) for key, accessed in self._pending_access.items()],
+        )
+        self._pending_access.clear()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the least recently used ones above `max_entries`. Caller holds the lock."""
+        self._flush_access()
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/eviction counters, the hit rate and the current number of entries."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
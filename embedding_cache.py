@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from disk_cache import DiskCache, CACHE_DIR
+import metrics
+
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite")
+MEMORY_MAX_ENTRIES = 10000
+DISK_MAX_ENTRIES = 200000
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a user query for the cache key: case and whitespace only. Digits and punctuation are
+    kept, since they change the meaning ("Rocky 2" vs "Rocky 3", "Se7en", "WALL-E").
+    """
+    return " ".join(text.lower().split())
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that caches vectors keyed by model and text.
+    Vectors are held as float32 arrays in an in-memory LRU and persisted to an on-disk cache,
+    so repeated inputs such as "comedy" or "Ryan Gosling" are embedded only once.
+    User queries (embed_query, embed_queries) are keyed case- and whitespace-insensitively;
+    documents (embed_documents) are keyed by their exact text.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        memory_max_entries: int = MEMORY_MAX_ENTRIES,
+        disk_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        disk_max_entries: int = DISK_MAX_ENTRIES
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.memory_max_entries = memory_max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = DiskCache(disk_path, max_entries=disk_max_entries) if disk_path else None
+
+    def _key(self, text: str, query: bool = False) -> str:
+        """Build the cache key for a text; user queries are normalized first."""
+        if query:
+            text = normalize_query(text) or text
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{digest}"
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached vector for a key from memory, falling back to disk."""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+
+        if self._disk is not None:
+            stored = self._disk.get(key)
+            if stored is not None:
+                vector = np.frombuffer(stored, dtype=np.float32)
+                self._remember(key, vector)
+                return vector
+
+        return None
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Insert a vector into the in-memory LRU, evicting the oldest entry if it is full."""
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max_entries:
+                self._memory.popitem(last=False)
+
+    def _store(self, vectors: Dict[str, np.ndarray]) -> None:
+        """Store freshly computed vectors in memory and on disk."""
+        for key, vector in vectors.items():
+            self._remember(key, vector)
+        if self._disk is not None:
+            self._disk.set_many({key: vector.tobytes() for key, vector in vectors.items()})
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, computing only the ones missing from the cache in a single batch."""
+        return self._embed_many(texts, query=False)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several user queries in one batch, sharing the cache entries of embed_query."""
+        return self._embed_many(texts, query=True)
+
+    def _embed_many(self, texts: List[str], query: bool) -> List[List[float]]:
+        keys = [self._key(text, query) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self._lookup(key) for key in keys]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        metrics.record_cache("embeddings", hits=len(texts) - len(missing), misses=len(missing))
+
+        if missing:
+            # Embed each distinct key once even if it appears several times in the batch
+            first_index: Dict[str, int] = {}
+            for i in missing:
+                first_index.setdefault(keys[i], i)
+
+            computed = self.embeddings.embed_documents([texts[i] for i in first_index.values()])
+            computed_by_key = {
+                key: np.asarray(values, dtype=np.float32)
+                for key, values in zip(first_index, computed)
+            }
+            self._store(computed_by_key)
+
+            for i in missing:
+                vectors[i] = computed_by_key[keys[i]]
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query text through the cache."""
+        key = self._key(text, query=True)
+        vector = self._lookup(key)
+
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.record_cache("embeddings", hits=int(vector is not None), misses=int(vector is None))
+
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self._store({key: vector})
+
+        return vector.tolist()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the hit rate of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,458 @@
+"""
+Local stand-ins for the OpenAI and TMDb HTTP APIs, used by bench_pipeline.py.
+
+Requests are answered from a cassette of recorded responses. In "record" mode a request missing
+from the cassette is forwarded to the real API and its response is stored; in "replay" mode
+nothing leaves the machine and a deterministic response is synthesized instead (and counted as
+a miss, so a replay that drifted from its recording is visible). A fixed latency can be injected
+into every response to stand in for network and model time.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import numpy as np
+import requests
+from utils import normalize_text
+
+OPENAI_UPSTREAM = "https://api.openai.com"
+TMDB_UPSTREAM = "https://api.themoviedb.org"
+UPSTREAM_TIMEOUT = 120
+SYNTHETIC_DIMENSIONS = 3072
+
+SYNTHETIC_GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Drama", "Family", "Fantasy",
+    "History", "Horror", "Mystery", "Romance", "Science Fiction", "Thriller", "War",
+]
+SYNTHETIC_WORDS = [
+    "Silent", "Midnight", "Broken", "Golden", "Last", "Hidden", "Distant", "Burning",
+    "River", "Garden", "Empire", "Signal", "Harbor", "Winter", "Orbit", "Promise",
+]
+SYNTHETIC_NAMES = [
+    "Ana Ruiz", "Tom Berg", "Mia Novak", "Leo Park", "Ida Moreau", "Sam Okafor",
+    "Eva Lind", "Noah Reyes", "Zoe Brandt", "Omar Haddad", "Lena Vogel", "Kai Tanaka",
+]
+SYNTHETIC_PROVIDERS = ["Netflix", "Amazon Prime Video", "Disney Plus", "Apple TV", "Max", "Mubi"]
+SYNTHETIC_COUNTRIES = ["US", "GB", "DE", "FR", "LT"]
+
+class Cassette:
+    """Recorded HTTP responses and the benchmark fixture (movies and inputs), stored as one JSON file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.fixture: Dict[str, Any] = {}
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.fixture = data.get("fixture", {})
+            self.responses = data.get("responses", {})
+
+    @staticmethod
+    def key(service: str, method: str, path: str, params: Dict[str, str], body: Any) -> str:
+        """Identify a request by service, method, path, query parameters and JSON body."""
+        request = json.dumps([service, method, path, sorted(params.items()), body], sort_keys=True)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.responses.get(key)
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            self.responses[key] = response
+
+    def save(self) -> None:
+        """Write the cassette back to its file."""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"fixture": self.fixture, "responses": self.responses}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+def _stable_int(text: str) -> int:
+    """A stable non-negative integer derived from a text."""
+    return zlib.crc32(text.encode("utf-8"))
+
+def synthetic_movies(count: int) -> List[Dict[str, Any]]:
+    """Deterministic movie records shaped like rows of the movie parquet."""
+    movies = []
+    for i in range(count):
+        first, second = SYNTHETIC_WORDS[i % len(SYNTHETIC_WORDS)], SYNTHETIC_WORDS[(i * 7 + 3) % len(SYNTHETIC_WORDS)]
+        genres = [SYNTHETIC_GENRES[(i + j * 5) % len(SYNTHETIC_GENRES)] for j in range(1 + i % 3)]
+        cast = [SYNTHETIC_NAMES[(i + j * 5) % len(SYNTHETIC_NAMES)] for j in range(3)]
+        movies.append({
+            "id": 100000 + i,
+            "title": f"The {first} {second} {i}",
+            "overview": f"A {genres[0].lower()} story about a {first.lower()} {second.lower()} and the people around it.",
+            "genres": genres,
+            "cast": cast,
+            "release_date": f"{1980 + i % 45}-0{1 + i % 9}-15",
+            "vote_average": round(4.0 + (i * 37 % 60) / 10, 1),
+        })
+    return movies
+
+class StandInServer:
+    """
+    Threaded HTTP server on localhost that answers requests from a cassette, records them from
+    the upstream API, or synthesizes them. Subclasses define the service and the synthetic answers.
+    """
+
+    service = ""
+    upstream = ""
+    # Query parameters that carry credentials and are left out of cassette keys
+    secret_params: Tuple[str, ...] = ()
+
+    def __init__(self, cassette: Cassette, mode: str = "replay", latency_ms: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported mode: {mode}")
+        self.cassette = cassette
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.stats = {"requests": 0, "hits": 0, "recorded": 0, "synthesized": 0}
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"{self.service}-stand-in", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms per request
+            disable_nagle_algorithm = True
+
+            def _handle(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw_body = self.rfile.read(length) if length else b""
+                url = urlsplit(self.path)
+                status, content_type, body = server.respond(
+                    self.command, url.path, dict(parse_qsl(url.query)), raw_body, dict(self.headers)
+                )
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                if not content_type.startswith("text/event-stream"):
+                    if server.latency_ms:
+                        time.sleep(server.latency_ms / 1000)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                # Server-sent events are written one by one, with the latency spread over them
+                events = [event + b"\n\n" for event in body.split(b"\n\n") if event.strip()]
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in events:
+                    if server.latency_ms:
+                        time.sleep(server.latency_ms / 1000 / len(events))
+                    self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def respond(
+        self,
+        method: str,
+        path: str,
+        params: Dict[str, str],
+        raw_body: bytes,
+        headers: Dict[str, str]
+    ) -> Tuple[int, str, bytes]:
+        """Answer one request and return its status, content type and body (the latency is added by the handler)."""
+        body = json.loads(raw_body) if raw_body else None
+        key_params = {name: value for name, value in params.items() if name not in self.secret_params}
+        key = self.cassette.key(self.service, method, path, key_params, body)
+
+        self._count("requests")
+        recorded = self.cassette.get(key)
+        if recorded is not None:
+            self._count("hits")
+        elif self.mode == "record":
+            recorded = self.forward(method, path, params, raw_body, headers)
+            if recorded["status"] == 200:
+                self.cassette.put(key, recorded)
+                self._count("recorded")
+        else:
+            status, data = self.synthesize(method, path, params, body)
+            content_type, text = self.encode(body, data)
+            recorded = {"status": status, "content_type": content_type, "body": text}
+            self._count("synthesized")
+
+        return recorded["status"], recorded["content_type"], recorded["body"].encode("utf-8")
+
+    def forward(
+        self,
+        method: str,
+        path: str,
+        params: Dict[str, str],
+        raw_body: bytes,
+        headers: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """Send a request to the upstream API and return its response in cassette form."""
+        forwarded_headers = {
+            name: value for name, value in headers.items()
+            if name.lower() in ("authorization", "content-type", "accept", "openai-organization")
+        }
+        response = requests.request(
+            method,
+            f"{self.upstream}{path}",
+            params=params,
+            data=raw_body or None,
+            headers=forwarded_headers,
+            timeout=UPSTREAM_TIMEOUT,
+        )
+        return {
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", "application/json"),
+            "body": response.text,
+        }
+
+    def synthesize(self, method: str, path: str, params: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def encode(self, body: Any, data: Any) -> Tuple[str, str]:
+        """Return the content type and text of a synthetic response."""
+        return "application/json", json.dumps(data)
+
+class FakeOpenAIServer(StandInServer):
+    """
+    Stand-in for the OpenAI API (embeddings, chat completions, streamed or not, models); clients use `url + "/v1"`.
+    Synthetic embeddings are random unit vectors seeded by the input, and synthetic recommendations
+    pick the movie titles found in the prompt, padded with `titles`.
+    """
+
+    service = "openai"
+    upstream = OPENAI_UPSTREAM
+
+    def __init__(self, cassette: Cassette, mode: str = "replay", latency_ms: float = 0.0, titles: Optional[List[str]] = None):
+        super().__init__(cassette, mode, latency_ms)
+        self.titles = titles or []
+
+    def synthesize(self, method: str, path: str, params: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        if path.endswith("/embeddings"):
+            return 200, self.embeddings_response(body)
+        if path.endswith("/chat/completions"):
+            return 200, self.chat_response(body)
+        if "/models/" in path:
+            return 200, {"id": path.rsplit("/", 1)[-1], "object": "model", "created": 0, "owned_by": "system"}
+        return 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}}
+
+    def embeddings_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        # A list of token ids is a single input, not a batch
+        if inputs and isinstance(inputs[0], int):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or SYNTHETIC_DIMENSIONS
+
+        data = []
+        for index, item in enumerate(inputs):
+            digest = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+            vector = np.random.default_rng(int.from_bytes(digest[:8], "little")).standard_normal(dimensions)
+            vector = (vector / np.linalg.norm(vector)).astype(np.float32)
+            if body.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        tokens = sum(len(item) if isinstance(item, list) else len(str(item)) // 4 for item in inputs)
+        return {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def encode(self, body: Any, data: Any) -> Tuple[str, str]:
+        """Send chat completions requested with `stream` as server-sent chunks of about 16 characters."""
+        if not (isinstance(body, dict) and body.get("stream") and data.get("object") == "chat.completion"):
+            return super().encode(body, data)
+
+        content = data["choices"][0]["message"]["content"]
+        base = {"id": data["id"], "object": "chat.completion.chunk", "created": 0, "model": data["model"]}
+        deltas = [{"role": "assistant", "content": ""}] + [{"content": content[i:i + 16]} for i in range(0, len(content), 16)]
+        chunks = [{**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunks.append({**base, "choices": [], "usage": data["usage"]})
+        events = [f"data: {json.dumps(chunk)}" for chunk in chunks] + ["data: [DONE]"]
+        return "text/event-stream; charset=utf-8", "\n\n".join(events) + "\n\n"
+
+    def chat_content(self, body: Dict[str, Any]) -> str:
+        prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+
+        if body.get("response_format"):
+            # Structured output of the input validation
+            match = re.search(r'Input: "(.*)"', prompt)
+            return json.dumps({"input_value": match.group(1) if match else "", "validation_result": "yes"})
+
+        if "Recommend exactly 9 movies" in prompt:
+            titles = list(dict.fromkeys(re.findall(r"Movie title: (.+)", prompt) + self.titles))[:9]
+            recommendations = [
+                {"title": title, "reason": f"{title} matches the requested topics. It fits your favourite genres."}
+                for title in titles
+            ]
+            return "```json\n" + json.dumps({"recommendations": recommendations}) + "\n```"
+
+        return "It is a well-paced movie with a strong cast; the reviews praise its direction and score."
+
+    def chat_response(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        content = self.chat_content(body)
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in body.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": "chatcmpl-stand-in",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+class FakeTMDbServer(StandInServer):
+    """
+    Stand-in for the TMDb API (search, details, credits, reviews, videos, watch providers);
+    clients use `url + "/3"`. Synthetic responses describe the fixture movies, and titles
+    outside the fixture get a movie derived from the title.
+    """
+
+    service = "tmdb"
+    upstream = TMDB_UPSTREAM
+    secret_params = ("api_key",)
+
+    def __init__(self, cassette: Cassette, mode: str = "replay", latency_ms: float = 0.0, movies: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(cassette, mode, latency_ms)
+        self._movies_lock = threading.Lock()
+        self.movies: Dict[int, Dict[str, Any]] = {}
+        self.titles: Dict[str, int] = {}
+        for movie in movies or []:
+            self._add_movie(movie)
+
+    def _add_movie(self, movie: Dict[str, Any]) -> Dict[str, Any]:
+        with self._movies_lock:
+            self.movies[movie["id"]] = movie
+            self.titles.setdefault(normalize_text(movie["title"]), movie["id"])
+        return movie
+
+    def movie_by_title(self, title: str) -> Dict[str, Any]:
+        with self._movies_lock:
+            movie_id = self.titles.get(normalize_text(title))
+        if movie_id is not None:
+            return self.movies[movie_id]
+        seed = _stable_int(normalize_text(title))
+        return self._add_movie(self._derived_movie(900000 + seed % 100000, title))
+
+    def movie_by_id(self, movie_id: int) -> Dict[str, Any]:
+        with self._movies_lock:
+            movie = self.movies.get(movie_id)
+        return movie or self._derived_movie(movie_id, f"Movie {movie_id}")
+
+    @staticmethod
+    def _derived_movie(movie_id: int, title: str) -> Dict[str, Any]:
+        return {
+            "id": movie_id,
+            "title": title,
+            "overview": f"{title} follows a small group of people through one eventful year.",
+            "genres": [SYNTHETIC_GENRES[movie_id % len(SYNTHETIC_GENRES)]],
+            "cast": [SYNTHETIC_NAMES[(movie_id + j) % len(SYNTHETIC_NAMES)] for j in range(3)],
+            "release_date": f"{1980 + movie_id % 45}-06-01",
+            "vote_average": round(4.0 + movie_id % 60 / 10, 1),
+        }
+
+    def synthesize(self, method: str, path: str, params: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        parts = path.strip("/").split("/")[1:]
+        if parts == ["search", "movie"]:
+            movie = self.movie_by_title(params.get("query", ""))
+            result = {key: movie[key] for key in ("id", "title", "overview", "release_date", "vote_average")}
+            return 200, {"page": 1, "results": [result], "total_pages": 1, "total_results": 1}
+
+        if len(parts) >= 2 and parts[0] == "movie" and parts[1].isdigit():
+            movie = self.movie_by_id(int(parts[1]))
+            resource = "/".join(parts[2:])
+            if resource == "":
+                details = self.details(movie)
+                for name in filter(None, params.get("append_to_response", "").split(",")):
+                    details[name] = self.sub_resource(movie, name)
+                return 200, details
+            if resource in ("credits", "reviews", "videos", "watch/providers"):
+                return 200, self.sub_resource(movie, resource)
+
+        return 404, {"success": False, "status_code": 34, "status_message": "The resource you requested could not be found."}
+
+    @staticmethod
+    def details(movie: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": movie["id"],
+            "title": movie["title"],
+            "overview": movie.get("overview") or "",
+            "release_date": movie.get("release_date") or "",
+            "runtime": 90 + movie["id"] % 60,
+            "genres": [{"id": i, "name": genre} for i, genre in enumerate(movie.get("genres") or [])],
+            "vote_average": movie.get("vote_average") or 0,
+            "production_companies": [{"name": "Stand-in Pictures"}],
+            "production_countries": [{"name": "United States of America"}],
+        }
+
+    @staticmethod
+    def sub_resource(movie: Dict[str, Any], name: str) -> Dict[str, Any]:
+        movie_id = movie["id"]
+        if name == "credits":
+            cast = [{"name": name, "character": "Lead"} for name in movie.get("cast") or []]
+            crew = [{"name": SYNTHETIC_NAMES[movie_id % len(SYNTHETIC_NAMES)], "job": "Director"}]
+            return {"id": movie_id, "cast": cast, "crew": crew}
+        if name == "reviews":
+            review = f"{movie['title']} is carefully made and well acted, although the middle part drags a little."
+            return {"id": movie_id, "page": 1, "results": [{"author": "critic", "content": review}] * 2}
+        if name == "videos":
+            return {"id": movie_id, "results": [{"type": "Trailer", "official": True, "site": "YouTube", "key": f"standin{movie_id}"}]}
+        if name == "watch/providers":
+            provider = SYNTHETIC_PROVIDERS[movie_id % len(SYNTHETIC_PROVIDERS)]
+            results = {
+                country: {"flatrate": [{"provider_name": provider}], "rent": [{"provider_name": "Apple TV"}]}
+                for country in SYNTHETIC_COUNTRIES
+            }
+            return {"id": movie_id, "results": results}
+        return {"id": movie_id}
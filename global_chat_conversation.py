@@ -1,138 +1,237 @@
-from typing import List, Dict, Any, Union
-import json
-
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    SystemMessagePromptTemplate,
-    HumanMessagePromptTemplate,
-)
-from langchain.schema import HumanMessage, AIMessage
-from utils import get_api_key
-
-OPENAI_API_KEY = get_api_key("OPENAI_API_KEY")
-
-def get_movie_chat_response(
-    history: List[Dict[str, str]],
-    movie_description: str,
-    question: str,
-    model_name: str = "gpt-4o",
-    temperature: float = 0.7
-) -> Dict[str, Any]:
-    """
-    Generate a movie-related chat response using LangChain and OpenAI chat model.
-    """
-
-    def convert_messages(raw_msgs: List[Dict[str, str]]) -> List[Union[HumanMessage, AIMessage]]:
-        msgs = []
-        for msg in raw_msgs:
-            if msg["role"] == "user":
-                msgs.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                msgs.append(AIMessage(content=msg["content"]))
-        return msgs
-
-    lc_history = convert_messages(history)
-
-    system_message_template = SystemMessagePromptTemplate.from_template(
-        """
-        You are a knowledgeable and helpful assistant specialized **exclusively** in answering questions about movies.
-
-        Below you will find detailed descriptions of movies recommended to the user:
-
-        Detailed descriptions:
-        {movie_description}
-
-        When responding, prioritize information from this context. Use your general movie knowledge only when necessary.
-
-        You will also have access to the conversation history. In the history, look for the movie name under the section titled:
-        "🎬 Here's a movie you might enjoy:"
-        This indicates the movie currently presented to the user. If the user refers to "this movie," it means the one
-        in that section. However, the user may also ask about other movies from the list, so be prepared to address those as well.
-
-        Additional guidelines:
-        - Answer **only** questions related to the movies or movie-related topics.
-        - If the user asks about subjects outside of movies, politely inform them that your expertise is 
-         limited to movies, and kindly encourage them to ask movie-related questions.
-        - Aim to bring the conversation to a natural close after providing sufficient assistance; avoid endless back-and-forth.
-        - Every few messages, gently ask a question like: "Would you like to continue chatting about movies, 
-        or should we wrap up?" Feel free to use similar phrasing.
-        - If the user indicates they want to end the conversation (e.g., says bye, thanks, no more questions), 
-        call the function 'end_conversation' to signal that the chat should end gracefully.
-        - Otherwise, continue to answer questions about movies.
-
-        """
-    )
-
-    prompt = ChatPromptTemplate.from_messages([
-        system_message_template,
-        MessagesPlaceholder(variable_name="history"),
-        HumanMessagePromptTemplate.from_template("{input}")
-    ])
-
-    formatted_prompt = prompt.format_prompt(
-        movie_description=movie_description,
-        history=lc_history,
-        input=question
-    )
-
-    functions = [
-        {
-            "name": "end_conversation",
-            "description": "Signal to end the conversation gracefully",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "message": {
-                        "type": "string",
-                        "description": "Final message to the user to wrap up the conversation"
-                    }
-                },
-                "required": [],
-            },
-        }
-    ]
-
-    llm = ChatOpenAI(
-        model_name=model_name,
-        temperature=temperature,
-        openai_api_key=OPENAI_API_KEY,
-    )
-
-    try:
-        response = llm(
-            formatted_prompt.to_messages(),
-            functions=functions,
-            function_call="auto"
-        )
-
-        if not response or (not response.content and not response.additional_kwargs.get("function_call")):
-            return {
-                "error": True,
-                "message": "Something went wrong while generating a response. Please try again."
-            }
-
-        if response.additional_kwargs.get("function_call", {}).get("name") == "end_conversation":
-            args_json = response.additional_kwargs["function_call"].get("arguments", "{}")
-            try:
-                args = json.loads(args_json)
-                farewell = args.get("message", "Alright then! If you have more questions in the future, feel free to reach out.")
-            except json.JSONDecodeError:
-                farewell = "Alright then! If you have more questions in the future, feel free to reach out."
-
-            return {
-                "end_conversation": True,
-                "message": farewell
-            }
-
-        return {
-            "end_conversation": False,
-            "message": response.content
-        }
-
-    except Exception as e:
-        return {
-            "error": True,
-            "message": "Something went wrong while contacting the model. Please try again."
-        }
\ No newline at end of file
+from typing import List, Dict, Any, Iterator, Optional, Union, TYPE_CHECKING
+import json
+
+from langchain.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    SystemMessagePromptTemplate,
+    HumanMessagePromptTemplate,
+)
+from langchain.schema import HumanMessage, AIMessage, BaseMessage, SystemMessage
+from resources import get_chat_model
+from metrics import timed_stage
+
+if TYPE_CHECKING:
+    from chat_history import ConversationHistory
+
+DEFAULT_FAREWELL = "Alright then! If you have more questions in the future, feel free to reach out."
+
+functions = [
+    {
+        "name": "end_conversation",
+        "description": "Signal to end the conversation gracefully",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "message": {
+                    "type": "string",
+                    "description": "Final message to the user to wrap up the conversation"
+                }
+            },
+            "required": [],
+        },
+    }
+]
+
+def build_chat_messages(
+    history: List[Dict[str, str]],
+    movie_description: str,
+    question: str,
+    summary: str = ""
+) -> List[BaseMessage]:
+    """
+    Build the chat prompt messages from the system instructions, movie descriptions, history and question.
+    A summary of earlier, compacted turns is added as a system message before the history.
+    """
+
+    def convert_messages(raw_msgs: List[Dict[str, str]]) -> List[Union[HumanMessage, AIMessage]]:
+        msgs = []
+        for msg in raw_msgs:
+            if msg["role"] == "user":
+                msgs.append(HumanMessage(content=msg["content"]))
+            elif msg["role"] == "assistant":
+                msgs.append(AIMessage(content=msg["content"]))
+        return msgs
+
+    lc_history = convert_messages(history)
+
+    system_message_template = SystemMessagePromptTemplate.from_template(
+        """
+        You are a knowledgeable and helpful assistant specialized **exclusively** in answering questions about movies.
+
+        Below you will find detailed descriptions of movies recommended to the user:
+
+        Detailed descriptions:
+        {movie_description}
+
+        When responding, prioritize information from this context. Use your general movie knowledge only when necessary.
+
+        You will also have access to the conversation history. In the history, look for the movie name under the section titled:
+        "🎬 Here's a movie you might enjoy:"
+        This indicates the movie currently presented to the user. If the user refers to "this movie," it means the one
+        in that section. However, the user may also ask about other movies from the list, so be prepared to address those as well.
+
+        Additional guidelines:
+        - Answer **only** questions related to the movies or movie-related topics.
+        - If the user asks about subjects outside of movies, politely inform them that your expertise is 
+         limited to movies, and kindly encourage them to ask movie-related questions.
+        - Aim to bring the conversation to a natural close after providing sufficient assistance; avoid endless back-and-forth.
+        - Every few messages, gently ask a question like: "Would you like to continue chatting about movies, 
+        or should we wrap up?" Feel free to use similar phrasing.
+        - If the user indicates they want to end the conversation (e.g., says bye, thanks, no more questions), 
+        call the function 'end_conversation' to signal that the chat should end gracefully.
+        - Otherwise, continue to answer questions about movies.
+
+        """
+    )
+
+    prompt = ChatPromptTemplate.from_messages([
+        system_message_template,
+        MessagesPlaceholder(variable_name="history"),
+        HumanMessagePromptTemplate.from_template("{input}")
+    ])
+
+    formatted_prompt = prompt.format_prompt(
+        movie_description=movie_description,
+        history=lc_history,
+        input=question
+    )
+
+    messages = formatted_prompt.to_messages()
+    if summary:
+        messages.insert(1, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+
+    return messages
+
+def build_prompt_messages(
+    history: List[Dict[str, str]],
+    movie_description: str,
+    question: str,
+    history_manager: Optional["ConversationHistory"] = None
+) -> List[BaseMessage]:
+    """Build the chat prompt, compacting the history to the token budget when a history manager is given."""
+    if history_manager is None:
+        return build_chat_messages(history, movie_description, question)
+    return history_manager.build_messages(history, movie_description, question)
+
+def parse_farewell(args_json: str) -> str:
+    """Extract the farewell message from the arguments of an 'end_conversation' function call."""
+    try:
+        args = json.loads(args_json or "{}")
+        return args.get("message", DEFAULT_FAREWELL)
+    except json.JSONDecodeError:
+        return DEFAULT_FAREWELL
+
+@timed_stage("chat")
+def get_movie_chat_response(
+    history: List[Dict[str, str]],
+    movie_description: str,
+    question: str,
+    model_name: str = "gpt-4o",
+    temperature: float = 0.7,
+    history_manager: Optional["ConversationHistory"] = None
+) -> Dict[str, Any]:
+    """
+    Generate a movie-related chat response using LangChain and OpenAI chat model.
+    """
+
+    messages = build_prompt_messages(history, movie_description, question, history_manager)
+
+    llm = get_chat_model(model=model_name, temperature=temperature)
+
+    try:
+        response = llm(
+            messages,
+            functions=functions,
+            function_call="auto"
+        )
+
+        if not response or (not response.content and not response.additional_kwargs.get("function_call")):
+            return {
+                "error": True,
+                "message": "Something went wrong while generating a response. Please try again."
+            }
+
+        if response.additional_kwargs.get("function_call", {}).get("name") == "end_conversation":
+            args_json = response.additional_kwargs["function_call"].get("arguments", "{}")
+            return {
+                "end_conversation": True,
+                "message": parse_farewell(args_json)
+            }
+
+        return {
+            "end_conversation": False,
+            "message": response.content
+        }
+
+    except Exception as e:
+        return {
+            "error": True,
+            "message": "Something went wrong while contacting the model. Please try again."
+        }
+
+class ChatResponseStream:
+    """
+    Iterable over the text tokens of a streamed chat response, suitable for st.write_stream.
+    Once iteration has finished, `result()` returns the same dictionary shape as get_movie_chat_response.
+    """
+
+    def __init__(self, messages: List[BaseMessage], model_name: str, temperature: float):
+        self.messages = messages
+        self.model_name = model_name
+        self.temperature = temperature
+        self.end_conversation = False
+        self.error = False
+        self.message = ""
+
+    @timed_stage("chat")
+    def __iter__(self) -> Iterator[str]:
+        llm = get_chat_model(model=self.model_name, temperature=self.temperature)
+        function_name = ""
+        function_arguments = ""
+
+        try:
+            for chunk in llm.stream(self.messages, functions=functions, function_call="auto"):
+                function_call = chunk.additional_kwargs.get("function_call")
+                if function_call:
+                    function_name += function_call.get("name") or ""
+                    function_arguments += function_call.get("arguments") or ""
+                    continue
+
+                if chunk.content:
+                    self.message += chunk.content
+                    yield chunk.content
+
+        except Exception as e:
+            self.error = True
+            self.message = "Something went wrong while contacting the model. Please try again."
+            yield self.message
+            return
+
+        if function_name == "end_conversation":
+            self.end_conversation = True
+            self.message = parse_farewell(function_arguments)
+        elif not self.message:
+            self.error = True
+            self.message = "Something went wrong while generating a response. Please try again."
+            yield self.message
+
+    def result(self) -> Dict[str, Any]:
+        """Return the outcome of the streamed response."""
+        if self.error:
+            return {"error": True, "message": self.message}
+        return {"end_conversation": self.end_conversation, "message": self.message}
+
+def stream_movie_chat_response(
+    history: List[Dict[str, str]],
+    movie_description: str,
+    question: str,
+    model_name: str = "gpt-4o",
+    temperature: float = 0.7,
+    history_manager: Optional["ConversationHistory"] = None
+) -> ChatResponseStream:
+    """
+    Stream a movie-related chat response token by token.
+    """
+    messages = build_prompt_messages(history, movie_description, question, history_manager)
+    return ChatResponseStream(messages, model_name, temperature)
\ No newline at end of file
@@ -0,0 +1,196 @@
+import json
+import os
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from utils import normalize_text
+
+META_FILE = "meta.json"
+TERMS_FILE = "terms.json"
+POSTING_DOCS_FILE = "posting_docs.bin"
+POSTING_WEIGHTS_FILE = "posting_weights.bin"
+DOC_LENGTHS_FILE = "doc_lengths.bin"
+PAYLOADS_FILE = "payloads.jsonl"
+OFFSETS_FILE = "offsets.bin"
+
+# Weight of a term occurrence per field; matches on cast and genres count more than title words
+FIELD_WEIGHTS = {"title": 1.0, "cast": 2.0, "genres": 2.0}
+# Whole values (a full cast name, a genre, a title) are also indexed as single phrase terms.
+# Queries use the phrase term of multi-word inputs for scoring, and phrase_match to recognize whole values
+PHRASE_PREFIX = "="
+# Function words that would match arbitrary titles; they are never used as query terms
+STOPWORDS = frozenset({
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "into", "is", "it", "of", "on", "or",
+    "the", "to", "with",
+})
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into normalized word terms."""
+    return normalize_text(text or "").split()
+
+def phrase_term(text: str) -> Optional[str]:
+    """Return the phrase term of a whole field value, e.g. "=florence pugh"."""
+    normalized = normalize_text(text or "")
+    return PHRASE_PREFIX + normalized if normalized else None
+
+def query_terms(query: str) -> List[str]:
+    """Terms of a query: its words except stopwords, plus the whole query as a phrase term."""
+    words = tokenize(query)
+    terms = [word for word in words if word not in STOPWORDS]
+    phrase = phrase_term(query)
+    if phrase and len(words) > 1:
+        terms.append(phrase)
+    return terms
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Any]], k: int = RRF_K) -> List[Any]:
+    """
+    Fuse several ranked lists of hashable items with reciprocal rank fusion,
+    scoring every item by the sum of 1 / (k + rank) over the lists it appears in.
+    """
+    scores: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+class LexicalIndexWriter:
+    """
+    Builds a BM25 inverted index over the title, cast and genres of movies.
+    Postings are collected in compact typed arrays and sorted by term when the index is closed,
+    and the documents are streamed to disk as they are added.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+
+        self._term_ids: Dict[str, int] = {}
+        self._posting_terms = array("i")
+        self._posting_docs = array("i")
+        self._posting_weights = array("f")
+        self._doc_lengths = array("f")
+
+        self._payloads = open(os.path.join(directory, PAYLOADS_FILE), "wb")
+        self._offsets = array("q")
+        self._payload_offset = 0
+
+    def add(self, title: str, cast: Sequence[str], genres: Sequence[str], payload: Dict[str, Any]) -> None:
+        """Index one movie and store the payload returned for it by searches."""
+        weights: Dict[str, float] = {}
+        fields = {"title": [title or ""], "cast": list(cast or []), "genres": list(genres or [])}
+        for field, values in fields.items():
+            for value in values:
+                terms = tokenize(value)
+                phrase = phrase_term(value)
+                if phrase:
+                    terms.append(phrase)
+                for term in terms:
+                    weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+
+        doc_id = self.count
+        for term, weight in weights.items():
+            term_id = self._term_ids.setdefault(term, len(self._term_ids))
+            self._posting_terms.append(term_id)
+            self._posting_docs.append(doc_id)
+            self._posting_weights.append(weight)
+        self._doc_lengths.append(sum(weights.values()))
+
+        line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        self._offsets.append(self._payload_offset)
+        self._payloads.write(line)
+        self._payload_offset += len(line)
+
+        self.count += 1
+
+    def close(self) -> None:
+        """Sort the postings by term and write the index files."""
+        self._payloads.close()
+        self._offsets.append(self._payload_offset)
+        np.frombuffer(self._offsets, dtype=np.int64).tofile(os.path.join(self.directory, OFFSETS_FILE))
+
+        posting_terms = np.frombuffer(self._posting_terms, dtype=np.int32)
+        order = np.argsort(posting_terms, kind="stable")
+        np.frombuffer(self._posting_docs, dtype=np.int32)[order].tofile(os.path.join(self.directory, POSTING_DOCS_FILE))
+        np.frombuffer(self._posting_weights, dtype=np.float32)[order].tofile(os.path.join(self.directory, POSTING_WEIGHTS_FILE))
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)
+        doc_lengths.tofile(os.path.join(self.directory, DOC_LENGTHS_FILE))
+
+        # Every term maps to the [start, end) range of its postings
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(posting_terms, minlength=len(self._term_ids)))])
+        terms = {term: [int(bounds[term_id]), int(bounds[term_id + 1])] for term, term_id in self._term_ids.items()}
+        with open(os.path.join(self.directory, TERMS_FILE), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+
+        meta = {
+            "count": self.count,
+            "postings": len(self._posting_docs),
+            "average_length": float(doc_lengths.mean()) if self.count else 0.0,
+        }
+        with open(os.path.join(self.directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the title, cast and genres of movies, kept in memory-mapped files.
+    Answers keyword queries such as an actor name or a genre without any embedding call.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(directory, TERMS_FILE), "r", encoding="utf-8") as f:
+            self.terms: Dict[str, List[int]] = json.load(f)
+
+        self.count: int = self.meta["count"]
+        self.average_length: float = self.meta["average_length"] or 1.0
+        postings = self.meta["postings"]
+        self.posting_docs = self._memmap(POSTING_DOCS_FILE, np.int32, postings)
+        self.posting_weights = self._memmap(POSTING_WEIGHTS_FILE, np.float32, postings)
+        self.doc_lengths = self._memmap(DOC_LENGTHS_FILE, np.float32, self.count)
+        self.offsets = self._memmap(OFFSETS_FILE, np.int64, self.count + 1)
+        self.payloads = self._memmap(PAYLOADS_FILE, np.uint8, os.path.getsize(os.path.join(directory, PAYLOADS_FILE)))
+
+    def _memmap(self, name: str, dtype: Any, size: int) -> np.ndarray:
+        if size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, name), dtype=dtype, mode="r", shape=(size,))
+
+    def payload(self, row: int) -> Dict[str, Any]:
+        """Read the payload stored for a row."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.payloads[start:end].tobytes().decode("utf-8"))
+
+    def phrase_match(self, query: str) -> bool:
+        """Whether the whole query is an indexed value: a full cast name, a genre or a title."""
+        phrase = phrase_term(query)
+        return phrase is not None and phrase in self.terms
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[int, float]]:
+        """Return the top-k (row, BM25 score) pairs for a keyword query; empty if no term matches."""
+        rows_parts, score_parts = [], []
+        for term in query_terms(query):
+            bounds = self.terms.get(term)
+            if bounds is None:
+                continue
+            start, end = bounds
+            rows = np.asarray(self.posting_docs[start:end], dtype=np.int64)
+            weights = np.asarray(self.posting_weights[start:end])
+            idf = np.log(1.0 + (self.count - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[rows] / self.average_length)
+            rows_parts.append(rows)
+            score_parts.append(idf * weights * (BM25_K1 + 1.0) / (weights + norm))
+
+        if not rows_parts:
+            return []
+
+        rows, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+        scores = np.zeros(rows.shape[0], dtype=np.float64)
+        np.add.at(scores, inverse, np.concatenate(score_parts))
+
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(int(rows[i]), float(scores[i])) for i in order]
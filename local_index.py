@@ -0,0 +1,251 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.bin"
+SCALES_FILE = "scales.bin"
+PAYLOADS_FILE = "payloads.jsonl"
+OFFSETS_FILE = "offsets.bin"
+CENTROIDS_FILE = "ivf_centroids.bin"
+IVF_IDS_FILE = "ivf_ids.bin"
+IVF_OFFSETS_FILE = "ivf_offsets.bin"
+
+SEARCH_CHUNK_ROWS = 65536
+# int8 rows converted to float32 at a time while scoring (about 50 MB at 3072 dimensions)
+DEQUANTIZE_BLOCK_ROWS = 4096
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so that dot products are cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization; returns the codes and their float32 scales."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k highest scores, best first."""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+class LocalIndexWriter:
+    """
+    Append-only writer for a LocalVectorIndex directory.
+    Vectors and payloads are streamed to disk as they are added, so building the index
+    needs memory only for the current batch (plus a sample when training IVF lists).
+    """
+
+    def __init__(self, directory: str, dimensions: int, quantization: str = "float32"):
+        if quantization not in ("float32", "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dimensions = dimensions
+        self.quantization = quantization
+        self.count = 0
+
+        self._vectors = open(os.path.join(directory, VECTORS_FILE), "wb")
+        self._scales = open(os.path.join(directory, SCALES_FILE), "wb")
+        self._payloads = open(os.path.join(directory, PAYLOADS_FILE), "wb")
+        self._offsets = open(os.path.join(directory, OFFSETS_FILE), "wb")
+        self._payload_offset = 0
+
+    def add(self, vectors: Sequence[Sequence[float]], payloads: Sequence[Dict[str, Any]]) -> None:
+        """Append a batch of vectors with their payloads."""
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        if matrix.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions}-dimensional vectors, got {matrix.shape[1]}")
+
+        if self.quantization == "int8":
+            codes, scales = _quantize_int8(matrix)
+            self._vectors.write(codes.tobytes())
+            self._scales.write(scales.tobytes())
+        else:
+            self._vectors.write(matrix.tobytes())
+
+        offsets = []
+        for payload in payloads:
+            line = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(self._payload_offset)
+            self._payloads.write(line)
+            self._payload_offset += len(line)
+        self._offsets.write(np.asarray(offsets, dtype=np.int64).tobytes())
+
+        self.count += matrix.shape[0]
+
+    def close(self, ivf_lists: int = 0, sample_size: int = 50000, iterations: int = 10) -> None:
+        """
+        Finish the index. With `ivf_lists` > 0, train that many k-means centroids and
+        group vectors into inverted lists for approximate search.
+        """
+        for f in (self._vectors, self._scales, self._payloads, self._offsets):
+            f.close()
+        # Close the offsets table with the end position of the last payload
+        offsets_path = os.path.join(self.directory, OFFSETS_FILE)
+        offsets = np.fromfile(offsets_path, dtype=np.int64)
+        np.append(offsets, self._payload_offset).astype(np.int64).tofile(offsets_path)
+
+        meta = {
+            "dimensions": self.dimensions,
+            "count": self.count,
+            "quantization": self.quantization,
+            "ivf_lists": 0,
+        }
+        with open(os.path.join(self.directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        if ivf_lists > 0 and self.count > 0:
+            index = LocalVectorIndex(self.directory)
+            index.train_ivf(min(ivf_lists, self.count), sample_size=sample_size, iterations=iterations)
+
+class LocalVectorIndex:
+    """
+    Vector index kept in memory-mapped files on local disk.
+    Stores L2-normalized float32 (or int8-quantized) vectors and JSON payloads, answers exact
+    cosine top-k with vectorized NumPy matrix products and optionally approximate top-k
+    over IVF lists.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.dimensions: int = self.meta["dimensions"]
+        self.count: int = self.meta["count"]
+        self.quantization: str = self.meta["quantization"]
+
+        dtype = np.int8 if self.quantization == "int8" else np.float32
+        self.vectors = self._memmap(VECTORS_FILE, dtype, (self.count, self.dimensions))
+        self.scales = self._memmap(SCALES_FILE, np.float32, (self.count,)) if self.quantization == "int8" else None
+        self.offsets = self._memmap(OFFSETS_FILE, np.int64, (self.count + 1,))
+        payloads_size = os.path.getsize(os.path.join(directory, PAYLOADS_FILE))
+        self.payloads = self._memmap(PAYLOADS_FILE, np.uint8, (payloads_size,))
+
+        self.centroids: Optional[np.ndarray] = None
+        self.ivf_ids: Optional[np.ndarray] = None
+        self.ivf_offsets: Optional[np.ndarray] = None
+        if self.meta.get("ivf_lists"):
+            lists = self.meta["ivf_lists"]
+            self.centroids = self._memmap(CENTROIDS_FILE, np.float32, (lists, self.dimensions))
+            self.ivf_ids = self._memmap(IVF_IDS_FILE, np.int64, (self.count,))
+            self.ivf_offsets = self._memmap(IVF_OFFSETS_FILE, np.int64, (lists + 1,))
+
+    def _memmap(self, name: str, dtype: Any, shape: Tuple[int, ...]) -> np.ndarray:
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, name), dtype=dtype, mode="r", shape=shape)
+
+    def _scores(self, queries: np.ndarray, rows: Any = slice(None)) -> np.ndarray:
+        """Cosine scores of normalized queries against the stored vectors selected by `rows`."""
+        vectors = self.vectors[rows]
+        if self.quantization != "int8":
+            return queries @ vectors.T
+
+        # Dequantize block by block instead of copying the whole chunk as float32
+        scores = np.empty((queries.shape[0], vectors.shape[0]), dtype=np.float32)
+        for start in range(0, vectors.shape[0], DEQUANTIZE_BLOCK_ROWS):
+            block = vectors[start:start + DEQUANTIZE_BLOCK_ROWS]
+            scores[:, start:start + block.shape[0]] = queries @ block.T.astype(np.float32)
+        return scores * self.scales[rows]
+
+    def payload(self, row: int) -> Dict[str, Any]:
+        """Read the payload stored for a row."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.payloads[start:end].tobytes().decode("utf-8"))
+
+    def search(
+        self,
+        query_vectors: Sequence[Sequence[float]],
+        k: int = 3,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Return the top-k (row, score) pairs for every query vector.
+        With `nprobe` set and IVF lists trained, only the `nprobe` closest lists are scanned.
+        """
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32))
+        if nprobe and self.centroids is not None:
+            return [self._search_ivf(query, k, nprobe) for query in queries]
+        return self._search_exact(queries, k)
+
+    def _search_exact(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """Exact search, scanning the memory-mapped matrix in chunks to bound memory use."""
+        best_rows = np.empty((queries.shape[0], 0), dtype=np.int64)
+        best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+
+        for start in range(0, self.count, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, self.count)
+            scores = np.concatenate([best_scores, self._scores(queries, slice(start, end))], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (queries.shape[0], end - start))], axis=1)
+
+            keep = [_top_k(row_scores, k) for row_scores in scores]
+            best_scores = np.take_along_axis(scores, np.array(keep), axis=1)
+            best_rows = np.take_along_axis(rows, np.array(keep), axis=1)
+
+        return [
+            [(int(row), float(score)) for row, score in zip(rows, scores)]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def _search_ivf(self, query: np.ndarray, k: int, nprobe: int) -> List[Tuple[int, float]]:
+        """Approximate search over the inverted lists of the `nprobe` nearest centroids."""
+        lists = _top_k(self.centroids @ query, nprobe)
+        candidates = np.concatenate([
+            self.ivf_ids[self.ivf_offsets[i]:self.ivf_offsets[i + 1]] for i in lists
+        ])
+        if candidates.size == 0:
+            return []
+        candidates.sort()
+        scores = self._scores(query[None, :], candidates)[0]
+        order = _top_k(scores, k)
+        return [(int(candidates[i]), float(scores[i])) for i in order]
+
+    def train_ivf(self, lists: int, sample_size: int = 50000, iterations: int = 10, seed: int = 0) -> None:
+        """Train IVF centroids with k-means on a sample and write the inverted lists next to the index."""
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(self.count, size=min(sample_size, self.count), replace=False))
+        sample = self._dequantize(sample_rows)
+
+        centroids = sample[rng.choice(sample.shape[0], size=lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(lists):
+                members = sample[assignment == i]
+                if members.shape[0]:
+                    centroids[i] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        assignment = np.empty(self.count, dtype=np.int64)
+        for start in range(0, self.count, SEARCH_CHUNK_ROWS):
+            end = min(start + SEARCH_CHUNK_ROWS, self.count)
+            assignment[start:end] = np.argmax(self._dequantize(slice(start, end)) @ centroids.T, axis=1)
+
+        ivf_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        ivf_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))]).astype(np.int64)
+
+        centroids.astype(np.float32).tofile(os.path.join(self.directory, CENTROIDS_FILE))
+        ivf_ids.tofile(os.path.join(self.directory, IVF_IDS_FILE))
+        ivf_offsets.tofile(os.path.join(self.directory, IVF_OFFSETS_FILE))
+
+        self.meta["ivf_lists"] = lists
+        with open(os.path.join(self.directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+
+        self.centroids, self.ivf_ids, self.ivf_offsets = centroids.astype(np.float32), ivf_ids, ivf_offsets
+
+    def _dequantize(self, rows: Any) -> np.ndarray:
+        """Return the stored vectors for `rows` as float32."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.quantization == "int8":
+            vectors = vectors * self.scales[rows][:, None]
+        return vectors
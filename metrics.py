@@ -0,0 +1,300 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = True
+# Port of the Prometheus text endpoint (GET /metrics); None serves no endpoint
+METRICS_PORT: Optional[int] = None
+# Interface the endpoint listens on; "0.0.0.0" lets a Prometheus server on another host scrape it
+METRICS_HOST = "127.0.0.1"
+# Structured log with one JSON line per span and per OpenAI token usage; None writes no log
+METRICS_LOG_PATH: Optional[str] = None
+
+METRIC_PREFIX = "movie_recommender_"
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Name -> (type, help text) of every metric
+METRICS = {
+    "stage_duration_seconds": ("histogram", "Duration of app stages (validate, retrieve, generate, rerank, ...)."),
+    "request_duration_seconds": ("histogram", "Duration of OpenAI, TMDb and Qdrant calls."),
+    "requests_total": ("counter", "OpenAI, TMDb and Qdrant calls by status."),
+    "tokens_total": ("counter", "OpenAI tokens by model and kind (prompt, completion)."),
+    "cache_lookups_total": ("counter", "Cache lookups by cache and result (hit, miss)."),
+    "scheduler_events_total": ("counter", "Request scheduler events by host (throttled, rate_limited, retried, failed, coalesced)."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class MetricsRegistry:
+    """Thread-safe counters and fixed-bucket histograms keyed by metric name and label set."""
+
+    def __init__(self, buckets: Tuple[float, ...] = HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        # Per label set: one count per bucket (+Inf last), then the sum of observed values
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0.0] * (len(self.buckets) + 2)
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return counters and histogram summaries (count, sum, bucket counts) as plain data."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {"labels": dict(key), "count": sum(counts[:-1]), "sum": counts[-1], "buckets": counts[:-1]}
+                    for key, counts in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms, "bucket_bounds": list(self.buckets)}
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        def format_labels(key: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text) in METRICS.items():
+                full_name = METRIC_PREFIX + name
+                series = (self._histograms if metric_type == "histogram" else self._counters).get(name)
+                if not series:
+                    continue
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for key, data in sorted(series.items()):
+                    if metric_type == "counter":
+                        lines.append(f"{full_name}{format_labels(key)} {data:g}")
+                        continue
+                    cumulative = 0.0
+                    for bound, count in zip(list(self.buckets) + ["+Inf"], data[:-1]):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{format_labels(key, ('le', str(bound)))} {cumulative:g}")
+                    lines.append(f"{full_name}_sum{format_labels(key)} {data[-1]:.6f}")
+                    lines.append(f"{full_name}_count{format_labels(key)} {cumulative:g}")
+        return "\n".join(lines) + "\n"
+
+_registry = MetricsRegistry()
+_log_lock = threading.Lock()
+_log_file = None
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def get_registry() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
+
+def log_event(event: Dict[str, Any]) -> None:
+    """Append one event as a JSON line to METRICS_LOG_PATH, if a log is configured."""
+    global _log_file
+    if METRICS_LOG_PATH is None:
+        return
+    line = json.dumps({"ts": time.time(), "thread": threading.current_thread().name, **event})
+    with _log_lock:
+        if _log_file is None:
+            _log_file = open(METRICS_LOG_PATH, "a", encoding="utf-8", buffering=1)
+        _log_file.write(line + "\n")
+
+def record_request(service: str, operation: str, duration: float, status: Any) -> None:
+    """Record one call to an external service (OpenAI, TMDb, Qdrant) and its duration in seconds."""
+    if not METRICS_ENABLED:
+        return
+    _registry.observe("request_duration_seconds", duration, service=service, operation=operation)
+    _registry.increment("requests_total", service=service, operation=operation, status=status)
+    log_event({"kind": "request", "service": service, "operation": operation, "status": str(status), "duration_ms": duration * 1000})
+
+def record_tokens(model: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+    """Record the token usage of one OpenAI response."""
+    if not METRICS_ENABLED:
+        return
+    if prompt_tokens:
+        _registry.increment("tokens_total", prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        _registry.increment("tokens_total", completion_tokens, model=model, kind="completion")
+    log_event({"kind": "tokens", "model": model, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """Record hits and misses of a cache lookup."""
+    if not METRICS_ENABLED:
+        return
+    if hits:
+        _registry.increment("cache_lookups_total", hits, cache=cache, result="hit")
+    if misses:
+        _registry.increment("cache_lookups_total", misses, cache=cache, result="miss")
+
+def record_scheduler_event(host: str, event: str) -> None:
+    """Record a request scheduler event, e.g. a call throttled by its host's token bucket."""
+    if not METRICS_ENABLED:
+        return
+    _registry.increment("scheduler_events_total", host=host, event=event)
+    log_event({"kind": "scheduler", "host": host, "event": event})
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time an app stage (e.g. "retrieve") as a span, recording errors raised inside it."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except GeneratorExit:
+        # A streamed stage whose consumer stopped early
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if METRICS_ENABLED:
+            duration = time.perf_counter() - start
+            _registry.observe("stage_duration_seconds", duration, stage=name)
+            log_event({"kind": "stage", "stage": name, "status": status, "duration_ms": duration * 1000})
+
+@contextmanager
+def request_span(service: str, operation: str) -> Iterator[None]:
+    """Time a call to an external service whose status is only known by whether it raises."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_request(service, operation, time.perf_counter() - start, status)
+
+def timed_stage(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing every call of a function as an app stage.
+    For generator functions the span covers the whole iteration, for coroutine functions the await.
+    """
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coroutine_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return coroutine_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args: Any, **kwargs: Any) -> Iterator[Any]:
+                with stage(name):
+                    yield from fn(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+def _openai_operation(path: str) -> str:
+    """Map an OpenAI API path to an operation label, e.g. "/v1/chat/completions" -> "chat.completions"."""
+    parts = [part for part in path.split("/") if part and part != "v1"]
+    if parts and parts[0] == "models":
+        return "models"
+    return ".".join(parts) or "unknown"
+
+def httpx_event_hooks(service: str = "openai") -> Dict[str, List[Callable]]:
+    """
+    Event hooks for an httpx client (e.g. the OpenAI SDK's) that time every request until its
+    response headers arrive and record the token usage of JSON responses.
+    """
+    def on_request(request: Any) -> None:
+        request.extensions["metrics_start"] = time.perf_counter()
+
+    def on_response(response: Any) -> None:
+        if not METRICS_ENABLED:
+            return
+        request = response.request
+        start = request.extensions.get("metrics_start")
+        operation = _openai_operation(request.url.path)
+        if start is not None:
+            record_request(service, operation, time.perf_counter() - start, response.status_code)
+
+        if response.status_code == 200 and response.headers.get("content-type", "").startswith("application/json"):
+            response.read()
+            try:
+                data = response.json()
+            except ValueError:
+                return
+            usage = data.get("usage") if isinstance(data, dict) else None
+            if usage:
+                record_tokens(data.get("model") or operation, usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0)
+
+    return {"request": [on_request], "response": [on_response]}
+
+def render_prometheus() -> str:
+    """Render the process-wide metrics in the Prometheus text format."""
+    return _registry.render_prometheus()
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """
+    Serve the metrics in the Prometheus text format at http://<host>:<port>/metrics from a daemon
+    thread. Runs at most once per process. Returns the port, or None if no port is configured.
+    """
+    global _server
+    port = METRICS_PORT if port is None else port
+    if port is None:
+        return None
+
+    with _server_lock:
+        if _server is None:
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self) -> None:
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format: str, *args: Any) -> None:
+                    pass
+
+            _server = ThreadingHTTPServer((METRICS_HOST, port), Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server.server_address[1]
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+from chat_history import count_tokens, truncate_tokens
+import metrics
+
+# Bump when the rendered format changes so cached blocks are re-rendered
+CONTEXT_VERSION = 1
+REVIEW_MAX_TOKENS = 80
+OVERVIEW_MAX_TOKENS = 150
+MOVIE_CONTEXT_MAX_TOKENS = 450
+MAX_CACHED_MOVIES = 5000
+
+_context_cache: "OrderedDict[Any, str]" = OrderedDict()
+_context_cache_lock = threading.Lock()
+
+def _shorten(text: str, max_tokens: int) -> str:
+    """Cut a text to its first `max_tokens` tokens, marking the cut with an ellipsis."""
+    text = " ".join((text or "").split())
+    shortened = truncate_tokens(text, max_tokens, keep_end=False)
+    return shortened if shortened == text else shortened.rstrip() + "…"
+
+def _fit_lines(lines: List[str], max_tokens: int) -> str:
+    """
+    Join lines within `max_tokens`, keeping whole lines in order; the first line that does not
+    fit is shortened to the remaining budget and the lines after it are dropped.
+    """
+    kept: List[str] = []
+    for line in lines:
+        candidate = "\n".join(kept + [line])
+        if count_tokens(candidate) <= max_tokens:
+            kept.append(line)
+            continue
+        remaining = max_tokens - (count_tokens("\n".join(kept)) + 1 if kept else 0)
+        if remaining > 0:
+            kept.append(_shorten(line, remaining))
+        break
+    return "\n".join(kept)
+
+def _merge_crew(crew: List[Dict[str, Any]]) -> List[str]:
+    """Deduplicate crew members, listing every job of a person once: "Name (Director, Writer)"."""
+    jobs: "OrderedDict[str, List[str]]" = OrderedDict()
+    for member in crew:
+        name, job = member.get("name"), member.get("job")
+        if not name:
+            continue
+        person_jobs = jobs.setdefault(name, [])
+        if job and job not in person_jobs:
+            person_jobs.append(job)
+    return [f"{name} ({', '.join(person_jobs)})" if person_jobs else name for name, person_jobs in jobs.items()]
+
+def render_movie_context(description: Dict[str, Any]) -> str:
+    """
+    Render a movie description from get_descriptions into a compact text block for the chat prompt.
+    Only the fields useful for answering questions are kept, reviews and overview are truncated
+    and the whole block is bounded to MOVIE_CONTEXT_MAX_TOKENS by dropping the last lines (reviews first).
+    """
+    year = (description.get("release_date") or "")[:4]
+    header = [f"{description.get('title', '')} ({year})" if year else description.get("title", "")]
+    if description.get("runtime"):
+        header.append(f"{description['runtime']} min")
+    if description.get("rating"):
+        header.append(f"TMDb rating {description['rating']:.1f}")
+    if description.get("genres"):
+        header.append(", ".join(description["genres"]))
+
+    lines = ["# " + " | ".join(header)]
+    if description.get("overview"):
+        lines.append(f"Overview: {_shorten(description['overview'], OVERVIEW_MAX_TOKENS)}")
+    if description.get("cast"):
+        lines.append(f"Cast: {', '.join(description['cast'])}")
+    crew = _merge_crew(description.get("crew", []))
+    if crew:
+        lines.append(f"Crew: {'; '.join(crew)}")
+    production = description.get("production_companies", []) + description.get("production_countries", [])
+    if production:
+        lines.append(f"Production: {', '.join(dict.fromkeys(production))}")
+    for review in description.get("reviews", []):
+        lines.append(f"Review: {_shorten(review, REVIEW_MAX_TOKENS)}")
+
+    return _fit_lines(lines, MOVIE_CONTEXT_MAX_TOKENS)
+
+def get_movie_context(description: Dict[str, Any]) -> str:
+    """
+    Return the rendered context block of a movie, cached per TMDb id and shared across
+    turns and sessions. Descriptions without an id (fallbacks) are rendered without caching.
+    """
+    movie_id = description.get("id")
+    if movie_id is None:
+        return render_movie_context(description)
+
+    key = (CONTEXT_VERSION, movie_id)
+    with _context_cache_lock:
+        block = _context_cache.get(key)
+        if block is not None:
+            _context_cache.move_to_end(key)
+    metrics.record_cache("movie_context", hits=int(block is not None), misses=int(block is None))
+    if block is not None:
+        return block
+
+    block = render_movie_context(description)
+    with _context_cache_lock:
+        _context_cache[key] = block
+        while len(_context_cache) > MAX_CACHED_MOVIES:
+            _context_cache.popitem(last=False)
+    return block
+
+def build_chat_context(descriptions: List[Dict[str, Any]]) -> str:
+    """Join the context blocks of the recommended movies for the chat system prompt."""
+    return "\n\n".join(get_movie_context(description) for description in descriptions)
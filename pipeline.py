@@ -0,0 +1,204 @@
+"""
+Recommendation turn as an asyncio dependency graph on the shared event loop (resources.get_event_loop):
+
+    retrieve -> generate --+--> rate[title 1] --+
+                           +--> rate[title 2] --+--> rank --+--> describe[winner 1]
+                           +--> ...             |           +--> describe[winner 2]
+                           +--> rate[title 9] --+           +--> describe[winner 3]
+
+Every node starts as soon as the nodes it depends on have finished: the rating lookup of a
+candidate starts while the model is still generating the next one, and the descriptions of the
+winners start as soon as the ranking is known. Retrieval and generation run on a worker thread;
+the TMDb calls go through the async client of tmdb_client, so the wall time of a turn approaches
+its longest dependency chain rather than the sum of all calls. Turns whose preferences hit the
+recommendation cache (recommendation_cache.py) skip straight to the descriptions.
+"""
+import asyncio
+import queue
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from RAG import MovieRecommendation, get_movie_recommendations, stream_movie_recommendations
+from movie_descriptions import get_descriptions_async
+from movie_ratings import fill_top_movies, get_movie_rating_async, rank_movies, run_movie_rating_search
+from recommendation_cache import lookup_recommendations, store_recommendations
+from resources import DISPATCH_MODE, get_event_loop, get_tmdb_api_key
+from metrics import stage
+
+_DONE = object()
+
+async def generate_candidates(
+    themes: str,
+    genres: str,
+    actors: str,
+    stream: bool = True
+) -> AsyncIterator[MovieRecommendation]:
+    """
+    Run retrieval and generation on a worker thread, yielding every candidate as soon as it has been
+    generated (or all of them at once when `stream` is False). Generation errors are re-raised.
+    """
+    loop = asyncio.get_running_loop()
+    candidates: asyncio.Queue = asyncio.Queue()
+
+    def produce() -> None:
+        try:
+            generate = stream_movie_recommendations if stream else get_movie_recommendations
+            for recommendation in generate(themes=themes, genres=genres, actors=actors):
+                loop.call_soon_threadsafe(candidates.put_nowait, recommendation)
+        finally:
+            loop.call_soon_threadsafe(candidates.put_nowait, _DONE)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    while True:
+        candidate = await candidates.get()
+        if candidate is _DONE:
+            break
+        yield candidate
+    await producer
+
+async def rank_candidates(
+    themes: str,
+    genres: str,
+    actors: str,
+    stream: bool = True,
+    mode: str = DISPATCH_MODE,
+    on_candidate: Optional[Callable[[MovieRecommendation], None]] = None,
+    on_generated: Optional[Callable[[], None]] = None
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Generate the candidates, look up their ratings as they arrive and return the candidates and
+    the top 3 movies. `on_generated` is called once the last candidate has been generated, while
+    the ratings may still be pending. In "llm" dispatch mode the ranking waits for all candidates
+    and goes through run_movie_rating_search.
+    """
+    candidates: List[Dict[str, str]] = []
+    ratings: List[asyncio.Future] = []
+    async for candidate in generate_candidates(themes, genres, actors, stream=stream):
+        candidates.append({"title": candidate.title, "reason": candidate.reason})
+        if on_candidate is not None:
+            on_candidate(candidate)
+        if mode == "direct":
+            ratings.append(asyncio.ensure_future(get_movie_rating_async(candidate.title)))
+    if on_generated is not None:
+        on_generated()
+
+    if mode == "direct":
+        # A failed lookup ranks its movie like a movie without a rating
+        rating_infos = await asyncio.gather(*ratings, return_exceptions=True)
+        top_movies = fill_top_movies(
+            rank_movies(candidates, [info.get("rating") if isinstance(info, dict) else None for info in rating_infos]),
+            candidates,
+        )
+    elif candidates:
+        top_movies = await asyncio.to_thread(run_movie_rating_search, candidates, mode)
+    else:
+        top_movies = []
+    return candidates, top_movies
+
+async def recommendation_turn(
+    themes: str,
+    genres: str,
+    actors: str,
+    stream: bool = True,
+    max_entries: int = 3,
+    mode: str = DISPATCH_MODE,
+    on_candidate: Optional[Callable[[MovieRecommendation], None]] = None,
+    on_generated: Optional[Callable[[], None]] = None,
+    on_ranked: Optional[Callable[[List[Dict[str, str]]], None]] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Run one recommendation turn and return its candidates, the top 3 movies and their descriptions.
+    `on_candidate` is called with every generated candidate, `on_generated` after the last one and
+    `on_ranked` with the top movies as soon as they are known, while their descriptions are still
+    being fetched.
+    Turns for the same or similar preferences are served from the recommendation cache.
+    """
+    with stage("turn"):
+        cached = await asyncio.to_thread(lookup_recommendations, themes, genres, actors)
+        if cached is not None:
+            candidates, top_movies = cached["candidates"], cached["top_movies"]
+            if on_candidate is not None:
+                for candidate in candidates:
+                    on_candidate(MovieRecommendation(**candidate))
+            if on_generated is not None:
+                on_generated()
+        else:
+            candidates, top_movies = await rank_candidates(
+                themes, genres, actors, stream=stream, mode=mode, on_candidate=on_candidate, on_generated=on_generated
+            )
+
+        if on_ranked is not None:
+            on_ranked(top_movies)
+        describe = get_descriptions_async(top_movies, get_tmdb_api_key(), max_entries=max_entries)
+        if cached is None:
+            # The turn is cached while its descriptions are fetched
+            descriptions, _ = await asyncio.gather(
+                describe,
+                asyncio.to_thread(store_recommendations, themes, genres, actors, candidates, top_movies),
+            )
+        else:
+            descriptions = await describe
+
+    return {"candidates": candidates, "top_movies": top_movies, "descriptions": descriptions}
+
+class RecommendationTurn:
+    """
+    Handle of a recommendation turn running on the shared event loop, for the Streamlit script thread.
+    Iterating yields the candidates as they are generated and stops as soon as the last one has been
+    generated; top_movies() waits for the ranking and descriptions() for the descriptions of the top movies.
+    """
+
+    def __init__(self, themes: str, genres: str, actors: str, stream: bool = True, max_entries: int = 3):
+        self._candidates: "queue.Queue[Any]" = queue.Queue()
+        self._generated = False
+        self._ranked: Future = Future()
+        self._future = asyncio.run_coroutine_threadsafe(self._run(themes, genres, actors, stream, max_entries), get_event_loop())
+
+    async def _run(self, themes: str, genres: str, actors: str, stream: bool, max_entries: int) -> Dict[str, List[Dict[str, Any]]]:
+        try:
+            return await recommendation_turn(
+                themes, genres, actors,
+                stream=stream,
+                max_entries=max_entries,
+                on_candidate=self._candidates.put,
+                on_generated=self._end_candidates,
+                on_ranked=self._on_ranked,
+            )
+        except BaseException as e:
+            if not self._ranked.done():
+                self._ranked.set_exception(e)
+            raise
+        finally:
+            # Only reached with the candidates still open if the turn failed before generating them all
+            self._end_candidates()
+
+    def _end_candidates(self) -> None:
+        """Stop the iteration over the candidates; called on the event loop only, at most once."""
+        if not self._generated:
+            self._generated = True
+            self._candidates.put(_DONE)
+
+    def _on_ranked(self, top_movies: List[Dict[str, str]]) -> None:
+        self._end_candidates()
+        self._ranked.set_result(top_movies)
+
+    def __iter__(self) -> Iterator[MovieRecommendation]:
+        while True:
+            candidate = self._candidates.get()
+            if candidate is _DONE:
+                return
+            yield candidate
+
+    def top_movies(self, timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        """Wait for the ranking and return the top movies; raises if the turn failed before it."""
+        return self._ranked.result(timeout)
+
+    def descriptions(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Wait for and return the descriptions of the top movies."""
+        return self._future.result(timeout)["descriptions"]
+
+    def cancel(self) -> None:
+        self._future.cancel()
+
+def start_recommendation_turn(themes: str, genres: str, actors: str, stream: bool = True, max_entries: int = 3) -> RecommendationTurn:
+    """Start a recommendation turn on the shared event loop and return its handle."""
+    return RecommendationTurn(themes, genres, actors, stream=stream, max_entries=max_entries)
@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from utils import get_country_code
+from movie_trailer_search import get_movie_trailer
+from movie_stream_search import format_providers_list, get_streaming_services, load_streaming_services
+from metrics import stage
+
+MAX_WORKERS = 8
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="prefetch")
+
+class RecommendationPrefetch:
+    """
+    Speculatively fetches trailers and loads watch providers (all countries) into the provider
+    store for recommended titles.
+    Results are kept as futures, so the UI can render ready results without waiting and only
+    blocks on lookups that are still in flight.
+    """
+
+    def __init__(self, titles: Iterable[str]):
+        self._cancelled = threading.Event()
+        self.trailers: Dict[str, Future] = {}
+        self.providers: Dict[str, Future] = {}
+
+        for title in titles:
+            if title not in self.trailers:
+                self.trailers[title] = _executor.submit(self._run, "prefetch_trailer", get_movie_trailer, title)
+                self.providers[title] = _executor.submit(self._run, "prefetch_providers", load_streaming_services, title)
+
+    def _run(self, stage_name: str, fn, title: str):
+        """Run a lookup as a timed stage unless the prefetch was cancelled in the meantime."""
+        if self._cancelled.is_set():
+            return None
+        with stage(stage_name):
+            return fn(title)
+
+    def cancel(self) -> None:
+        """Cancel all lookups that have not started yet; running ones finish but are ignored."""
+        self._cancelled.set()
+        for future in list(self.trailers.values()) + list(self.providers.values()):
+            future.cancel()
+
+    def is_ready(self, title: str) -> bool:
+        """Check whether both lookups for a title have finished."""
+        return self.trailer_ready(title) and self.providers_ready(title)
+
+    def trailer_ready(self, title: str) -> bool:
+        """Check whether the trailer lookup for a title has finished, without waiting."""
+        return self._done(self.trailers, title)
+
+    def providers_ready(self, title: str) -> bool:
+        """Check whether the watch provider lookup for a title has finished, without waiting."""
+        return self._done(self.providers, title)
+
+    def _done(self, futures: Dict[str, Future], title: str) -> bool:
+        future = futures.get(title)
+        return future is not None and future.done() and not future.cancelled() and not self._cancelled.is_set()
+
+    def _result(self, futures: Dict[str, Future], title: str, timeout: Optional[float]):
+        future = futures.get(title)
+        if future is None or self._cancelled.is_set():
+            raise KeyError(title)
+        try:
+            return future.result(timeout=timeout)
+        except CancelledError:
+            raise KeyError(title)
+
+    def trailer(self, title: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Return the prefetched trailer URL of a title, waiting for it if still in flight
+        (check trailer_ready first to avoid blocking). Raises KeyError if the title was not prefetched.
+        """
+        return self._result(self.trailers, title, timeout)
+
+    def streaming(self, title: str, user_country_input: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Return the formatted streaming providers of a title in the given country from the
+        prefetched data, or None if none found. Raises KeyError if the title was not prefetched.
+        """
+        country_code = get_country_code(user_country_input)
+        if not country_code:
+            return None
+
+        self._result(self.providers, title, timeout)
+        provider_list: List[str] = get_streaming_services(title, country_code)
+        return format_providers_list(provider_list, title, user_country_input)
+
+def start_prefetch(recommendations: List[Dict[str, str]]) -> RecommendationPrefetch:
+    """Start prefetching trailers and watch providers for the recommended movies."""
+    return RecommendationPrefetch(movie["title"] for movie in recommendations)
@@ -0,0 +1,154 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import tmdb_client
+import metrics
+
+# Monetization types that count as "available", in the order their bitsets are stored
+PROVIDER_KINDS = ("flatrate", "rent", "buy")
+MAX_MOVIES = 10000
+
+class ProviderStore:
+    """
+    Compact in-memory store of TMDb watch providers for all countries of a movie.
+    Provider names are interned once and referenced by index; every (movie, country) pair is
+    stored as one integer bitset per monetization type, so switching countries or asking which
+    movies are on a provider is a local bit operation instead of an API call.
+    """
+
+    def __init__(self, max_movies: int = MAX_MOVIES):
+        self.max_movies = max_movies
+        self._lock = threading.Lock()
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._movies: "OrderedDict[int, Dict[str, Tuple[int, ...]]]" = OrderedDict()
+
+    def _intern(self, name: str) -> int:
+        """Return the index of a provider name, adding it on first sight."""
+        index = self._name_ids.get(name)
+        if index is None:
+            index = len(self._names)
+            self._names.append(name)
+            self._name_ids[name] = index
+        return index
+
+    def _decode(self, mask: int) -> List[str]:
+        """Return the provider names whose bits are set in a bitset."""
+        names = []
+        while mask:
+            low_bit = mask & -mask
+            names.append(self._names[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return names
+
+    def add(self, movie_id: int, providers: Dict[str, Dict]) -> None:
+        """Store the watch-provider response of a movie, keyed by ISO alpha-2 country code."""
+        with self._lock:
+            countries = {}
+            for country_code, country_data in providers.items():
+                masks = []
+                for kind in PROVIDER_KINDS:
+                    mask = 0
+                    for provider in country_data.get(kind) or []:
+                        mask |= 1 << self._intern(provider["provider_name"])
+                    masks.append(mask)
+                if any(masks):
+                    countries[sys.intern(country_code)] = tuple(masks)
+
+            self._movies[movie_id] = countries
+            self._movies.move_to_end(movie_id)
+            while len(self._movies) > self.max_movies:
+                self._movies.popitem(last=False)
+
+    def load(self, title: str, api_key: str) -> Optional[int]:
+        """
+        Make sure the providers of a movie title are in the store, fetching all countries
+        with a single TMDb call if needed. Returns the TMDb id, or None if the title is unknown.
+        """
+        movie_id = tmdb_client.resolve_movie_id(title, api_key)
+        if movie_id is None:
+            return None
+
+        with self._lock:
+            stored = movie_id in self._movies
+            if stored:
+                self._movies.move_to_end(movie_id)
+        metrics.record_cache("providers", hits=int(stored), misses=int(not stored))
+        if stored:
+            return movie_id
+
+        providers = tmdb_client.get_watch_providers(movie_id, api_key)
+        # An empty response may be a failed request, so it is not stored and will be retried
+        if providers:
+            self.add(movie_id, providers)
+        return movie_id
+
+    def _mask(self, movie_id: Optional[int], country_code: str, kinds: Sequence[str]) -> int:
+        """Return the combined bitset of a movie in a country for the given monetization types."""
+        with self._lock:
+            masks = self._movies.get(movie_id, {}).get(country_code)
+        if not masks:
+            return 0
+
+        mask = 0
+        for kind in kinds:
+            mask |= masks[PROVIDER_KINDS.index(kind)]
+        return mask
+
+    def providers(
+        self,
+        title: str,
+        country_code: str,
+        api_key: str,
+        kinds: Sequence[str] = PROVIDER_KINDS
+    ) -> List[str]:
+        """Return the provider names of a movie title in one country."""
+        movie_id = self.load(title, api_key)
+        return self._decode(self._mask(movie_id, country_code, kinds))
+
+    def countries(self, title: str, provider_name: str, api_key: str, kinds: Sequence[str] = PROVIDER_KINDS) -> List[str]:
+        """Return the country codes in which a movie title is available on a provider."""
+        movie_id = self.load(title, api_key)
+        index = self._name_ids.get(provider_name)
+        if movie_id is None or index is None:
+            return []
+
+        with self._lock:
+            country_codes = list(self._movies.get(movie_id, {}))
+        return sorted(code for code in country_codes if self._mask(movie_id, code, kinds) >> index & 1)
+
+    def available_on(
+        self,
+        titles: Iterable[str],
+        provider_name: str,
+        country_code: str,
+        api_key: str,
+        kinds: Sequence[str] = PROVIDER_KINDS
+    ) -> List[str]:
+        """Return the titles that are available on a provider in a country, e.g. Netflix in DE."""
+        titles = list(titles)
+        movie_ids = [self.load(title, api_key) for title in titles]
+        index = self._name_ids.get(provider_name)
+        if index is None:
+            return []
+
+        return [
+            title for title, movie_id in zip(titles, movie_ids)
+            if self._mask(movie_id, country_code, kinds) >> index & 1
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of stored movies, (movie, country) entries and interned provider names."""
+        with self._lock:
+            return {
+                "movies": len(self._movies),
+                "country_entries": sum(len(countries) for countries in self._movies.values()),
+                "provider_names": len(self._names),
+            }
+
+_store = ProviderStore()
+
+def get_provider_store() -> ProviderStore:
+    """Return the process-wide provider store shared by all sessions."""
+    return _store
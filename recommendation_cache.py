@@ -0,0 +1,283 @@
+import base64
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from disk_cache import DiskCache, CACHE_DIR
+from resources import COLLECTION_NAME, get_embeddings
+import metrics
+
+RECOMMENDATION_CACHE_ENABLED = True
+# Reuse the results of similar (not only identical) preferences
+SEMANTIC_CACHE_ENABLED = True
+RECOMMENDATION_CACHE_PATH = os.path.join(CACHE_DIR, "recommendations.sqlite")
+RECOMMENDATION_CACHE_MAX_ENTRIES = 5000
+# Ratings and the movie collection change slowly, so a day-old ranking is still good
+RECOMMENDATION_CACHE_TTL = 24 * 60 * 60
+# Minimum cosine similarity of every field (themes, genres, actors) for a semantic hit
+SIMILARITY_THRESHOLD = 0.85
+# Leading dimensions of the field embeddings kept in the semantic index and stored (as float16) with
+# every entry; text-embedding-3 vectors can be truncated and renormalized
+SEMANTIC_DIMENSIONS = 256
+# Bump when the cached results change shape or meaning so old entries are not reused
+CACHE_VERSION = 3
+
+# Separators of the items of a preference, e.g. "action, comedy" or "Tom Hanks and Meg Ryan"
+_ITEM_SEPARATORS = re.compile(r",|;|/|&|\+|\band\b", re.IGNORECASE)
+# Punctuation inside an item; digits and letters of any script are kept ("80s", "Timothée")
+_PUNCTUATION = re.compile(r"[^\w\s'-]|_")
+
+Preferences = Tuple[str, str, str]
+
+def _normalize_item(item: str) -> str:
+    """Casefold an item and drop punctuation and extra whitespace, keeping digits and non-ASCII letters."""
+    item = unicodedata.normalize("NFKC", item).casefold()
+    return " ".join(_PUNCTUATION.sub(" ", item).split())
+
+def normalize_preference(text: str) -> str:
+    """Normalize a preference so that case, punctuation and item order do not matter: "Comedy & Action" -> "action, comedy"."""
+    items = {_normalize_item(item) for item in _ITEM_SEPARATORS.split(text or "")}
+    return ", ".join(sorted(item for item in items if item))
+
+def embed_preferences(themes: str, genres: str, actors: str) -> np.ndarray:
+    """
+    Embed the three preference fields as typed, so retrieval (which embeds the same texts) is
+    served from the embedding cache, and return them truncated and normalized, shape (3, SEMANTIC_DIMENSIONS).
+    """
+    texts = [field or "any" for field in (themes, genres, actors)]
+    vectors = np.asarray(get_embeddings().embed_queries(texts), dtype=np.float32)[:, :SEMANTIC_DIMENSIONS]
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _encode_vectors(vectors: np.ndarray) -> str:
+    return base64.b64encode(vectors.astype(np.float16).tobytes()).decode("ascii")
+
+def _decode_vectors(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32).reshape(3, -1)
+
+class RecommendationCache:
+    """
+    Cross-session cache of recommendation turns (candidates and top movies) keyed by the user's
+    preferences. The exact tier looks up the normalized (themes, genres, actors) triple in a
+    DiskCache with TTL and LRU eviction. The semantic tier compares the field embeddings stored
+    with every entry and reuses the entry whose fields are all at least `threshold` similar, so
+    near-identical requests also hit. Its in-memory index is loaded from disk on a background
+    thread; until it is ready, the semantic tier misses instead of blocking.
+    """
+
+    def __init__(
+        self,
+        path: str = RECOMMENDATION_CACHE_PATH,
+        max_entries: int = RECOMMENDATION_CACHE_MAX_ENTRIES,
+        ttl: float = RECOMMENDATION_CACHE_TTL,
+        threshold: float = SIMILARITY_THRESHOLD,
+        semantic: bool = SEMANTIC_CACHE_ENABLED,
+        background: bool = True
+    ):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.semantic = semantic
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._disk = DiskCache(path, max_entries=max_entries)
+        self._lock = threading.Lock()
+        # Semantic index: cache keys and their field embeddings, shape (entries, 3, dimensions).
+        # The disk cache stays the source of truth; entries stored while the index loads are kept aside
+        self._keys: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._loaded = False
+        self._stored_while_loading: Dict[str, np.ndarray] = {}
+        # Bumped by clear() so that an index load started before it does not restore cleared entries
+        self._generation = 0
+
+        if semantic:
+            if background:
+                threading.Thread(target=self.load_index, name="recommendation-cache-index", daemon=True).start()
+            else:
+                self.load_index()
+
+    @staticmethod
+    def _key(preferences: Preferences) -> str:
+        return json.dumps([CACHE_VERSION, COLLECTION_NAME, *preferences])
+
+    def load_index(self) -> None:
+        """Build the semantic index from the vectors stored with the entries on disk."""
+        with self._lock:
+            generation = self._generation
+        keys, vectors = [], []
+        for key, value in self._disk.items():
+            try:
+                entry_vectors = _decode_vectors(json.loads(value)["vectors"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            # Entries stored with a different number of dimensions cannot be compared
+            if entry_vectors.shape[-1] == SEMANTIC_DIMENSIONS:
+                keys.append(key)
+                vectors.append(entry_vectors)
+
+        with self._lock:
+            if generation != self._generation:
+                keys, vectors = [], []
+            self._keys = keys
+            self._vectors = np.stack(vectors) if vectors else None
+            self._loaded = True
+            stored, self._stored_while_loading = self._stored_while_loading, {}
+            for key, entry_vectors in stored.items():
+                self._add(key, entry_vectors)
+
+    def _add(self, key: str, vectors: np.ndarray) -> None:
+        """Add or replace one entry of the semantic index. Caller holds the lock."""
+        if not self._loaded:
+            self._stored_while_loading[key] = vectors
+            return
+        if key in self._keys:
+            self._vectors[self._keys.index(key)] = vectors
+        elif self._vectors is None:
+            self._keys = [key]
+            self._vectors = vectors[np.newaxis]
+        else:
+            self._keys.append(key)
+            self._vectors = np.concatenate([self._vectors, vectors[np.newaxis]])
+
+    def _remove(self, key: str) -> None:
+        """Drop an entry that expired or was evicted on disk from the semantic index. Caller holds the lock."""
+        if key in self._keys:
+            position = self._keys.index(key)
+            del self._keys[position]
+            self._vectors = np.delete(self._vectors, position, axis=0) if self._keys else None
+
+    def _nearest(self, vectors: np.ndarray) -> Optional[str]:
+        """Return the key of the most similar cached preferences if all their fields pass the threshold."""
+        with self._lock:
+            if not self._loaded or self._vectors is None or self._vectors.shape[1:] != vectors.shape:
+                return None
+            # Cosine similarity per entry and field; an entry is as similar as its least similar field
+            similarities = np.einsum("efd,fd->ef", self._vectors, vectors).min(axis=1)
+            best = int(np.argmax(similarities))
+            return self._keys[best] if similarities[best] >= self.threshold else None
+
+    def get(self, themes: str, genres: str, actors: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry (preferences, candidates, top_movies) for these or similar preferences, or None."""
+        preferences = (normalize_preference(themes), normalize_preference(genres), normalize_preference(actors))
+        value = self._disk.get(self._key(preferences))
+        metrics.record_cache("recommendations", hits=int(value is not None), misses=int(value is None))
+        if value is not None:
+            self.exact_hits += 1
+            return self._entry(value)
+
+        if self.semantic:
+            value = self._get_similar(themes, genres, actors)
+            metrics.record_cache("recommendations_semantic", hits=int(value is not None), misses=int(value is None))
+            if value is not None:
+                self.semantic_hits += 1
+                return self._entry(value)
+
+        self.misses += 1
+        return None
+
+    @staticmethod
+    def _entry(value: bytes) -> Dict[str, Any]:
+        entry = json.loads(value)
+        entry.pop("vectors", None)
+        return entry
+
+    def _get_similar(self, themes: str, genres: str, actors: str) -> Optional[bytes]:
+        with self._lock:
+            if not self._loaded or self._vectors is None:
+                return None
+        try:
+            key = self._nearest(embed_preferences(themes, genres, actors))
+        except Exception:
+            return None
+        if key is None:
+            return None
+
+        value = self._disk.get(key)
+        if value is None:
+            with self._lock:
+                self._remove(key)
+        return value
+
+    def set(
+        self,
+        themes: str,
+        genres: str,
+        actors: str,
+        candidates: List[Dict[str, str]],
+        top_movies: List[Dict[str, str]]
+    ) -> None:
+        """Store the candidates and top movies of a turn, with its field embeddings, under its normalized preferences."""
+        preferences = (normalize_preference(themes), normalize_preference(genres), normalize_preference(actors))
+        key = self._key(preferences)
+        entry: Dict[str, Any] = {"preferences": list(preferences), "candidates": candidates, "top_movies": top_movies}
+
+        vectors = None
+        if self.semantic:
+            try:
+                vectors = embed_preferences(themes, genres, actors)
+                entry["vectors"] = _encode_vectors(vectors)
+            except Exception:
+                vectors = None
+        self._disk.set(key, json.dumps(entry).encode("utf-8"), ttl=self.ttl)
+
+        if vectors is not None:
+            with self._lock:
+                self._add(key, _decode_vectors(entry["vectors"]))
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._disk.clear()
+            self._keys = []
+            self._vectors = None
+            self._stored_while_loading = {}
+            self._generation += 1
+            self.exact_hits = self.semantic_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Return hits per tier, misses, the overall hit rate and the number of cached turns."""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._disk),
+        }
+
+_cache: Optional[RecommendationCache] = None
+_cache_lock = threading.Lock()
+
+def get_recommendation_cache() -> Optional[RecommendationCache]:
+    """Return the process-wide recommendation cache, or None if caching is disabled."""
+    global _cache
+    if not RECOMMENDATION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RecommendationCache()
+    return _cache
+
+@metrics.timed_stage("recommendation_cache")
+def lookup_recommendations(themes: str, genres: str, actors: str) -> Optional[Dict[str, Any]]:
+    """Return the cached candidates and top movies for these or similar preferences, or None."""
+    cache = get_recommendation_cache()
+    return cache.get(themes, genres, actors) if cache is not None else None
+
+def store_recommendations(
+    themes: str,
+    genres: str,
+    actors: str,
+    candidates: List[Dict[str, Any]],
+    top_movies: List[Dict[str, Any]]
+) -> None:
+    """Cache the results of a recommendation turn; turns without top movies are not cached."""
+    cache = get_recommendation_cache()
+    if cache is not None and top_movies:
+        cache.set(themes, genres, actors, candidates, top_movies)
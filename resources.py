@@ -0,0 +1,356 @@
+import asyncio
+import atexit
+import os
+import sys
+import threading
+import importlib
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional, Sequence, Type, TypeVar, TYPE_CHECKING
+from utils import get_api_key
+from metrics import httpx_event_hooks
+from scheduler import MAX_RETRIES, get_scheduler
+
+# OpenAI, LangChain and Qdrant are imported by the factories below on first use, so that
+# importing this module (and rendering the landing page) does not wait for them
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from pydantic import BaseModel
+    from langchain.chat_models import ChatOpenAI
+    from langchain.output_parsers import PydanticOutputParser
+    from qdrant_client import QdrantClient
+    from embedding_cache import CachedEmbeddings
+    from local_index import LocalVectorIndex
+    from lexical_index import LexicalIndex
+
+QDRANT_URL = "https://4f78837f-a98f-4bca-b598-903c86199ef2.eu-west-2-0.aws.cloud.qdrant.io"
+QDRANT_PREFER_GRPC = False
+# Runs Qdrant in-process (local mode) instead of connecting to QDRANT_URL: ":memory:" or a directory
+QDRANT_PATH: Optional[str] = None
+COLLECTION_NAME = "movies_cluster"
+# Alternative OpenAI-compatible endpoint (e.g. the stand-in server of bench_pipeline.py); None uses the OpenAI API
+OPENAI_BASE_URL: Optional[str] = None
+EMBEDDING_MODEL = "text-embedding-3-large"
+# Full output size of EMBEDDING_MODEL
+EMBEDDING_MODEL_DIMENSIONS = 3072
+# Matryoshka truncation of the embeddings (e.g. 256 or 512). None follows the vector store:
+# queries are embedded with the dimensions the collection or local index was built with
+EMBEDDING_DIMENSIONS: Optional[int] = None
+# Vector quantization of new Qdrant collections: "none", "scalar" (int8) or "binary".
+# Quantized searches oversample candidates and rescore them with the original vectors
+QDRANT_QUANTIZATION = "none"
+QDRANT_OVERSAMPLING = 2.0
+
+MOVIE_DB_PATH = os.path.join("data", "movies.parquet")
+
+# How rating, trailer and streaming lookups are dispatched: "direct" calls the TMDb helpers
+# deterministically, "llm" routes them through an OpenAI function-calling round-trip
+DISPATCH_MODE = "direct"
+
+# Vector store used for retrieval: "qdrant" (remote cluster) or "local" (memory-mapped index on disk)
+VECTOR_BACKEND = "qdrant"
+LOCAL_INDEX_DIR = os.path.join("data", "movie_index")
+# Number of IVF lists scanned by the local index; None searches exactly
+LOCAL_INDEX_NPROBE = None
+
+# BM25 index over title, cast and genres used for the genre and actor slots of retrieval:
+# "fusion" runs lexical and dense search and merges them with reciprocal rank fusion,
+# "lexical" skips dense search for slots whose whole input is an indexed cast name, genre or title,
+# "off" uses dense search only
+LEXICAL_INDEX_DIR = os.path.join("data", "lexical_index")
+LEXICAL_RETRIEVAL = "fusion"
+
+# Coroutine functions ("module.function") awaited on the shared event loop before it stops, e.g. to
+# close async HTTP clients bound to it; modules that were never imported are skipped
+EVENT_LOOP_SHUTDOWN_CALLS = ("tmdb_client.close_async_client",)
+EVENT_LOOP_SHUTDOWN_TIMEOUT = 5.0
+
+# Heavy clients shared by every Streamlit session and thread in the process
+_resources: Dict[Hashable, Any] = {}
+# One lock per resource, so a factory waiting on the network does not block creating the others
+_resource_locks: Dict[Hashable, threading.Lock] = {}
+_lock = threading.RLock()
+_warm_up_started = False
+
+T = TypeVar("T")
+
+def _get_or_create(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """Return the resource stored under `key`, creating it with `factory` on first use."""
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource_lock = _resource_locks.setdefault(key, threading.Lock())
+        with resource_lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = factory()
+                _resources[key] = resource
+    return resource
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the shared asyncio event loop, running in a daemon thread.
+    Async work (e.g. the recommendation turn of pipeline.py) runs on it, so async HTTP clients
+    and their connections are reused across Streamlit sessions.
+    The loop is shut down at interpreter exit (see shutdown_event_loop).
+    """
+    def create() -> asyncio.AbstractEventLoop:
+        loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            loop.run_forever()
+            loop.close()
+
+        threading.Thread(target=run, name="event-loop", daemon=True).start()
+        atexit.register(shutdown_event_loop)
+        return loop
+
+    return _get_or_create("event_loop", create)
+
+def shutdown_event_loop(timeout: float = EVENT_LOOP_SHUTDOWN_TIMEOUT) -> None:
+    """
+    Await EVENT_LOOP_SHUTDOWN_CALLS on the shared event loop, then stop and close it.
+    A later get_event_loop() creates a new loop.
+    """
+    with _lock:
+        loop = _resources.pop("event_loop", None)
+    if loop is None or loop.is_closed():
+        return
+    for call in EVENT_LOOP_SHUTDOWN_CALLS:
+        module, _, function = call.rpartition(".")
+        if module not in sys.modules:
+            continue
+        try:
+            asyncio.run_coroutine_threadsafe(getattr(sys.modules[module], function)(), loop).result(timeout)
+        except Exception:
+            pass
+    loop.call_soon_threadsafe(loop.stop)
+
+def run_async(coroutine: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """Run a coroutine on the shared event loop and wait for its result. Must not be called on that loop."""
+    loop = get_event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("run_async() cannot wait on the event loop it is called from")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result(timeout)
+
+def get_tmdb_api_key() -> str:
+    """Return the TMDb API key, read from the secrets on first use."""
+    return _get_or_create("tmdb_api_key", lambda: get_api_key("TMDB_API_KEY"))
+
+def create_openai_client(api_key: str) -> "OpenAI":
+    """
+    Create an OpenAI SDK client whose requests are timed and whose token usage is recorded in metrics.
+    Every attempt waits for the host's token bucket of the shared request scheduler; the SDK retries
+    429 and 5xx responses itself, with jittered exponential backoff.
+    """
+    from openai import DefaultHttpxClient, OpenAI
+
+    hooks = httpx_event_hooks("openai")
+    scheduler_hooks = get_scheduler().httpx_event_hooks()
+    event_hooks = {event: scheduler_hooks[event] + hooks[event] for event in hooks}
+    return OpenAI(
+        api_key=api_key,
+        base_url=OPENAI_BASE_URL,
+        max_retries=MAX_RETRIES,
+        http_client=DefaultHttpxClient(event_hooks=event_hooks),
+    )
+
+def get_openai_client() -> "OpenAI":
+    """Return the shared OpenAI SDK client."""
+    return _get_or_create(
+        "openai",
+        lambda: create_openai_client(get_api_key("OPENAI_API_KEY")),
+    )
+
+def embedding_model_key(dimensions: Optional[int] = None) -> str:
+    """
+    Identify the embedding model and output size, e.g. "text-embedding-3-large@512".
+    Used in embedding cache keys and content hashes so vectors of different sizes never mix.
+    """
+    if dimensions is None or dimensions == EMBEDDING_MODEL_DIMENSIONS:
+        return EMBEDDING_MODEL
+    return f"{EMBEDDING_MODEL}@{dimensions}"
+
+def build_embeddings(api_key: str, dimensions: Optional[int] = None) -> "CachedEmbeddings":
+    """Create cached OpenAI embeddings, truncated to `dimensions` when given."""
+    from langchain.embeddings import OpenAIEmbeddings
+    from embedding_cache import CachedEmbeddings
+
+    model_kwargs = {}
+    if dimensions is not None and dimensions != EMBEDDING_MODEL_DIMENSIONS:
+        model_kwargs["dimensions"] = dimensions
+    return CachedEmbeddings(
+        OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            api_key=api_key,
+            openai_api_base=OPENAI_BASE_URL,
+            client=create_openai_client(api_key).embeddings,
+            model_kwargs=model_kwargs,
+        ),
+        model=embedding_model_key(dimensions),
+    )
+
+def get_vector_store_dimensions() -> Optional[int]:
+    """Return the vector size of the configured vector store, or None if it cannot be read."""
+    try:
+        if VECTOR_BACKEND == "local":
+            return get_local_index().dimensions
+        vectors = get_qdrant_client().get_collection(COLLECTION_NAME).config.params.vectors
+        return vectors.size
+    except Exception:
+        return None
+
+def get_embedding_dimensions() -> Optional[int]:
+    """Return the dimensions queries are embedded with: EMBEDDING_DIMENSIONS or the vector store's."""
+    if EMBEDDING_DIMENSIONS is not None:
+        return EMBEDDING_DIMENSIONS
+    return get_vector_store_dimensions()
+
+def get_embeddings() -> "CachedEmbeddings":
+    """
+    Return the shared LangChain embeddings model, wrapped in the embedding cache.
+    Raises RuntimeError while the vector store's dimensions cannot be read; nothing is cached,
+    so the next call asks the vector store again.
+    """
+    def create() -> "CachedEmbeddings":
+        dimensions = get_embedding_dimensions()
+        if dimensions is None:
+            raise RuntimeError(
+                f"Cannot read the vector size of the {VECTOR_BACKEND} vector store; set EMBEDDING_DIMENSIONS"
+            )
+        return build_embeddings(get_api_key("OPENAI_API_KEY"), dimensions)
+
+    return _get_or_create("embeddings", create)
+
+def get_qdrant_client(prefer_grpc: bool = QDRANT_PREFER_GRPC) -> "QdrantClient":
+    """
+    Return the shared Qdrant client, optionally using the gRPC transport.
+    Runs Qdrant in-process instead when QDRANT_PATH is set.
+    """
+    def create() -> "QdrantClient":
+        from qdrant_client import QdrantClient
+
+        if QDRANT_PATH is not None:
+            return QdrantClient(path=QDRANT_PATH)
+        return QdrantClient(url=QDRANT_URL, api_key=get_api_key("QDRANT_API_KEY"), prefer_grpc=prefer_grpc)
+
+    return _get_or_create(("qdrant", prefer_grpc), create)
+
+def get_local_index(directory: str = LOCAL_INDEX_DIR) -> "LocalVectorIndex":
+    """Return the shared local memory-mapped vector index."""
+    from local_index import LocalVectorIndex
+
+    return _get_or_create(
+        ("local_index", directory),
+        lambda: LocalVectorIndex(directory),
+    )
+
+def get_lexical_index(directory: str = LEXICAL_INDEX_DIR) -> Optional["LexicalIndex"]:
+    """Return the shared lexical index, or None if it has not been built."""
+    from lexical_index import LexicalIndex
+
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        return None
+    return _get_or_create(
+        ("lexical_index", directory),
+        lambda: LexicalIndex(directory),
+    )
+
+def get_chat_model(model: str = "gpt-4o", temperature: float = 0.7) -> "ChatOpenAI":
+    """Return the shared LangChain chat model for a model name and temperature."""
+    from langchain.chat_models import ChatOpenAI
+
+    return _get_or_create(
+        ("chat", model, temperature),
+        lambda: ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            api_key=get_api_key("OPENAI_API_KEY"),
+            openai_api_base=OPENAI_BASE_URL,
+            client=get_openai_client().chat.completions,
+        ),
+    )
+
+def get_output_parser(pydantic_object: Type["BaseModel"]) -> "PydanticOutputParser":
+    """Return the shared output parser for a pydantic schema."""
+    from langchain.output_parsers import PydanticOutputParser
+
+    return _get_or_create(
+        ("parser", pydantic_object),
+        lambda: PydanticOutputParser(pydantic_object=pydantic_object),
+    )
+
+def health_check() -> Dict[str, bool]:
+    """
+    Check that the vector store and OpenAI behind the shared clients are reachable and that
+    queries are embedded with the vector store's dimensions.
+    Returns a mapping of service name to a boolean status.
+    """
+    status = {}
+
+    if VECTOR_BACKEND == "local":
+        try:
+            status["local_index"] = get_local_index().count > 0
+        except Exception:
+            status["local_index"] = False
+    else:
+        try:
+            get_qdrant_client().get_collection(COLLECTION_NAME)
+            status["qdrant"] = True
+        except Exception:
+            status["qdrant"] = False
+
+    # Queries must be embedded with the dimensions the vector store was built with
+    store_dimensions = get_vector_store_dimensions()
+    query_dimensions = get_embedding_dimensions() or EMBEDDING_MODEL_DIMENSIONS
+    status["embedding_dimensions"] = store_dimensions is None or store_dimensions == query_dimensions
+
+    try:
+        get_openai_client().models.retrieve(EMBEDDING_MODEL)
+        status["openai"] = True
+    except Exception:
+        status["openai"] = False
+
+    return status
+
+def warm_up(background: bool = True, modules: Sequence[str] = (), calls: Sequence[str] = ()) -> None:
+    """
+    Import `modules` (e.g. the app's LangChain pipeline), create the shared clients and open
+    their connections, then run `calls` ("module.function", e.g. index builders) ahead of the
+    first user action.
+    Runs at most once per process; by default in a daemon thread so it does not block rendering.
+    """
+    global _warm_up_started
+    with _lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+
+    def run() -> None:
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                # Imported again, with a visible error, where the app first uses it
+                pass
+        get_chat_model()
+        try:
+            get_embeddings().embed_query("warm up")
+        except Exception:
+            pass
+        health_check()
+        for call in calls:
+            module, _, function = call.rpartition(".")
+            try:
+                getattr(importlib.import_module(module), function)()
+            except Exception:
+                # Retried lazily on first use
+                pass
+
+    if background:
+        threading.Thread(target=run, name="resource-warm-up", daemon=True).start()
+    else:
+        run()
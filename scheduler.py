@@ -0,0 +1,244 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, Type
+import metrics
+
+# Requests per second and burst size of the token bucket per host; hosts not listed are not throttled.
+# TMDb allows about 50 requests per second per IP; OpenAI limits depend on the account tier
+HOST_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "api.themoviedb.org": (40.0, 40),
+    "api.openai.com": (50.0, 50),
+}
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 3
+# Full-jitter exponential backoff: the n-th retry waits a random time up to min(BACKOFF_MAX, BACKOFF_BASE * 2**n)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+class TokenBucket:
+    """Thread-safe token bucket. Callers reserve a token and wait until it becomes available."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it (0 if one is available)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+class RequestScheduler:
+    """
+    Shared scheduler for outgoing HTTP requests: per-host token buckets, retries with jittered
+    backoff on 429 and 5xx responses, and single-flight coalescing of identical in-flight calls.
+    Works for threads (send, single_flight) and coroutines (send_async, single_flight_async) alike.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX
+    ):
+        self.rate_limits = HOST_RATE_LIMITS if rate_limits is None else rate_limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def _count(self, host: str, event: str) -> None:
+        with self._lock:
+            self._counts[(host, event)] += 1
+        metrics.record_scheduler_event(host, event)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of throttled, rate-limited, retried, failed and coalesced calls per host."""
+        with self._lock:
+            counts = list(self._counts.items())
+        stats: Dict[str, Dict[str, int]] = {}
+        for (host, event), count in counts:
+            stats.setdefault(host, {})[event] = count
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+    def _reserve(self, host: str) -> float:
+        """Take a token from the bucket of `host` and return the wait in seconds."""
+        limit = self.rate_limits.get(host)
+        if limit is None:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(*limit)
+        delay = bucket.reserve()
+        if delay > 0:
+            self._count(host, "throttled")
+        return delay
+
+    def acquire(self, host: str) -> None:
+        """Block until the bucket of `host` allows one more request."""
+        delay = self._reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, host: str) -> None:
+        """Wait until the bucket of `host` allows one more request, without blocking the event loop."""
+        delay = self._reserve(host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, host: str, attempt: int, response: Any) -> Optional[float]:
+        """
+        Return the wait before retrying a response with a retryable status, or None if it is final.
+        A Retry-After header (in seconds) takes precedence over the backoff.
+        """
+        if response.status_code not in RETRY_STATUSES:
+            return None
+        if response.status_code == 429:
+            self._count(host, "rate_limited")
+        if attempt >= self.max_retries:
+            self._count(host, "failed")
+            return None
+
+        self._count(host, "retried")
+        retry_after = response.headers.get("Retry-After")
+        try:
+            return min(self.backoff_max, float(retry_after))
+        except (TypeError, ValueError):
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def send(self, host: str, send: Callable[[], Any], retry_exceptions: Tuple[Type[BaseException], ...] = ()) -> Any:
+        """
+        Perform a request with `send` (returning a response with status_code and headers) once the
+        bucket of `host` allows it, retrying 429/5xx responses and `retry_exceptions`.
+        Returns the last response; the last exception is re-raised once the retries are used up.
+        """
+        attempt = 0
+        while True:
+            self.acquire(host)
+            try:
+                response = send()
+            except retry_exceptions:
+                if attempt >= self.max_retries:
+                    self._count(host, "failed")
+                    raise
+                self._count(host, "retried")
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            else:
+                delay = self._retry_delay(host, attempt, response)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+            attempt += 1
+
+    async def send_async(
+        self,
+        host: str,
+        send: Callable[[], Awaitable[Any]],
+        retry_exceptions: Tuple[Type[BaseException], ...] = ()
+    ) -> Any:
+        """Async variant of send."""
+        attempt = 0
+        while True:
+            await self.acquire_async(host)
+            try:
+                response = await send()
+            except retry_exceptions:
+                if attempt >= self.max_retries:
+                    self._count(host, "failed")
+                    raise
+                self._count(host, "retried")
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            else:
+                delay = self._retry_delay(host, attempt, response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def httpx_event_hooks(self) -> Dict[str, List[Callable]]:
+        """
+        Event hooks for a sync httpx client (e.g. the OpenAI SDK's) that wait for the token bucket
+        of the request's host before every attempt and count rate-limited responses.
+        Retries are left to the client.
+        """
+        def on_request(request: Any) -> None:
+            self.acquire(request.url.host)
+
+        def on_response(response: Any) -> None:
+            if response.status_code == 429:
+                self._count(response.request.url.host, "rate_limited")
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Return the in-flight future of `key` and whether the caller is its leader (must run the call)."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def single_flight(self, host: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run `fn` unless an identical call (same `key`) is already in flight, in which case wait for
+        and share its result. Results are shared, not copied, so callers must not mutate them.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            self._count(host, "coalesced")
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def single_flight_async(self, host: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of single_flight; in-flight calls are shared with threads and other coroutines."""
+        future, leader = self._join(key)
+        if not leader:
+            self._count(host, "coalesced")
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+_scheduler = RequestScheduler()
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide request scheduler."""
+    return _scheduler
@@ -0,0 +1,90 @@
+import threading
+import pytest
+import chat_history
+from chat_history import RECOMMENDATION_MARKER, ConversationHistory
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """Count one token per word, so budgets do not depend on the tokenizer files."""
+    monkeypatch.setattr(chat_history, "count_tokens", lambda text, model="gpt-4o": len(text.split()))
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """Replace the LLM summary with a fake that records its batches and can be held back."""
+    release = threading.Event()
+    release.set()
+    batches = []
+
+    def summarize(summary, messages, model=None):
+        release.wait(5)
+        batches.append([message["content"] for message in messages])
+        return (summary + " " + " ".join(message["content"] for message in messages)).strip()
+
+    monkeypatch.setattr(chat_history, "summarize_messages", summarize)
+    return release, batches
+
+def conversation(turns, words=1):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": " ".join([f"q{turn}"] * words)})
+        history.append({"role": "assistant", "content": " ".join([f"a{turn}"] * words)})
+    return history
+
+def contents(messages):
+    return [message.content for message in messages]
+
+def test_short_history_is_sent_verbatim(summaries):
+    history = ConversationHistory(recent_messages=8)
+    messages = history.build_messages(conversation(2), "movie", "question")
+    assert contents(messages)[-5:] == ["q0", "a0", "q1", "a1", "question"]
+    assert history.last_turn_stats()["saved_tokens"] == 0
+
+def test_oldest_messages_are_dropped_to_fit_the_budget(summaries):
+    history = ConversationHistory(recent_messages=100)
+    unbounded = history.build_messages(conversation(10, words=20), "movie", "question")
+    budget = chat_history.count_message_tokens(unbounded) - 100
+    bounded = ConversationHistory(budget=budget, recent_messages=100)
+    messages = bounded.build_messages(conversation(10, words=20), "movie", "question")
+
+    assert chat_history.count_message_tokens(messages) <= budget
+    assert not any(content.startswith("q0") for content in contents(messages))
+    assert contents(messages)[-1] == "question"
+    assert bounded.last_turn_stats()["saved_tokens"] > 0
+
+def test_latest_recommendation_is_pinned(summaries):
+    history = conversation(10, words=20)
+    history[1] = {"role": "assistant", "content": f"{RECOMMENDATION_MARKER} Cast Away"}
+    full = ConversationHistory(recent_messages=100).build_messages(history, "movie", "question")
+    bounded = ConversationHistory(budget=chat_history.count_message_tokens(full) - 100, recent_messages=100)
+    messages = bounded.build_messages(history, "movie", "question")
+    assert f"{RECOMMENDATION_MARKER} Cast Away" in contents(messages)
+
+def test_summaries_run_in_background_batches(summaries):
+    release, batches = summaries
+    release.clear()
+    history = ConversationHistory(recent_messages=4, summary_batch=4)
+
+    # 6 messages: only 2 left the window, below the batch size
+    history.build_messages(conversation(3), "movie", "question")
+    assert history._pending_summary is None
+
+    # 8 messages: 4 left the window; the summary starts but does not block the turn
+    messages = history.build_messages(conversation(4), "movie", "question")
+    assert history._pending_summary is not None
+    assert "q0" in contents(messages)
+    assert history.summarized_count == 0
+
+    release.set()
+    history.wait_for_summary()
+    assert batches == [["q0", "a0", "q1", "a1"]]
+    assert history.summarized_count == 4
+
+    messages = history.build_messages(conversation(5), "movie", "question")
+    assert "q0" not in contents(messages)
+    assert any("q0 a0 q1 a1" in content for content in contents(messages))
+
+def test_truncate_tokens_keeps_start_or_end(monkeypatch):
+    monkeypatch.setattr(chat_history, "_get_encoding", lambda model: None)
+    text = "x" * 100
+    assert chat_history.truncate_tokens(text, 5) == "x" * 5 * chat_history.FALLBACK_CHARS_PER_TOKEN
+    assert chat_history.truncate_tokens("abcdefghij" * 4, 2, keep_end=False) == "abcdefgh"
@@ -0,0 +1,56 @@
+import time
+import pytest
+import disk_cache
+from disk_cache import DiskCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+
+def test_get_returns_stored_value(cache):
+    cache.set("a", b"1")
+    assert cache.get("a") == b"1"
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_expired_entries_are_misses(cache):
+    cache.set("a", b"1", ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_evicts_least_recently_used(cache, monkeypatch):
+    monkeypatch.setattr(disk_cache, "ACCESS_REFRESH_INTERVAL", 0.0)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.encode())
+        time.sleep(0.01)
+    cache.get("a")
+    cache.set("d", b"d")
+    assert sorted(key for key, _ in cache.items()) == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+def test_hits_within_refresh_interval_do_not_write(cache, monkeypatch):
+    monkeypatch.setattr(disk_cache, "ACCESS_REFRESH_INTERVAL", 60.0)
+    cache.set("a", b"1")
+    for _ in range(10):
+        cache.get("a")
+    assert cache._pending_access == {}
+
+def test_pending_access_times_are_flushed(cache, monkeypatch):
+    monkeypatch.setattr(disk_cache, "ACCESS_REFRESH_INTERVAL", 0.0)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    time.sleep(0.01)
+    cache.get("a")
+    assert "a" in cache._pending_access
+    cache.flush()
+    assert cache._pending_access == {}
+    assert [key for key, _ in cache.items()] == ["a", "b"]
+
+def test_set_many_and_clear(cache):
+    cache.set_many({"a": b"1", "b": b"2"})
+    assert cache.get("b") == b"2"
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 0
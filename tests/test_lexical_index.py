@@ -0,0 +1,58 @@
+import pytest
+from lexical_index import LexicalIndex, LexicalIndexWriter, query_terms, reciprocal_rank_fusion
+
+MOVIES = [
+    ("The Terminal", ["Tom Hanks"], ["Comedy", "Drama"]),
+    ("Cast Away", ["Tom Hanks", "Helen Hunt"], ["Drama"]),
+    ("The Mask", ["Jim Carrey"], ["Comedy"]),
+    ("Tom and Jerry", ["Chloe Grace Moretz"], ["Animation", "Comedy"]),
+]
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("lexical"))
+    writer = LexicalIndexWriter(directory)
+    for title, cast, genres in MOVIES:
+        writer.add(title, cast, genres, {"page_content": title, "metadata": {"title": title}})
+    writer.close()
+    return LexicalIndex(directory)
+
+def titles(index, hits):
+    return [index.payload(row)["page_content"] for row, _ in hits]
+
+def test_query_terms_drop_stopwords_and_add_phrase():
+    assert query_terms("The Mask") == ["mask", "=the mask"]
+    assert query_terms("comedy") == ["comedy"]
+    assert query_terms("the") == []
+
+def test_cast_search_ranks_full_name_matches_first(index):
+    hits = index.search("Tom Hanks", k=3)
+    assert set(titles(index, hits)[:2]) == {"The Terminal", "Cast Away"}
+    assert all(score > 0 for _, score in hits)
+
+def test_stopword_only_queries_match_nothing(index):
+    assert index.search("the") == []
+    assert index.search("and") == []
+
+def test_unknown_terms_match_nothing(index):
+    assert index.search("western") == []
+
+def test_genre_search(index):
+    assert set(titles(index, index.search("comedy", k=5))) == {"The Terminal", "The Mask", "Tom and Jerry"}
+
+def test_phrase_match_requires_a_whole_value(index):
+    assert index.phrase_match("Tom Hanks")
+    assert index.phrase_match("comedy")
+    assert index.phrase_match("the mask")
+    assert not index.phrase_match("tom")
+    assert not index.phrase_match("hanks tom")
+    assert not index.phrase_match("")
+
+def test_payload_round_trip(index):
+    assert index.payload(2) == {"page_content": "The Mask", "metadata": {"title": "The Mask"}}
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]])
+    assert fused[0] == "b"
+    assert fused[-1] in ("a", "d")
+    assert set(fused) == {"a", "b", "c", "d"}
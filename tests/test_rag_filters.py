@@ -0,0 +1,40 @@
+from RAG import search_local_index
+
+MOVIES = [
+    {"title": "Low Rated Comedy", "genres": ["comedy"], "rating": 3.0, "votes": 100},
+    {"title": "Drama", "genres": ["drama"], "rating": 8.0, "votes": 100},
+    {"title": "Unrated Comedy", "genres": ["comedy"], "rating": None, "votes": 0},
+    {"title": "Good Comedy", "genres": ["comedy"], "rating": 7.5, "votes": 100},
+]
+
+class FakeIndex:
+    """Local index stand-in ranking MOVIES in list order."""
+
+    def __init__(self):
+        self.limits = []
+
+    def search(self, query_vectors, k=3, nprobe=None):
+        self.limits.append(k)
+        return [[(row, 1.0) for row in range(min(k, len(MOVIES)))] for _ in query_vectors]
+
+    def payload(self, row):
+        return {"page_content": MOVIES[row]["title"], "metadata": MOVIES[row]}
+
+def titles(documents):
+    return [doc.page_content for doc in documents]
+
+def test_unconstrained_search_returns_top_k():
+    index = FakeIndex()
+    assert titles(search_local_index(index, [[1.0]], k=2)[0]) == ["Low Rated Comedy", "Drama"]
+    assert index.limits == [2]
+
+def test_hits_are_post_filtered_by_genre_and_rating():
+    index = FakeIndex()
+    results = search_local_index(index, [[1.0], [1.0]], k=2, query_genres=[["comedy"], []])
+    assert titles(results[0]) == ["Unrated Comedy", "Good Comedy"]
+    assert titles(results[1]) == ["Drama", "Unrated Comedy"]
+    assert index.limits == [10]
+
+def test_constraints_matching_nothing_fall_back_to_the_ranking():
+    results = search_local_index(FakeIndex(), [[1.0]], k=2, query_genres=[["western"]])
+    assert titles(results[0]) == ["Low Rated Comedy", "Drama"]
@@ -0,0 +1,38 @@
+import json
+from RAG import iter_json_array_objects
+
+RECOMMENDATIONS = {
+    "recommendations": [
+        {"title": "Cast Away", "reason": "A {lonely} survival story"},
+        {"title": "The \"Terminal\"", "reason": "Stuck in an airport ]"},
+    ]
+}
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def test_yields_array_elements_across_chunk_boundaries():
+    text = json.dumps(RECOMMENDATIONS)
+    for size in (1, 3, 7, len(text)):
+        assert list(iter_json_array_objects(chunked(text, size))) == RECOMMENDATIONS["recommendations"]
+
+def test_yields_each_object_as_soon_as_it_closes():
+    text = json.dumps(RECOMMENDATIONS)
+    first_end = text.index("}") + 1
+    parsed = iter_json_array_objects(iter([text[:first_end], text[first_end:]]))
+    assert next(parsed) == RECOMMENDATIONS["recommendations"][0]
+
+def test_ignores_text_outside_json():
+    text = "Here you go:\n```json\n" + json.dumps(RECOMMENDATIONS) + "\n```"
+    assert len(list(iter_json_array_objects(chunked(text, 5)))) == 2
+
+def test_nested_objects_are_part_of_their_element():
+    text = '[{"title": "A", "meta": {"year": 2000, "tags": [{"x": 1}]}}, {"title": "B"}]'
+    assert list(iter_json_array_objects([text])) == [
+        {"title": "A", "meta": {"year": 2000, "tags": [{"x": 1}]}},
+        {"title": "B"},
+    ]
+
+def test_objects_outside_arrays_and_truncated_objects_are_skipped():
+    assert list(iter_json_array_objects(['{"title": "A"}'])) == []
+    assert list(iter_json_array_objects(['[{"title": "A"}, {"title": "B'])) == [{"title": "A"}]
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import recommendation_cache
+from recommendation_cache import RecommendationCache, normalize_preference
+
+class FakeEmbeddings:
+    """Deterministic embeddings where texts sharing word prefixes are similar."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_queries(self, texts):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            vector = np.zeros(300)
+            for word in text.lower().split():
+                vector += np.random.default_rng(sum(map(ord, word[:4]))).normal(size=300)
+            vectors.append(vector.tolist())
+        return vectors
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(recommendation_cache, "get_embeddings", lambda: fake)
+    return fake
+
+@pytest.fixture
+def cache(tmp_path, embeddings):
+    return RecommendationCache(path=str(tmp_path / "recommendations.sqlite"), background=False)
+
+TOP = [{"title": "Cast Away", "reason": "Tom Hanks"}]
+
+@pytest.mark.parametrize("text, expected", [
+    ("Comedy & ACTION", "action, comedy"),
+    ("action, comedy", "action, comedy"),
+    ("Tom Hanks and Meg Ryan!", "meg ryan, tom hanks"),
+    ("sci-fi / horror; sci-fi", "horror, sci-fi"),
+    ("80s Comedy", "80s comedy"),
+    ("Timothée Chalamet & Zendaya", "timothée chalamet, zendaya"),
+    ("", ""),
+    ("  ,  ", ""),
+])
+def test_normalize_preference(text, expected):
+    assert normalize_preference(text) == expected
+
+def test_exact_hit_ignores_case_and_order(cache):
+    cache.set("revenge", "action, comedy", "Tom Hanks", TOP, TOP)
+    entry = cache.get("Revenge", "comedy and action", "tom hanks")
+    assert entry["top_movies"] == TOP
+    assert "vectors" not in entry
+    assert cache.stats()["exact_hits"] == 1
+
+@pytest.mark.parametrize("stored, requested", [
+    ("80s comedy", "90s comedy"),
+    ("1920s paris", "1960s paris"),
+    ("Timothée", "Timothe"),
+])
+def test_exact_tier_keeps_digits_and_accents(tmp_path, embeddings, stored, requested):
+    cache = RecommendationCache(path=str(tmp_path / "recommendations.sqlite"), semantic=False)
+    cache.set(stored, "comedy", "any", TOP, TOP)
+    assert normalize_preference(stored) != normalize_preference(requested)
+    assert cache.get(requested, "comedy", "any") is None
+    assert cache.get(stored, "comedy", "any") is not None
+
+def test_semantic_hit_for_similar_preferences(cache):
+    cache.set("revenge", "action", "Tom Hanks", TOP, TOP)
+    assert cache.get("revenges", "action", "Tom Hanks")["top_movies"] == TOP
+    assert cache.get("revenge", "action", "Jim Carrey") is None
+    assert cache.stats()["semantic_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_empty_index_skips_embedding(cache, embeddings):
+    assert cache.get("revenge", "action", "Tom Hanks") is None
+    assert embeddings.calls == 0
+
+def test_index_is_rebuilt_from_stored_vectors(tmp_path, embeddings):
+    path = str(tmp_path / "recommendations.sqlite")
+    RecommendationCache(path=path, background=False).set("revenge", "action", "Tom Hanks", TOP, TOP)
+    calls = embeddings.calls
+
+    reopened = RecommendationCache(path=path, background=False)
+    assert len(reopened._keys) == 1
+    assert embeddings.calls == calls
+    assert reopened.get("revenges", "action", "Tom Hanks") is not None
+
+def test_entries_stored_while_loading_are_kept(tmp_path, embeddings):
+    cache = RecommendationCache(path=str(tmp_path / "recommendations.sqlite"), background=False, semantic=True)
+    cache._loaded = False
+    cache.set("revenge", "action", "Tom Hanks", TOP, TOP)
+    assert cache._keys == []
+    cache.load_index()
+    assert len(cache._keys) == 1
+
+def test_clear(cache):
+    cache.set("revenge", "action", "Tom Hanks", TOP, TOP)
+    cache.clear()
+    assert cache.get("revenge", "action", "Tom Hanks") is None
+    assert cache.stats()["entries"] == 0
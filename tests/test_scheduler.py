@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+import pytest
+from scheduler import RequestScheduler, TokenBucket
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def responses(*statuses):
+    """Return a send function answering with the given statuses in order, and the list of calls."""
+    calls = []
+
+    def send():
+        calls.append(time.monotonic())
+        return FakeResponse(statuses[min(len(calls), len(statuses)) - 1])
+
+    return send, calls
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(rate_limits={}, max_retries=3, backoff_base=0.001, backoff_max=0.01)
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=10.0, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+
+def test_send_retries_retryable_statuses(scheduler):
+    send, calls = responses(429, 503, 200)
+    assert scheduler.send("host", send).status_code == 200
+    assert len(calls) == 3
+    assert scheduler.stats()["host"] == {"rate_limited": 1, "retried": 2}
+
+def test_send_returns_last_response_after_max_retries(scheduler):
+    send, calls = responses(503)
+    assert scheduler.send("host", send).status_code == 503
+    assert len(calls) == 4
+    assert scheduler.stats()["host"]["failed"] == 1
+
+def test_send_does_not_retry_client_errors(scheduler):
+    send, calls = responses(404)
+    assert scheduler.send("host", send).status_code == 404
+    assert len(calls) == 1
+
+def test_send_honours_retry_after(scheduler):
+    scheduler.backoff_max = 1.0
+    calls = []
+
+    def send():
+        calls.append(time.monotonic())
+        return FakeResponse(429, {"Retry-After": "0.2"}) if len(calls) == 1 else FakeResponse(200)
+
+    scheduler.send("host", send)
+    assert calls[1] - calls[0] >= 0.19
+
+def test_send_retries_exceptions_then_raises(scheduler):
+    attempts = []
+
+    def send():
+        attempts.append(1)
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        scheduler.send("host", send, retry_exceptions=(ConnectionError,))
+    assert len(attempts) == 4
+
+def test_rate_limit_spaces_requests():
+    scheduler = RequestScheduler(rate_limits={"host": (20.0, 1)})
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.acquire("host")
+    assert time.monotonic() - start >= 0.09
+    assert scheduler.stats()["host"]["throttled"] == 2
+
+def test_single_flight_coalesces_concurrent_calls(scheduler):
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return {"value": 1}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(scheduler.single_flight("host", "key", fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"value": 1}] * 5
+    assert scheduler.stats()["host"]["coalesced"] == 4
+
+def test_single_flight_shares_errors_and_forgets_the_key(scheduler):
+    with pytest.raises(ValueError):
+        scheduler.single_flight("host", "key", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert scheduler.single_flight("host", "key", lambda: 2) == 2
+
+def test_send_async_retries(scheduler):
+    statuses = iter([500, 200])
+
+    async def send():
+        return FakeResponse(next(statuses))
+
+    assert asyncio.run(scheduler.send_async("host", send)).status_code == 200
+    assert scheduler.stats()["host"]["retried"] == 1
+
+def test_single_flight_async_coalesces(scheduler):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(scheduler.single_flight_async("host", "key", fetch) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["result"] * 3
+    assert len(calls) == 1
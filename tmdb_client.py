@@ -0,0 +1,357 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional, Sequence
+from disk_cache import DiskCache, CACHE_DIR
+from scheduler import get_scheduler
+import metrics
+
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+POOL_SIZE = 16
+# Timeout in seconds of every TMDb request (connect and read), sync and async
+REQUEST_TIMEOUT = 30.0
+
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_PATH = os.path.join(CACHE_DIR, "tmdb_responses.sqlite")
+RESPONSE_CACHE_MAX_ENTRIES = 20000
+# In-memory title -> search result entries; least recently used titles are evicted beyond it
+SEARCH_CACHE_MAX_ENTRIES = 10000
+
+# Time-to-live in seconds for cached responses, per endpoint class
+HOUR = 60 * 60
+RESPONSE_CACHE_TTL = {
+    "search": 7 * 24 * HOUR,
+    "details": 24 * HOUR,
+    "credits": 7 * 24 * HOUR,
+    "reviews": 24 * HOUR,
+    "videos": 7 * 24 * HOUR,
+    "providers": 12 * HOUR,
+}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# One async client per event loop, since httpx connections cannot be shared between loops
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+# Title -> top search result, shared by every module and Streamlit session in the process
+_search_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+_response_cache: Optional[DiskCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Return the process-wide keep-alive session used for all TMDb requests."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the keep-alive async client of the running event loop, used for all async TMDb requests."""
+    loop = asyncio.get_running_loop()
+    with _session_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            limits = httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+            client = httpx.AsyncClient(limits=limits, timeout=REQUEST_TIMEOUT)
+            _async_clients[loop] = client
+    return client
+
+async def close_async_client() -> None:
+    """Close the async client of the running event loop, if any; awaited by resources when the shared loop shuts down."""
+    with _session_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def get_response_cache() -> Optional[DiskCache]:
+    """Return the persistent TMDb response cache, or None if caching is disabled."""
+    global _response_cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = DiskCache(RESPONSE_CACHE_PATH, max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+    return _response_cache
+
+def cache_stats() -> Dict[str, float]:
+    """Return hit/miss counters of the persistent response cache."""
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {}
+
+def _endpoint_class(path: str) -> str:
+    """Map a TMDb path to the endpoint class used to pick its cache TTL."""
+    if path.startswith("/search/"):
+        return "search"
+    if path.endswith("/credits"):
+        return "credits"
+    if path.endswith("/reviews"):
+        return "reviews"
+    if path.endswith("/videos"):
+        return "videos"
+    if path.endswith("/watch/providers"):
+        return "providers"
+    return "details"
+
+def _cache_key(path: str, params: Optional[Dict[str, Any]]) -> str:
+    """Build a cache key from the path and request parameters, leaving out the API key."""
+    items = sorted((params or {}).items())
+    return path + "?" + "&".join(f"{key}={value}" for key, value in items)
+
+def _read_cache(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return a response from the persistent response cache, or None on a miss or if caching is disabled."""
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    cached = cache.get(cache_key)
+    metrics.record_cache("tmdb_responses", hits=int(cached is not None), misses=int(cached is None))
+    return json.loads(cached) if cached is not None else None
+
+def _handle_response(
+    response: Any,
+    path: str,
+    cache_key: str,
+    duration: float
+) -> Optional[Dict[str, Any]]:
+    """
+    Record a requests or httpx response in metrics, decode it and store it in the response cache.
+    Returns None for unsuccessful responses and bodies that are not valid JSON.
+    """
+    endpoint = _endpoint_class(path)
+    metrics.record_request("tmdb", endpoint, duration, response.status_code)
+    if response.status_code != 200:
+        return None
+
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+
+    cache = get_response_cache()
+    if cache is not None:
+        ttl = RESPONSE_CACHE_TTL[endpoint]
+        cache.set(cache_key, json.dumps(data).encode("utf-8"), ttl=ttl)
+
+    return data
+
+def _host() -> str:
+    """Host of TMDB_BASE_URL, which selects the token bucket of the request scheduler."""
+    return urlsplit(TMDB_BASE_URL).hostname or TMDB_BASE_URL
+
+def _query(api_key: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    query = {"api_key": api_key}
+    if params:
+        query.update(params)
+    return query
+
+def _get(path: str, api_key: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Perform a GET request against the TMDb API.
+    Successful responses are served from and stored in the persistent response cache. Requests go
+    through the shared request scheduler: they wait for the TMDb token bucket, 429/5xx responses and
+    connection errors are retried with backoff, and identical requests in flight share one response.
+    Returns the decoded JSON body, or None if the request fails or the response is not valid JSON.
+    """
+    cache_key = _cache_key(path, params)
+    cached = _read_cache(cache_key)
+    if cached is not None:
+        return cached
+    host = _host()
+    return get_scheduler().single_flight(host, (host, cache_key), lambda: _fetch(host, path, api_key, params, cache_key))
+
+def _fetch(
+    host: str,
+    path: str,
+    api_key: str,
+    params: Optional[Dict[str, Any]],
+    cache_key: str
+) -> Optional[Dict[str, Any]]:
+    """Send one scheduled GET request (including its retries) and handle its response."""
+    url = f"{TMDB_BASE_URL}{path}"
+    query = _query(api_key, params)
+    start = time.perf_counter()
+    try:
+        response = get_scheduler().send(
+            host,
+            lambda: get_session().get(url, params=query, timeout=REQUEST_TIMEOUT),
+            retry_exceptions=(requests.ConnectionError, requests.Timeout),
+        )
+    except requests.RequestException:
+        metrics.record_request("tmdb", _endpoint_class(path), time.perf_counter() - start, "error")
+        return None
+    return _handle_response(response, path, cache_key, time.perf_counter() - start)
+
+async def _get_async(path: str, api_key: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Async variant of _get, sharing its response cache and in-flight requests."""
+    cache_key = _cache_key(path, params)
+    cached = _read_cache(cache_key)
+    if cached is not None:
+        return cached
+    host = _host()
+    return await get_scheduler().single_flight_async(
+        host, (host, cache_key), lambda: _fetch_async(host, path, api_key, params, cache_key)
+    )
+
+async def _fetch_async(
+    host: str,
+    path: str,
+    api_key: str,
+    params: Optional[Dict[str, Any]],
+    cache_key: str
+) -> Optional[Dict[str, Any]]:
+    """Async variant of _fetch."""
+    url = f"{TMDB_BASE_URL}{path}"
+    query = _query(api_key, params)
+    start = time.perf_counter()
+    try:
+        response = await get_scheduler().send_async(
+            host,
+            lambda: get_async_client().get(url, params=query),
+            retry_exceptions=(httpx.TransportError,),
+        )
+    except httpx.HTTPError:
+        metrics.record_request("tmdb", _endpoint_class(path), time.perf_counter() - start, "error")
+        return None
+    return _handle_response(response, path, cache_key, time.perf_counter() - start)
+
+def _normalize_title(title: str) -> str:
+    """Normalize a title so that trivially different spellings share one cache entry."""
+    return " ".join(title.lower().split())
+
+def search_movie(title: str, api_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the top TMDb search result for a movie title, or None if nothing was found.
+    Successful lookups are cached per title for the lifetime of the process.
+    """
+    cached = _cached_search(title)
+    if cached is not None:
+        return cached
+    return _store_search(title, _get("/search/movie", api_key, _search_params(title)))
+
+async def search_movie_async(title: str, api_key: str) -> Optional[Dict[str, Any]]:
+    """Async variant of search_movie, sharing its cache."""
+    cached = _cached_search(title)
+    if cached is not None:
+        return cached
+    return _store_search(title, await _get_async("/search/movie", api_key, _search_params(title)))
+
+def _search_params(title: str) -> Dict[str, str]:
+    return {"query": title, "include_adult": "false"}
+
+def _cached_search(title: str) -> Optional[Dict[str, Any]]:
+    """Return the cached top search result of a title, if any."""
+    key = _normalize_title(title)
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached is not None:
+            _search_cache.move_to_end(key)
+    metrics.record_cache("tmdb_search", hits=int(cached is not None), misses=int(cached is None))
+    return cached
+
+def _store_search(title: str, data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Cache and return the top result of a search response, or None if nothing was found."""
+    if not data or not data.get("results"):
+        return None
+
+    movie = data["results"][0]
+    _remember_search(_normalize_title(title), movie)
+    return movie
+
+def _remember_search(key: str, movie: Dict[str, Any], keep_existing: bool = False) -> None:
+    """Insert a search result into the in-memory LRU, evicting the oldest entries if it is full."""
+    with _search_cache_lock:
+        if keep_existing and key in _search_cache:
+            return
+        _search_cache[key] = movie
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+            _search_cache.popitem(last=False)
+
+def seed_search_cache(title: str, movie: Dict[str, Any]) -> None:
+    """
+    Record a movie already known from elsewhere (e.g. a retrieval payload) as the search result
+    for its title, so later lookups of that title skip the /search/movie request.
+    Existing entries are kept.
+    """
+    _remember_search(_normalize_title(title), movie, keep_existing=True)
+
+def resolve_movie_id(title: str, api_key: str) -> Optional[int]:
+    """Resolve a movie title to its TMDb id using the shared search cache."""
+    movie = search_movie(title, api_key)
+    if movie is None:
+        return None
+    return movie["id"]
+
+async def resolve_movie_id_async(title: str, api_key: str) -> Optional[int]:
+    """Async variant of resolve_movie_id."""
+    movie = await search_movie_async(title, api_key)
+    if movie is None:
+        return None
+    return movie["id"]
+
+def _details_params(language: str, append: Sequence[str]) -> Dict[str, str]:
+    params = {"language": language}
+    if append:
+        params["append_to_response"] = ",".join(append)
+    return params
+
+def get_details(
+    movie_id: int,
+    api_key: str,
+    language: str = "en-US",
+    append: Sequence[str] = ()
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch the TMDb details record for a movie id.
+    Sub-resources listed in `append` (e.g. "credits", "reviews") are fetched in the same request
+    via append_to_response and returned under their own keys.
+    """
+    return _get(f"/movie/{movie_id}", api_key, _details_params(language, append))
+
+async def get_details_async(
+    movie_id: int,
+    api_key: str,
+    language: str = "en-US",
+    append: Sequence[str] = ()
+) -> Optional[Dict[str, Any]]:
+    """Async variant of get_details."""
+    return await _get_async(f"/movie/{movie_id}", api_key, _details_params(language, append))
+
+def get_credits(movie_id: int, api_key: str) -> Optional[Dict[str, Any]]:
+    """Fetch cast and crew for a movie id."""
+    return _get(f"/movie/{movie_id}/credits", api_key)
+
+def get_reviews(movie_id: int, api_key: str) -> Optional[Dict[str, Any]]:
+    """Fetch user reviews for a movie id."""
+    return _get(f"/movie/{movie_id}/reviews", api_key)
+
+def get_videos(movie_id: int, api_key: str) -> List[Dict[str, Any]]:
+    """Fetch the list of videos (trailers, teasers, clips) for a movie id."""
+    data = _get(f"/movie/{movie_id}/videos", api_key)
+    if not data:
+        return []
+    return data.get("results", [])
+
+def get_watch_providers(movie_id: int, api_key: str) -> Dict[str, Dict[str, Any]]:
+    """Fetch watch providers for a movie id, keyed by ISO alpha-2 country code."""
+    data = _get(f"/movie/{movie_id}/watch/providers", api_key)
+    if not data:
+        return {}
+    return data.get("results", {})
@@ -1,58 +1,145 @@
-import streamlit as st
-from langchain.schema import Document
-import pycountry
-import re
-from typing import Dict, Any, List, Optional
-
-def get_api_key(key_name: str = "OPEN_API_KEY") -> str:
-    """Retrieve an API key from Streamlit secrets."""
-    api_key = st.secrets[key_name]
-    return api_key
-
-def row_to_document(row: Dict[str, Any]) -> Document:
-    """Convert a dictionary row of movie data into a LangChain Document object."""
-    text_chunks = [
-        f"Movie title: {row['title']}",
-        f"Overview: {row['overview']}",
-        f"Genres: {row['genres']}" if row['genres'] else "",
-        f"Cast: {row['cast']}" if row['cast'] else "",
-    ]
-    full_text = "\n".join([chunk for chunk in text_chunks if chunk])
-    document = Document(page_content=full_text, metadata={})
-    return document
-
-def get_countries() -> List[str]:
-    """Return a sorted list of all country names."""
-    countries = [country.name for country in pycountry.countries]
-    countries_sorted = sorted(countries)
-    return countries_sorted
-
-def get_country_code(country_name: str) -> Optional[str]:
-    """Return the ISO alpha-2 country code for a given country name."""
-    try:
-        country = pycountry.countries.lookup(country_name.strip())
-        country_code = country.alpha_2
-    except LookupError:
-        country_code = None
-    return country_code
-
-def clean_input_text(input_text: str) -> str:
-    """
-    Clean the input text by:
-    1. Removing any non-alphabetic characters except spaces, apostrophes, and hyphens.
-    2. Converting the text to lowercase.
-    3. Checking if the input is valid (not only spaces, apostrophes, or hyphens).
-    4. Ensuring the input is within the max character limit of 150 characters.
-    """
-    cleaned_input = re.sub(r'[^a-zA-Z\s\'-]', '', input_text)
-    cleaned_input = cleaned_input.lower()
-
-    # Check for empty input or invalid characters
-    if cleaned_input == "" or re.match(r'^[\s\'-]*$', cleaned_input):
-        return "Invalid input. Your input can only include letters, spaces, apostrophes, and hyphens."
-    
-    # Check if the input exceeds 150 characters
-    if len(cleaned_input) > 150:
-        return "The input exceeds the maximum length of 150 characters. Please provide a shorter job title."
-
+import streamlit as st
+import pycountry
+import os
+import re
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+# TMDb movie genres, lowercased
+MOVIE_GENRES = (
+    "action", "adventure", "animation", "comedy", "crime", "documentary", "drama", "family",
+    "fantasy", "history", "horror", "music", "mystery", "romance", "science fiction",
+    "tv movie", "thriller", "war", "western",
+)
+# Common ways of naming TMDb genres
+GENRE_SYNONYMS = {
+    "sci-fi": ["science fiction"],
+    "scifi": ["science fiction"],
+    "sci fi": ["science fiction"],
+    "romcom": ["romance", "comedy"],
+    "rom-com": ["romance", "comedy"],
+    "romantic comedy": ["romance", "comedy"],
+    "historical": ["history"],
+    "musical": ["music"],
+    "animated": ["animation"],
+}
+
+def get_api_key(key_name: str = "OPEN_API_KEY") -> str:
+    """Retrieve an API key from Streamlit secrets, falling back to the environment variable of the same name."""
+    try:
+        api_key = st.secrets[key_name]
+    except (KeyError, FileNotFoundError):
+        if key_name not in os.environ:
+            raise
+        api_key = os.environ[key_name]
+    return api_key
+
+def movie_payload(
+    movie_id: Any,
+    title: Optional[str],
+    release_date: Any,
+    genres: Any,
+    cast: Any,
+    vote_average: Optional[float],
+    vote_count: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Build the structured payload stored under `metadata` for a movie: TMDb id, title, release year,
+    genres and cast (normalized for exact keyword filters), TMDb rating and vote count.
+    TMDb reports a vote_average of 0 for movies nobody voted on; their rating is None (unrated),
+    so rating filters keep them. Without a vote count, a rating of exactly 0 is taken as unrated.
+    """
+    if isinstance(genres, str):
+        genres = genres.split(",")
+    if isinstance(cast, str):
+        cast = cast.split(",")
+    year = str(release_date or "")[:4]
+    unrated = vote_count == 0 if vote_count is not None else not vote_average
+    return {
+        "tmdb_id": int(movie_id) if movie_id is not None else None,
+        "title": title,
+        "year": int(year) if year.isdigit() else None,
+        "genres": [normalize_text(genre) for genre in genres if genre is not None] if genres is not None else [],
+        "cast": [normalize_text(name) for name in cast if name is not None] if cast is not None else [],
+        "rating": float(vote_average) if vote_average is not None and not unrated else None,
+        "votes": int(vote_count) if vote_count is not None else None,
+    }
+
+def row_to_document(row: Dict[str, Any]) -> "Document":
+    """Convert a dictionary row of movie data into a LangChain Document object with its movie payload."""
+    from langchain.schema import Document
+
+    text_chunks = [
+        f"Movie title: {row['title']}",
+        f"Overview: {row['overview']}",
+        f"Genres: {row['genres']}" if row['genres'] else "",
+        f"Cast: {row['cast']}" if row['cast'] else "",
+    ]
+    full_text = "\n".join([chunk for chunk in text_chunks if chunk])
+    metadata = movie_payload(
+        row.get("id"),
+        row.get("title"),
+        row.get("release_date"),
+        row.get("genres"),
+        row.get("cast"),
+        row.get("vote_average"),
+        row.get("vote_count"),
+    )
+    document = Document(page_content=full_text, metadata=metadata)
+    return document
+
+def get_countries() -> List[str]:
+    """Return a sorted list of all country names."""
+    countries = [country.name for country in pycountry.countries]
+    countries_sorted = sorted(countries)
+    return countries_sorted
+
+def get_country_code(country_name: str) -> Optional[str]:
+    """Return the ISO alpha-2 country code for a given country name."""
+    try:
+        country = pycountry.countries.lookup(country_name.strip())
+        country_code = country.alpha_2
+    except LookupError:
+        country_code = None
+    return country_code
+
+def normalize_text(input_text: str) -> str:
+    """
+    Normalize text the same way clean_input_text does (letters, spaces, apostrophes and hyphens only,
+    lowercased) and additionally collapse runs of whitespace, so equivalent inputs compare equal.
+    """
+    cleaned_input = re.sub(r'[^a-zA-Z\s\'-]', '', input_text)
+    return " ".join(cleaned_input.lower().split())
+
+def extract_genres(input_text: str) -> List[str]:
+    """Return the TMDb genres (lowercased) named in a free-text genre preference, e.g. "sci-fi and horror"."""
+    text = f" {normalize_text(input_text)} "
+    genres = []
+    candidates = [(genre, [genre]) for genre in MOVIE_GENRES] + list(GENRE_SYNONYMS.items())
+    for phrase, phrase_genres in candidates:
+        if f" {phrase} " in text:
+            genres.extend(genre for genre in phrase_genres if genre not in genres)
+    return genres
+
+def clean_input_text(input_text: str) -> str:
+    """
+    Clean the input text by:
+    1. Removing any non-alphabetic characters except spaces, apostrophes, and hyphens.
+    2. Converting the text to lowercase.
+    3. Checking if the input is valid (not only spaces, apostrophes, or hyphens).
+    4. Ensuring the input is within the max character limit of 150 characters.
+    """
+    cleaned_input = re.sub(r'[^a-zA-Z\s\'-]', '', input_text)
+    cleaned_input = cleaned_input.lower()
+
+    # Check for empty input or invalid characters
+    if cleaned_input == "" or re.match(r'^[\s\'-]*$', cleaned_input):
+        return "Invalid input. Your input can only include letters, spaces, apostrophes, and hyphens."
+    
+    # Check if the input exceeds 150 characters
+    if len(cleaned_input) > 150:
+        return "The input exceeds the maximum length of 150 characters. Please provide a shorter job title."
+
     return cleaned_input
\ No newline at end of file
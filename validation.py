@@ -1,54 +1,241 @@
-from typing import Literal
-from pydantic import BaseModel
-from openai import OpenAI
-from utils import get_api_key
-
-class ValidationOutput(BaseModel):
-    """Schema for the structured validation result returned by the model."""
-    input_value: str
-    validation_result: Literal["yes", "no"]
-
-def validate_input(input_value: str) -> str:
-    """Validate whether the input is a relevant and concise movie keyword, genre, actor name, or theme."""
-    
-    system_prompt = "You are an expert in movies, genres, keywords, and actors."
-    
-    user_prompt = f"""
-    Your task is to verify if the input is a valid movie keyword, genre, actor name, or theme/topic/storyline.
-
-    - It should be a short phrase describing either a genre, actor, or movie theme/storyline.
-    - If the text contains more than just keywords, return "no". For example, "I am a big fan of love stories"
-    is invalid because it does not represent a keyword but a full sentence.
-    - Examples of valid genres: "comedy", "thriller", "sci-fi"
-    - Examples of valid actors: "Tom Hanks", "Natalie Portman"
-    - Examples of valid themes or topics: "losing a loved one", "revenge", "coming of age", "friendship", "family issues"
-    - You should be stricter with genres and actors, but can be a bit more liberal with topics/themes.
-
-    Return "yes" if it fits one of these categories and is relevant and concise. Otherwise, return "no".
-
-    Input: "{input_value}"
-    """
-
-    OPENAI_API_KEY: str = get_api_key("OPENAI_API_KEY")
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    try:
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-
-        response = client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0,
-            response_format=ValidationOutput
-        )
-
-        parsed_content = response.choices[0].message.parsed
-        validation_result: str = parsed_content.validation_result
-        
-        return validation_result
-
-    except Exception as e:
-        return "error"
\ No newline at end of file
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Literal, Optional, Set
+import numpy as np
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+from disk_cache import DiskCache, CACHE_DIR
+from metrics import record_cache, timed_stage
+from resources import MOVIE_DB_PATH, get_embeddings, get_openai_client
+from utils import GENRE_SYNONYMS, MOVIE_GENRES, normalize_text
+
+# TMDb genres and aliases, so the local tier recognizes genres even without the parquet
+KNOWN_GENRES = set(MOVIE_GENRES)
+GENRE_ALIASES = set(GENRE_SYNONYMS) | {
+    "biopic", "biography", "noir", "film noir", "superhero", "disaster", "sports",
+}
+# Example themes from the LLM prompt, used as prototypes for the embedding-similarity check
+THEME_EXAMPLES = [
+    "losing a loved one", "revenge", "coming of age", "friendship", "family issues",
+    "self-discovery", "space exploration", "historical events",
+]
+# Sentence shapes ("i am a big fan of", "i like movies", "show me", "my favorite") mark full sentences
+# rather than keywords. Lone pronouns are not enough: titles such as "Me Before You", "I, Robot",
+# "My Neighbor Totoro" or "I Am Legend" contain them too; anything else is left to the LLM.
+# Matched on normalized text
+SENTENCE_PATTERN = re.compile(
+    r"\b(?:i|we)\s+(?:am|are)\s+(?:a|an|into|looking|interested|in the mood|big|huge|fans?)\b"
+    r"|\b(?:i'm|im|we're)\s+(?:a|an|into|looking|interested|in the mood|big|huge|fans?|a fan)\b"
+    r"|\b(?:i|we)\s+(?:really\s+|usually\s+|always\s+|also\s+)?(?:like|love|enjoy|prefer|want|watch)\s+"
+    r"(?:movies|films|watching|to watch|to see|stories|shows|it when)\b"
+    r"|\b(?:i|we)\s+(?:really|usually|always|also)\b"
+    r"|\b(?:show|give|tell|recommend|find|suggest)\s+(?:me|us)\b"
+    r"|\b(?:my|our)\s+(?:favou?rite|wife|husband|kids?|friends?|family)\b"
+)
+
+LOCAL_MAX_WORDS = 4
+VOCABULARY_MIN_COUNT = 2
+SIMILARITY_THRESHOLD = 0.55
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "validation.sqlite")
+LLM_CACHE_TTL = 30 * 24 * 60 * 60
+MAX_WORKERS = 4
+
+class ValidationOutput(BaseModel):
+    """Schema for the structured validation result returned by the model."""
+    input_value: str
+    validation_result: Literal["yes", "no"]
+
+def validate_input_llm(input_value: str) -> str:
+    """Validate with the LLM whether the input is a relevant and concise movie keyword, genre, actor name, or theme."""
+    
+    system_prompt = "You are an expert in movies, genres, keywords, and actors."
+    
+    user_prompt = f"""
+    Your task is to verify if the input is a valid movie keyword, genre, actor name, or theme/topic/storyline.
+
+    - It should be a short phrase describing either a genre, actor, or movie theme/storyline.
+    - If the text contains more than just keywords, return "no". For example, "I am a big fan of love stories"
+    is invalid because it does not represent a keyword but a full sentence.
+    - Examples of valid genres: "comedy", "thriller", "sci-fi"
+    - Examples of valid actors: "Tom Hanks", "Natalie Portman"
+    - Examples of valid themes or topics: "losing a loved one", "revenge", "coming of age", "friendship", "family issues"
+    - You should be stricter with genres and actors, but can be a bit more liberal with topics/themes.
+
+    Return "yes" if it fits one of these categories and is relevant and concise. Otherwise, return "no".
+
+    Input: "{input_value}"
+    """
+
+    client = get_openai_client()
+
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        response = client.beta.chat.completions.parse(
+            model="gpt-4o",
+            messages=messages,
+            temperature=0,
+            response_format=ValidationOutput
+        )
+
+        parsed_content = response.choices[0].message.parsed
+        validation_result: str = parsed_content.validation_result
+        
+        return validation_result
+
+    except Exception as e:
+        return "error"
+
+class ValidationIndex:
+    """Vocabularies built from the movie parquet that let most inputs be validated locally."""
+
+    def __init__(self, genres: Set[str], cast: Set[str], vocabulary: Set[str]):
+        self.genres = genres
+        self.cast = cast
+        self.vocabulary = vocabulary
+        self._prototypes: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_parquet(cls, movie_db_path: str) -> "ValidationIndex":
+        """Build the index from the movie parquet, streaming it in record batches."""
+        genres = {normalize_text(genre) for genre in KNOWN_GENRES | GENRE_ALIASES}
+        cast: Set[str] = set()
+        counts: Counter = Counter()
+
+        if os.path.exists(movie_db_path):
+            parquet_file = pq.ParquetFile(movie_db_path)
+            columns = [name for name in ("title", "overview", "genres", "cast") if name in parquet_file.schema_arrow.names]
+            for batch in parquet_file.iter_batches(columns=columns):
+                data = batch.to_pydict()
+                for movie_genres in data.get("genres", []):
+                    genres.update(normalize_text(genre) for genre in movie_genres or [])
+                for movie_cast in data.get("cast", []):
+                    cast.update(normalize_text(name) for name in movie_cast or [])
+                for text in data.get("title", []) + data.get("overview", []):
+                    counts.update(normalize_text(text or "").split())
+
+        vocabulary = {word for word, count in counts.items() if count >= VOCABULARY_MIN_COUNT}
+        for phrase in genres | cast:
+            vocabulary.update(phrase.split())
+
+        return cls(genres, cast, vocabulary)
+
+    def prototypes(self) -> np.ndarray:
+        """Return normalized embeddings of genre names and example themes, computed once."""
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    phrases = sorted(normalize_text(genre) for genre in KNOWN_GENRES | GENRE_ALIASES) + THEME_EXAMPLES
+                    vectors = np.asarray(get_embeddings().embed_documents(phrases), dtype=np.float32)
+                    self._prototypes = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return self._prototypes
+
+    def similarity(self, text: str) -> float:
+        """Return the highest cosine similarity between the text and the prototypes."""
+        vector = np.asarray(get_embeddings().embed_query(text), dtype=np.float32)
+        vector = vector / np.linalg.norm(vector)
+        return float(np.max(self.prototypes() @ vector))
+
+_index: Optional[ValidationIndex] = None
+_index_lock = threading.Lock()
+_llm_cache: Optional[DiskCache] = None
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="validation")
+
+def get_validation_index() -> ValidationIndex:
+    """Return the process-wide validation index, building it on first use (the app's warm-up builds it ahead of that)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ValidationIndex.from_parquet(MOVIE_DB_PATH)
+    return _index
+
+def get_llm_cache() -> DiskCache:
+    """Return the persistent cache of LLM validation results."""
+    global _llm_cache
+    if _llm_cache is None:
+        with _index_lock:
+            if _llm_cache is None:
+                _llm_cache = DiskCache(LLM_CACHE_PATH)
+    return _llm_cache
+
+def _validate_keywords(text: str, index: Optional[ValidationIndex]) -> Optional[str]:
+    """Answer from the genre and cast sets of a built index and the sentence pattern, without any I/O."""
+    if index is not None and (text in index.genres or text in index.cast):
+        return "yes"
+    if SENTENCE_PATTERN.search(text):
+        return "no"
+    return None
+
+def _validate_similarity(text: str, index: ValidationIndex) -> Optional[str]:
+    """Answer "yes" for short in-vocabulary inputs close to a genre or example theme (an embedding request)."""
+    words = text.split()
+    if len(words) <= LOCAL_MAX_WORDS and index.vocabulary and all(word in index.vocabulary for word in words):
+        try:
+            if index.similarity(text) >= SIMILARITY_THRESHOLD:
+                return "yes"
+        except Exception:
+            return None
+    return None
+
+@timed_stage("validate")
+def validate_input_local(input_value: str) -> Optional[str]:
+    """
+    Validate the input from local indexes only.
+    Returns "yes" or "no" when the answer is clear, or None when the input is ambiguous.
+    """
+    text = normalize_text(input_value)
+    if not text:
+        return None
+
+    index = get_validation_index()
+    result = _validate_keywords(text, index)
+    if result is not None:
+        return result
+    return _validate_similarity(text, index)
+
+@timed_stage("validate_llm")
+def validate_input_cached(input_value: str) -> str:
+    """Validate with the LLM, caching its answers per normalized input."""
+    cache = get_llm_cache()
+    key = normalize_text(input_value)
+
+    cached = cache.get(key)
+    record_cache("validation", hits=int(cached is not None), misses=int(cached is None))
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    result = validate_input_llm(input_value)
+    if result in ("yes", "no"):
+        cache.set(key, result.encode("utf-8"), ttl=LLM_CACHE_TTL)
+    return result
+
+def validate_input(input_value: str) -> str:
+    """
+    Validate whether the input is a relevant and concise movie keyword, genre, actor name, or theme.
+    Answers from the local tier when possible and falls back to the (cached) LLM for ambiguous inputs.
+    """
+    result = validate_input_local(input_value)
+    if result is not None:
+        return result
+    return validate_input_cached(input_value)
+
+def validate_input_async(input_value: str) -> "Future[str]":
+    """
+    Validate the input without blocking on the index build, the embedding request or the LLM tier.
+    Returns an already completed future when the genre and cast sets (once the index is built) or the
+    sentence pattern decide, otherwise a future resolved by a background worker running validate_input.
+    """
+    result = _validate_keywords(normalize_text(input_value), _index)
+    if result is not None:
+        future: "Future[str]" = Future()
+        future.set_result(result)
+        return future
+    return _executor.submit(validate_input, input_value)